@@ -1,9 +1,14 @@
 """
 Main entry point for the Reflection Agent Backend.
 """
+import argparse
+import re
+import subprocess
+import sys
+import time
 import uvicorn
 import socket
-from src.config.settings import PORT, HOST, DEBUG, SSL_CERT, SSL_KEY
+from src.config.settings import PORT, HOST, DEBUG, WORKERS, CACHE_BACKEND, SEMANTIC_CACHE_ENABLED, SSL_CERT, SSL_KEY
 
 def is_port_in_use(port, host="localhost"):
     """Check if a port is already in use"""
@@ -14,17 +19,62 @@ def find_available_port(start_port, max_attempts=10):
     """Find an available port starting from start_port"""
     port = start_port
     attempts = 0
-    
+
     while is_port_in_use(port) and attempts < max_attempts:
         port += 1
         attempts += 1
-        
+
     if attempts >= max_attempts:
         raise RuntimeError(f"Could not find an available port after {max_attempts} attempts")
-        
+
     return port
 
-if __name__ == "__main__":
+def profile_imports(module="src.api.app", top=15):
+    """
+    Import a module in a fresh interpreter with -X importtime and print the slowest imports.
+
+    Args:
+        module: Module to import
+        top: Number of modules to list, by cumulative import time
+
+    Returns:
+        Total import time of the module in seconds
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    # Lines look like "import time:  self [us] | cumulative | imported package"
+    timings = []
+    for line in result.stderr.splitlines():
+        match = re.match(r"import time:\s*(\d+)\s*\|\s*(\d+)\s*\|(\s*)(\S+)", line)
+        if match:
+            timings.append((int(match.group(2)), int(match.group(1)), len(match.group(3)), match.group(4)))
+
+    # Top-level imports (least indented) sum to the total
+    min_depth = min(depth for _, _, depth, _ in timings)
+    total = sum(cumulative for cumulative, _, depth, _ in timings if depth == min_depth) / 1e6
+
+    print(f"{'cumulative':>12} {'self':>10}  module")
+    for cumulative, self_time, _, name in sorted(timings, reverse=True)[:top]:
+        print(f"{cumulative / 1e3:>10.1f}ms {self_time / 1e3:>8.1f}ms  {name}")
+    print(f"\nImporting {module} took {total:.3f}s")
+    return total
+
+def profile_agent_build():
+    """Time constructing the agent, the work the server does in the background after binding"""
+    from src.api.app import build_agent
+    start = time.perf_counter()
+    build_agent()
+    elapsed = time.perf_counter() - start
+    print(f"Building the agent took {elapsed:.3f}s")
+    return elapsed
+
+def run_development_server():
+    """Single process with auto-reload, moving to the next free port if the configured one is taken"""
     # Check if the preferred port is available, otherwise find an alternative
     if is_port_in_use(PORT):
         print(f"Port {PORT} is already in use. Trying to find an available port...")
@@ -32,15 +82,64 @@ if __name__ == "__main__":
         print(f"Found available port: {port}")
     else:
         port = PORT
-        
-    print(f"Starting server on port {port}")
-    
+
+    print(f"Starting development server on port {port}")
+
     # Use uvicorn to run the FastAPI app
     uvicorn.run(
-        "src.api.app:app", 
-        host=HOST, 
-        port=port, 
-        reload=DEBUG,
+        "src.api.app:app",
+        host=HOST,
+        port=port,
+        reload=True,
         ssl_keyfile=SSL_KEY,
         ssl_certfile=SSL_CERT,
-    )
\ No newline at end of file
+    )
+
+def run_production_server(workers):
+    """
+    Bind the configured port exactly once and serve it from ``workers`` processes.
+
+    The supervisor process binds the socket before starting the workers, so
+    there is no probing and a taken port fails loudly. Each worker imports the
+    app on its own and warms up its own agent in the lifespan.
+    """
+    workers = max(1, workers)
+    if workers > 1 and CACHE_BACKEND == "memory":
+        print("Warning: CACHE_BACKEND=memory keeps a separate cache per worker. "
+              "Set CACHE_BACKEND=sqlite to share cached results between workers.")
+    if workers > 1 and SEMANTIC_CACHE_ENABLED:
+        print("Warning: the semantic cache is held in memory by each worker and is not shared.")
+
+    print(f"Starting server on {HOST}:{PORT} with {workers} worker{'s' if workers > 1 else ''}")
+
+    uvicorn.run(
+        "src.api.app:app",
+        host=HOST,
+        port=PORT,
+        workers=workers,
+        ssl_keyfile=SSL_KEY,
+        ssl_certfile=SSL_CERT,
+    )
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the Reflection Agent API server")
+    parser.add_argument("--profile-imports", action="store_true",
+                        help="Print the import-time profile of the API module and exit")
+    parser.add_argument("--max-import-seconds", type=float, default=None,
+                        help="With --profile-imports, exit with status 1 if importing takes longer than this")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: the WORKERS setting); ignored in DEBUG mode")
+    args = parser.parse_args()
+
+    if args.profile_imports:
+        total = profile_imports()
+        profile_agent_build()
+        if args.max_import_seconds is not None and total > args.max_import_seconds:
+            print(f"Import time {total:.3f}s exceeds the budget of {args.max_import_seconds:.3f}s")
+            sys.exit(1)
+        sys.exit(0)
+
+    if DEBUG:
+        run_development_server()
+    else:
+        run_production_server(args.workers or WORKERS)
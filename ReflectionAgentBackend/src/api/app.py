@@ -1,67 +1,506 @@
 """
 FastAPI application definition for the Reflection Agent Backend.
 """
-from fastapi import FastAPI, HTTPException
+import asyncio
+import importlib
+import math
+import os
+import time
+from contextlib import asynccontextmanager
+import orjson
+from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-
-from src.config.settings import (
-    GOOGLE_API_KEY, 
-    MAIN_MODEL, 
-    REFLECTION_MODEL,
-    MAX_ITERATIONS, 
-    USE_LANGSMITH, 
-    LANGSMITH_API_KEY, 
-    LANGSMITH_PROJECT,
-    VERBOSE,
-    CORS_ORIGINS
-)
-from src.core.reflection_agent import ReflectionPatternAgent
+from fastapi.responses import ORJSONResponse, PlainTextResponse, StreamingResponse
+from typing import Dict, List, Literal, Optional
+from pydantic import BaseModel, Field
+
+from src.config import settings
+from src.cache.memory import MemoryResultCache
+from src.checkpoint import RunConflictError
+from src.core.verdict import parse_stats
+from src.utils.metrics import HTTP_REQUEST_SECONDS, registry
+
+# LangChain, LangGraph and the Gemini client are only imported by build_agent, which the
+# lifespan runs in the background, so the server binds and answers health checks at once.
+agent = None
+agent_error: Optional[str] = None
+_agent_lock = asyncio.Lock()
+_started_at = time.monotonic()
+_ready_after: Optional[float] = None
+# Seconds a replaced client pool stays open after a reload when runs have no deadline
+POOL_CLOSE_DELAY_SECONDS = 300
+# Pending closes of replaced client pools, referenced so they are not garbage collected mid-wait
+_pool_closers = set()
+
+# Settings each store is built from; a reload rebuilds a store only when one of them changed
+STORE_SETTINGS = {
+    "cache": ("CACHE_BACKEND", "CACHE_MAX_ENTRIES", "CACHE_TTL_SECONDS", "CACHE_PATH"),
+    "semantic_cache": ("SEMANTIC_CACHE_ENABLED", "SEMANTIC_CACHE_THRESHOLD", "SEMANTIC_CACHE_MAX_ENTRIES",
+                       "SEMANTIC_CACHE_DIM", "SEMANTIC_CACHE_PATH", "CACHE_TTL_SECONDS"),
+    "checkpointer": ("CHECKPOINT_BACKEND", "CHECKPOINT_PATH", "CHECKPOINT_TTL_SECONDS"),
+    "sessions": ("SESSION_MAX_SESSIONS", "SESSION_IDLE_SECONDS", "SESSION_HISTORY_TOKENS", "SESSION_SUMMARY_TOKENS"),
+    "coalescer": ("COALESCE_REQUESTS",),
+    "client_pool": ("GOOGLE_API_KEY", "MODEL_TRANSPORT", "MODEL_MAX_CONNECTIONS", "MODEL_KEEPALIVE_SECONDS"),
+    # Not an agent store: the app's own record of recent transcripts
+    "transcripts": ("TRANSCRIPT_MAX_ENTRIES", "TRANSCRIPT_TTL_SECONDS")
+}
+
+def build_stores(names=None) -> dict:
+    """
+    Build the agent's stores and connections from the settings: caches, checkpoints, sessions,
+    the single-flight layer and the model client pool. names limits the build to those stores.
+    """
+    names = set(STORE_SETTINGS) - {"transcripts"} if names is None else set(names)
+    stores = {}
+    
+    if "cache" in names:
+        from src.cache import create_result_cache
+        stores["cache"] = create_result_cache(settings.CACHE_BACKEND, settings.CACHE_MAX_ENTRIES,
+                                              settings.CACHE_TTL_SECONDS, settings.CACHE_PATH)
+    
+    # Optional near-duplicate cache, persisted to disk on shutdown when a path is configured
+    if "semantic_cache" in names:
+        stores["semantic_cache"] = None
+        if settings.SEMANTIC_CACHE_ENABLED:
+            from src.cache.semantic import HashingEmbedder, SemanticCache
+            stores["semantic_cache"] = SemanticCache(
+                embedder=HashingEmbedder(settings.SEMANTIC_CACHE_DIM),
+                threshold=settings.SEMANTIC_CACHE_THRESHOLD,
+                max_entries=settings.SEMANTIC_CACHE_MAX_ENTRIES,
+                ttl_seconds=settings.CACHE_TTL_SECONDS,
+                path=settings.SEMANTIC_CACHE_PATH or None
+            )
+    
+    if "checkpointer" in names:
+        from src.checkpoint import create_checkpointer
+        stores["checkpointer"] = create_checkpointer(settings.CHECKPOINT_BACKEND, settings.CHECKPOINT_PATH,
+                                                     settings.CHECKPOINT_TTL_SECONDS)
+    
+    # Optional multi-turn sessions holding the final answers of earlier turns
+    if "sessions" in names:
+        stores["sessions"] = None
+        if settings.SESSION_MAX_SESSIONS > 0:
+            from src.core.session import SessionStore
+            stores["sessions"] = SessionStore(
+                max_sessions=settings.SESSION_MAX_SESSIONS,
+                idle_seconds=settings.SESSION_IDLE_SECONDS,
+                history_tokens=settings.SESSION_HISTORY_TOKENS,
+                summary_tokens=settings.SESSION_SUMMARY_TOKENS
+            )
+    
+    if "coalescer" in names:
+        from src.utils.singleflight import SingleFlight
+        stores["coalescer"] = SingleFlight() if settings.COALESCE_REQUESTS else None
+    
+    if "client_pool" in names:
+        stores["client_pool"] = build_client_pool()
+    return stores
+
+def changed_stores(applied: dict) -> List[str]:
+    """
+    Stores whose settings differ between the applied settings (a snapshot of the settings
+    module) and the current ones.
+    """
+    return [name for name, keys in STORE_SETTINGS.items()
+            if any(applied.get(key) != getattr(settings, key) for key in keys)]
+
+def build_client_pool():
+    """Build the pool of model connections from the settings."""
+    from src.utils.clients import ClientPool
+    return ClientPool(settings.GOOGLE_API_KEY, settings.MODEL_TRANSPORT,
+                      settings.MODEL_MAX_CONNECTIONS, settings.MODEL_KEEPALIVE_SECONDS)
+
+def build_agent(previous=None, rebuild=()):
+    """
+    Import the agent stack and construct the ReflectionPatternAgent from the settings.
+    
+    When rebuilding after a settings reload, the stores of the previous agent carry
+    over, so cached results, checkpoints, sessions and open connections survive it;
+    the stores named in rebuild, whose settings changed, are built anew. Its rate
+    limiters and circuit breakers carry over too, unless their settings changed, and
+    so does its record of runs in progress.
+    """
+    from src.core.convergence import ConvergencePolicy
+    from src.core.deadline import PhaseLatency
+    from src.core.gate import ReflectionGate
+    from src.core.profiles import load_prompt_variants
+    from src.core.reflection_agent import ReflectionPatternAgent
+    from src.core.routing import ModelRouter, parse_model_prices
+    from src.utils.utils import parse_rate_limits
+    
+    if previous is None:
+        stores = build_stores()
+    else:
+        stores = {name: getattr(previous, name) for name in
+                  ("cache", "semantic_cache", "checkpointer", "sessions", "coalescer", "client_pool")}
+        stores.update(build_stores([name for name in rebuild if name in stores]))
+    
+    # Optional gate that skips reflection for clearly adequate first drafts
+    reflection_gate = None
+    if settings.REFLECTION_GATE_ENABLED:
+        if settings.REFLECTION_GATE_MODEL_PATH:
+            reflection_gate = ReflectionGate.load(settings.REFLECTION_GATE_MODEL_PATH)
+        else:
+            reflection_gate = ReflectionGate(threshold=settings.REFLECTION_GATE_THRESHOLD)
+    
+    # Optional routing tier sending first drafts to a cheaper model
+    router = None
+    if settings.DRAFT_MODEL and settings.DRAFT_MODEL != settings.MAIN_MODEL:
+        router = ModelRouter(settings.DRAFT_MODEL, settings.MAIN_MODEL, settings.ROUTING_ESCALATE_CLASSES,
+                             parse_model_prices(settings.MODEL_PRICES))
+    
+    reflection_agent = ReflectionPatternAgent(
+        google_api_key=settings.GOOGLE_API_KEY,
+        main_model=settings.MAIN_MODEL,
+        reflection_model=settings.REFLECTION_MODEL,
+        max_iterations=settings.MAX_ITERATIONS,
+        verbose=settings.VERBOSE,
+        retry_delay=settings.RETRY_DELAY,
+        max_retries=settings.MAX_RETRIES,
+        use_langsmith=settings.USE_LANGSMITH,
+        langsmith_api_key=settings.LANGSMITH_API_KEY,
+        langsmith_project=settings.LANGSMITH_PROJECT,
+        rate_limits=parse_rate_limits(settings.MODEL_RATE_LIMITS),
+        token_limits=parse_rate_limits(settings.MODEL_TOKEN_LIMITS),
+        request_timeout=settings.REQUEST_TIMEOUT_SECONDS,
+        reflection_gate=reflection_gate,
+        compaction_strategy=settings.COMPACTION_STRATEGY,
+        reflection_mode=settings.REFLECTION_MODE,
+        convergence=ConvergencePolicy(settings.TARGET_SCORE, settings.MIN_SCORE_DELTA, settings.DRAFT_SIMILARITY_THRESHOLD),
+        call_timeout=settings.MODEL_TIMEOUT_SECONDS,
+        retry_max_delay=settings.RETRY_MAX_DELAY,
+        circuit_failure_threshold=settings.CIRCUIT_FAILURE_THRESHOLD,
+        circuit_reset_timeout=settings.CIRCUIT_RESET_SECONDS,
+        topology=settings.GRAPH_TOPOLOGY,
+        draft_temperatures=settings.SPECULATIVE_TEMPERATURES,
+        router=router,
+        prompt_variants=load_prompt_variants(settings.PROMPT_VARIANTS_PATH),
+        allowed_models=settings.ALLOWED_MODELS,
+        max_iterations_limit=settings.MAX_ITERATIONS_LIMIT,
+        profile_pool_size=settings.PROFILE_POOL_SIZE,
+        phase_latency=PhaseLatency(settings.DEADLINE_ESTIMATE_MARGIN),
+        predecessor=previous,
+        **stores
+    )
+    sessions = stores["sessions"]
+    if sessions is not None:
+        sessions.summary_llm = reflection_agent.reflection_llm if settings.SESSION_SUMMARY_MODE == "model" else None
+    return reflection_agent
+
+async def load_agent():
+    """
+    Build the agent once, off the event loop, and return it.
+    """
+    global agent, agent_error, _ready_after
+    async with _agent_lock:
+        if agent is None:
+            try:
+                agent = await asyncio.to_thread(build_agent)
+            except Exception as e:
+                agent_error = str(e)
+                raise
+            agent_error = None
+            _ready_after = time.monotonic() - _started_at
+    return agent
+
+def _restore_settings(applied: dict, environ: dict) -> None:
+    """Put back the settings module and process environment captured before a reload."""
+    for name in set(vars(settings)) - set(applied):
+        delattr(settings, name)
+    vars(settings).update(applied)
+    for name in set(os.environ) - set(environ):
+        del os.environ[name]
+    os.environ.update(environ)
+
+def _rebuild_agent(previous):
+    """Re-read the settings and build an agent from them; the old settings stay in effect if that fails."""
+    applied, environ = dict(vars(settings)), dict(os.environ)
+    # Re-importing the settings module re-reads the environment and .env in place
+    importlib.reload(settings)
+    try:
+        rebuild = changed_stores(applied)
+        return build_agent(previous, rebuild), rebuild
+    except Exception:
+        # Health and describe_config read the settings module, so they must keep describing the running agent
+        _restore_settings(applied, environ)
+        raise
+
+async def _close_client_pool(pool, delay: float):
+    """Close a replaced client pool once runs still using it have had delay seconds to finish."""
+    await asyncio.sleep(delay)
+    await pool.aclose()
+
+async def reload_agent():
+    """
+    Re-read the settings and swap in an agent built from them, without restarting the server.
+    
+    Runs already in flight finish on the agent they started on. If the new
+    settings fail to build, the current agent and settings stay in place. A
+    replaced client pool is closed once those runs have had until their deadline
+    to finish.
+    
+    Returns:
+        The new agent and the names of the stores rebuilt because their settings changed
+    """
+    global agent, transcripts
+    async with _agent_lock:
+        previous = agent
+        agent, rebuilt = await asyncio.to_thread(_rebuild_agent, previous)
+    if "transcripts" in rebuilt:
+        transcripts = MemoryResultCache(settings.TRANSCRIPT_MAX_ENTRIES, settings.TRANSCRIPT_TTL_SECONDS)
+    if previous is not None and previous.client_pool not in (None, agent.client_pool):
+        delay = previous.request_timeout if previous.request_timeout is not None else POOL_CLOSE_DELAY_SECONDS
+        closer = asyncio.create_task(_close_client_pool(previous.client_pool, delay))
+        _pool_closers.add(closer)
+        closer.add_done_callback(_pool_closers.discard)
+    return agent, rebuilt
+
+async def warm_up():
+    """
+    Build the agent and, if WARMUP_QUERY is set, run it once to open model connections.
+    """
+    try:
+        warm_agent = await load_agent()
+        if settings.WARMUP_QUERY:
+            await warm_agent.arun(settings.WARMUP_QUERY)
+    except Exception as e:
+        print(f"Warning: agent warm-up failed: {e}")
+
+def get_agent():
+    """
+    Return the agent, or answer 503 while it is still being built.
+    """
+    if agent is None:
+        raise HTTPException(
+            status_code=503,
+            detail=f"Agent failed to start: {agent_error}" if agent_error else "Agent is starting",
+            headers={"Retry-After": "1"}
+        )
+    return agent
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Start warming up in the background so the server accepts connections immediately.
+    """
+    warm_up_task = asyncio.create_task(warm_up())
+    yield
+    warm_up_task.cancel()
+    # Persist the semantic cache so near-duplicate matches survive restarts
+    if agent is not None and agent.semantic_cache is not None and agent.semantic_cache.path:
+        agent.semantic_cache.save()
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Reflection Pattern API",
     description="API for the Reflection Pattern Agent using LangChain, LangGraph, and Google Gemini",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=CORS_ORIGINS,
+    allow_origins=settings.CORS_ORIGINS,
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    """
+    Record the handling time of every request, labelled by route template and status.
+    """
+    start = time.perf_counter()
+    response = await call_next(request)
+    route = request.scope.get("route")
+    HTTP_REQUEST_SECONDS.observe(
+        time.perf_counter() - start,
+        method=request.method,
+        path=getattr(route, "path", "unmatched"),
+        status=str(response.status_code)
+    )
+    return response
+
 # Check for required environment variables
-if not GOOGLE_API_KEY:
+if not settings.GOOGLE_API_KEY:
     print("Warning: GEMINI_API_KEY environment variable not set. The agent will not function properly.")
 
-# Initialize the ReflectionPatternAgent
-agent = ReflectionPatternAgent(
-    google_api_key=GOOGLE_API_KEY,
-    main_model=MAIN_MODEL,
-    reflection_model=REFLECTION_MODEL,
-    max_iterations=MAX_ITERATIONS,
-    verbose=VERBOSE,
-    use_langsmith=USE_LANGSMITH,
-    langsmith_api_key=LANGSMITH_API_KEY,
-    langsmith_project=LANGSMITH_PROJECT
-)
+# How much of the run transcript a response inlines: none, the query with the final exchange, or everything
+Detail = Literal["final", "summary", "full"]
+
+# Transcripts of recent runs, so compact responses can fetch them later by run id
+transcripts = MemoryResultCache(settings.TRANSCRIPT_MAX_ENTRIES, settings.TRANSCRIPT_TTL_SECONDS)
+
+# Per-request overrides of the server's settings; unset fields keep them
+class RunOverrides(BaseModel):
+    # Generation model, one of MAIN_MODEL, DRAFT_MODEL or ALLOWED_MODELS
+    model: Optional[str] = None
+    # Iteration cap, at most MAX_ITERATIONS_LIMIT; 1 returns the first draft unreflected (speculative runs judge but never refine)
+    max_iterations: Optional[int] = Field(None, ge=1)
+    # Named pair of system prompts: "default", "concise" or one from PROMPT_VARIANTS_PATH
+    prompt_variant: Optional[str] = None
+    # How the transcript is reduced before each regeneration: "condensed", "latest" or "full"
+    compaction_strategy: Optional[str] = None
+    # Latency budget of the run, replacing REQUEST_TIMEOUT_SECONDS; also accepted as an X-Request-Timeout header
+    timeout_seconds: Optional[float] = Field(None, gt=0)
 
 # Define request model
-class QueryRequest(BaseModel):
+class QueryRequest(RunOverrides):
     query: str
+    # Defaults to the RESPONSE_DETAIL setting
+    detail: Optional[Detail] = None
+    # With checkpointing enabled, reusing the run_id of an interrupted run resumes it
+    run_id: Optional[str] = None
+    # Follow-up queries with the same session_id see the earlier answers of that session
+    session_id: Optional[str] = None
 
 # Define response model
 class QueryResponse(BaseModel):
     response: str
     iterations: int
     messages: list
+    cached: bool = False
+    coalesced: bool = False
+    reflection_skipped: bool = False
+    prompt_tokens: List[int] = []
+    scores: List[Optional[float]] = []
+    verdict: Optional[dict] = None
+    stop_reason: Optional[str] = None
+    # Set when the loop was cut short (deadline, quota, failed step) and the response is the best draft so far
+    partial: bool = False
+    routing: Optional[dict] = None
+    run_id: Optional[str] = None
+    session_id: Optional[str] = None
+
+# Define batch request model
+class BatchRequest(RunOverrides):
+    queries: List[str]
+    max_concurrency: Optional[int] = Field(None, ge=1)
+    detail: Optional[Detail] = None
+
+# Message type per class, filled on first sight of each class instead of inspecting every message
+_CLASS_TYPES = {'SystemMessage': 'system', 'HumanMessage': 'human', 'AIMessage': 'ai', 'AIMessageChunk': 'ai'}
+_message_types: Dict[type, str] = {}
+
+def _message_type(msg) -> str:
+    cls = type(msg)
+    msg_type = _message_types.get(cls)
+    if msg_type is None:
+        msg_type = _message_types[cls] = getattr(msg, 'type', None) or _CLASS_TYPES.get(cls.__name__, 'unknown')
+    return msg_type
+
+def format_messages(messages: list) -> list:
+    """
+    Format agent messages for frontend display.
+    """
+    return [
+        {'type': _message_type(msg), 'content': msg.content if hasattr(msg, 'content') else str(msg)}
+        for msg in messages
+    ]
+
+def summarize_messages(messages: list) -> list:
+    """
+    Reduce a run transcript to the user query, the latest reflection feedback (condensed) and the final answer.
+    """
+    from src.core.compaction import FEEDBACK_PREFIX, condense_feedback
+
+    formatted = format_messages(messages)
+    feedback = [i for i, msg in enumerate(formatted)
+                if msg['type'] == 'human' and str(msg['content']).startswith(FEEDBACK_PREFIX)]
+    queries = [i for i, msg in enumerate(formatted) if msg['type'] == 'human' and i not in feedback]
+    answers = [i for i, msg in enumerate(formatted) if msg['type'] == 'ai']
+    kept = sorted({index[-1] for index in (queries, feedback, answers) if index})
+    summary = [formatted[i] for i in kept]
+    for msg in summary:
+        if msg['type'] == 'human' and str(msg['content']).startswith(FEEDBACK_PREFIX):
+            msg['content'] = condense_feedback(msg['content'])
+    return summary
+
+def present_messages(messages: list, detail: str) -> list:
+    """
+    Messages inlined in a response at the requested detail level.
+    """
+    if detail == "final":
+        return []
+    if detail == "summary":
+        return summarize_messages(messages)
+    return format_messages(messages)
+
+def remember_transcript(result: dict) -> None:
+    """
+    Keep a fresh run's transcript so it can be fetched by run id afterwards.
+    """
+    if 'run_id' in result and not result.get('cached'):
+        transcripts.set(result['run_id'], {'messages': result.get('messages', [])})
+
+def run_options(run_agent, overrides: RunOverrides, request_timeout: Optional[float] = None) -> Optional[dict]:
+    """
+    Per-request overrides as agent run options, or a 400 when the agent does not offer them.
+    A timeout_seconds in the body takes precedence over the X-Request-Timeout header.
+    """
+    options = overrides.model_dump(include=set(RunOverrides.model_fields), exclude_none=True)
+    if request_timeout is not None:
+        options.setdefault('timeout_seconds', request_timeout)
+    if not options:
+        return None
+    try:
+        run_agent.resolve_profile(options)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return options
+
+def sse(event: dict) -> bytes:
+    """
+    Encode one Server-Sent Event.
+    """
+    return b"event: " + event['event'].encode() + b"\ndata: " + orjson.dumps(event) + b"\n\n"
+
+def build_query_response(result: dict, detail: Optional[str] = None) -> ORJSONResponse:
+    """
+    Turn an agent result into the /api/query response, or raise the matching HTTP error.
+    """
+    detail = detail or settings.RESPONSE_DETAIL
+    remember_transcript(result)
+    # Failed runs tell the client which run to resume or inspect
+    run_headers = {"X-Run-Id": result['run_id']} if 'run_id' in result else {}
+
+    if 'retry_after' in result:
+        # Over quota (429) or the model's circuit is open (503): tell the client when to come back
+        rate_limited = result.get('error_type') == 'rate_limited'
+        raise HTTPException(
+            status_code=429 if rate_limited else 503,
+            detail=f"{'Rate limited' if rate_limited else 'Model temporarily unavailable'}: {result['error']}",
+            headers={"Retry-After": str(max(1, math.ceil(result['retry_after']))), **run_headers}
+        )
+    if result.get('error_type') == 'deadline':
+        # The deadline passed before even a first draft was ready
+        raise HTTPException(status_code=504, detail=f"Deadline exceeded: {result['error']}", headers=run_headers)
+    if 'error' in result:
+        raise HTTPException(status_code=500, detail=f"Error processing query: {result['error']}", headers=run_headers)
+
+    # Return the response to the frontend, serialized directly by orjson
+    return ORJSONResponse({
+        'response': result.get('response', ''),
+        'iterations': result.get('iterations', 0),
+        'messages': present_messages(result.get('messages', []), detail),
+        'cached': result.get('cached', False),
+        'coalesced': result.get('coalesced', False),
+        'reflection_skipped': result.get('reflection_skipped', False),
+        'prompt_tokens': result.get('prompt_tokens', []),
+        'scores': result.get('scores', []),
+        'verdict': result.get('verdict'),
+        'stop_reason': result.get('stop_reason'),
+        'partial': result.get('partial', False),
+        'routing': result.get('routing'),
+        'run_id': result.get('run_id'),
+        'session_id': result.get('session_id')
+    })
 
 @app.post("/api/query", response_model=QueryResponse)
-async def query_agent(query_request: QueryRequest):
+async def query_agent(query_request: QueryRequest,
+                      request_timeout: Optional[float] = Header(None, alias="X-Request-Timeout", gt=0)):
     """
     Endpoint to handle queries sent by the frontend.
     """
@@ -70,55 +509,244 @@ async def query_agent(query_request: QueryRequest):
     if not query:
         raise HTTPException(status_code=400, detail="No query provided")
 
-    try:
-        # Run the agent with the provided query
-        result = agent.run(query)
-
-        # Format messages for frontend display
-        formatted_messages = []
-        for msg in result.get('messages', []):
-            if hasattr(msg, 'type'):
-                msg_type = msg.type
-            else:
-                # Determine message type based on class name
-                if 'SystemMessage' in str(type(msg)):
-                    msg_type = 'system'
-                elif 'HumanMessage' in str(type(msg)):
-                    msg_type = 'human'
-                elif 'AIMessage' in str(type(msg)):
-                    msg_type = 'ai'
-                else:
-                    msg_type = 'unknown'
-
-            formatted_messages.append({
-                'type': msg_type,
-                'content': msg.content if hasattr(msg, 'content') else str(msg)
-            })
-
-        # Return the response to the frontend
-        return {
-            'response': result.get('response', ''),
-            'iterations': result.get('iterations', 0),
-            'messages': formatted_messages
-        }
+    run_agent = get_agent()
+    options = run_options(run_agent, query_request, request_timeout)
 
+    try:
+        # Run the agent asynchronously so other requests keep being served
+        result = await run_agent.arun(query, query_request.run_id, query_request.session_id, options)
+    except RunConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
     except Exception as e:
         # Handle errors gracefully and return an error message
         raise HTTPException(status_code=500, detail=f"Error processing query: {str(e)}")
 
+    return build_query_response(result, query_request.detail)
+
+
+@app.post("/api/query/stream")
+async def stream_query(query_request: QueryRequest,
+                       request_timeout: Optional[float] = Header(None, alias="X-Request-Timeout", gt=0)):
+    """
+    Endpoint that streams tokens and phase events as Server-Sent Events.
+    """
+    query = query_request.query
+
+    if not query:
+        raise HTTPException(status_code=400, detail="No query provided")
+
+    stream_agent = get_agent()
+    options = run_options(stream_agent, query_request, request_timeout)
+    detail = query_request.detail or settings.RESPONSE_DETAIL
+
+    async def event_stream():
+        try:
+            async for event in stream_agent.astream(query, query_request.run_id, query_request.session_id, options):
+                if event["event"] == "final":
+                    remember_transcript(event)
+                    event = {**event, "messages": present_messages(event.get("messages", []), detail)}
+                yield sse(event)
+        except RunConflictError as e:
+            yield sse({"event": "error", "detail": str(e), "run_id": e.run_id, "error_type": "conflict"})
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@app.post("/api/batch")
+async def batch_query(batch_request: BatchRequest,
+                      request_timeout: Optional[float] = Header(None, alias="X-Request-Timeout", gt=0)):
+    """
+    Endpoint that runs many queries concurrently and streams results as NDJSON.
+    """
+    queries = batch_request.queries
+
+    if not queries:
+        raise HTTPException(status_code=400, detail="No queries provided")
+    if len(queries) > settings.BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=400, detail=f"Batch exceeds the limit of {settings.BATCH_MAX_QUERIES} queries")
+
+    max_concurrency = settings.BATCH_MAX_CONCURRENCY
+    if batch_request.max_concurrency is not None:
+        max_concurrency = min(batch_request.max_concurrency, max_concurrency)
+
+    batch_agent = get_agent()
+    options = run_options(batch_agent, batch_request, request_timeout)
+    detail = batch_request.detail or settings.RESPONSE_DETAIL
+
+    async def result_stream():
+        async for result in batch_agent.arun_batch(queries, max_concurrency, options):
+            remember_transcript(result)
+            line = {
+                'index': result['index'],
+                'query': result['query'],
+                'response': result.get('response', ''),
+                'iterations': result.get('iterations', 0),
+                'messages': present_messages(result.get('messages', []), detail),
+                'cached': result.get('cached', False),
+                'coalesced': result.get('coalesced', False),
+                'reflection_skipped': result.get('reflection_skipped', False),
+                'stop_reason': result.get('stop_reason'),
+                'partial': result.get('partial', False),
+                'run_id': result.get('run_id')
+            }
+            if 'error' in result:
+                line['error'] = result['error']
+            if 'error_type' in result:
+                line['error_type'] = result['error_type']
+            if 'retry_after' in result:
+                line['retry_after'] = result['retry_after']
+            yield orjson.dumps(line) + b"\n"
+
+    return StreamingResponse(result_stream(), media_type="application/x-ndjson")
+
+
+@app.get("/api/runs/{run_id}")
+async def get_run(run_id: str):
+    """
+    Endpoint returning the latest checkpointed state of a run, complete or partial.
+    """
+    run = await get_agent().aget_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+
+    return ORJSONResponse({**run, 'messages': format_messages(run.get('messages', []))})
+
+
+@app.get("/api/runs/{run_id}/transcript")
+async def get_transcript(run_id: str, detail: Detail = "full"):
+    """
+    Endpoint returning the message transcript of a recent or checkpointed run.
+    """
+    stored = transcripts.get(run_id)
+    if stored is None:
+        stored = await get_agent().aget_run(run_id)
+    if stored is None:
+        raise HTTPException(status_code=404, detail=f"Transcript of run {run_id} not found")
+
+    return ORJSONResponse({'run_id': run_id, 'messages': present_messages(stored.get('messages', []), detail)})
+
+
+@app.post("/api/runs/{run_id}/resume", response_model=QueryResponse)
+async def resume_run(run_id: str):
+    """
+    Endpoint that continues an interrupted run from its last checkpoint.
+    """
+    run_agent = get_agent()
+
+    try:
+        result = await run_agent.aresume(run_id)
+    except RunConflictError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error resuming run: {str(e)}")
+
+    if result is None:
+        raise HTTPException(status_code=404, detail=f"Run {run_id} not found")
+
+    return build_query_response(result)
+
+
+@app.get("/api/sessions/{session_id}")
+async def get_session(session_id: str):
+    """
+    Endpoint returning the rolling summary and recent turns of a session.
+    """
+    session_agent = get_agent()
+    session = session_agent.sessions.get(session_id) if session_agent.sessions else None
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return session
+
+
+@app.delete("/api/sessions/{session_id}")
+async def delete_session(session_id: str):
+    """
+    Endpoint that forgets a session.
+    """
+    session_agent = get_agent()
+    if not (session_agent.sessions and session_agent.sessions.delete(session_id)):
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+    return {"deleted": session_id}
+
+
+def describe_config() -> dict:
+    """
+    Settings the current agent was built from, as reported by health and reload.
+    """
+    return {
+        "use_langsmith": settings.USE_LANGSMITH,
+        "max_iterations": settings.MAX_ITERATIONS,
+        "max_iterations_limit": settings.MAX_ITERATIONS_LIMIT,
+        "verbose": settings.VERBOSE,
+        "main_model": settings.MAIN_MODEL,
+        "draft_model": settings.DRAFT_MODEL or None,
+        "reflection_model": settings.REFLECTION_MODEL,
+        "allowed_models": agent.allowed_models if agent is not None else None,
+        "prompt_variants": sorted(agent.prompt_variants) if agent is not None else None,
+        "request_timeout_seconds": settings.REQUEST_TIMEOUT_SECONDS,
+        "deadline_estimate_margin": settings.DEADLINE_ESTIMATE_MARGIN,
+        "compaction_strategy": settings.COMPACTION_STRATEGY,
+        "topology": settings.GRAPH_TOPOLOGY,
+        "checkpoint_backend": settings.CHECKPOINT_BACKEND,
+        "reflection_mode": settings.REFLECTION_MODE,
+        "target_score": settings.TARGET_SCORE,
+        "min_score_delta": settings.MIN_SCORE_DELTA,
+        "draft_similarity_threshold": settings.DRAFT_SIMILARITY_THRESHOLD
+    }
+
+
+@app.post("/api/config/reload")
+async def reload_config():
+    """
+    Endpoint that re-reads the settings and .env and swaps in an agent built from them.
+    """
+    start = time.perf_counter()
+    try:
+        _, rebuilt = await reload_agent()
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error reloading configuration: {str(e)}")
+
+    return {"reloaded": True, "seconds": round(time.perf_counter() - start, 3), "config": describe_config(),
+            "rebuilt_stores": rebuilt}
+
 
 @app.get("/api/health")
 async def health_check():
     """
     Health check endpoint to verify server status.
     """
+    ready = agent is not None
     return {
         "status": "Server is running", 
-        "config": {
-            "use_langsmith": USE_LANGSMITH,
-            "max_iterations": MAX_ITERATIONS,
-            "verbose": VERBOSE,
-            "main_model": MAIN_MODEL,
-            "reflection_model": REFLECTION_MODEL
-        }
+        "ready": ready,
+        # Each worker process answers for itself; the pid tells them apart
+        "worker_pid": os.getpid(),
+        "startup_seconds": round(_ready_after, 3) if _ready_after is not None else None,
+        "error": agent_error,
+        "config": describe_config(),
+        "reflection_parsing": parse_stats.snapshot(),
+        # Agent statistics are only available once warm-up has built the agent
+        "cache": agent.cache.stats() if ready and agent.cache else None,
+        "semantic_cache": agent.semantic_cache.stats() if ready and agent.semantic_cache else None,
+        "reflection_gate": agent.reflection_gate.stats() if ready and agent.reflection_gate else None,
+        "sessions": agent.sessions.stats() if ready and agent.sessions else None,
+        "coalescing": agent.coalescer.stats() if ready and agent.coalescer else None,
+        "client_pool": agent.client_pool.stats() if ready and agent.client_pool else None,
+        "routing": agent.router.stats() if ready and agent.router else None,
+        "profiles": agent.profiles.stats() if ready else None,
+        "phase_latency": agent.phase_latency.stats() if ready else None,
+        "circuit_breakers": {name: breaker.stats() for name, breaker in agent.circuit_breakers.items()} if ready else None,
+        "schedulers": {name: scheduler.stats() for name, scheduler in agent.rate_limiters.items()} if ready else None
     }
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Prometheus scrape endpoint with per-phase latency, token, routing, run and cache metrics.
+    """
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -0,0 +1,31 @@
+"""
+Result caching for completed reflection runs.
+"""
+from typing import Optional
+
+from src.cache.base import ResultCache
+
+def create_result_cache(backend: str, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600,
+                        path: str = "cache.db") -> Optional[ResultCache]:
+    """
+    Create a result cache for the configured backend.
+    
+    Args:
+        backend: "memory", "sqlite", or "none" to disable caching
+        max_entries: Maximum number of cached results
+        ttl_seconds: Lifetime of an entry in seconds (0 or None disables expiry)
+        path: Database file used by the sqlite backend
+    
+    Returns:
+        The cache instance, or None when caching is disabled
+    """
+    backend = (backend or "none").lower()
+    if backend == "none":
+        return None
+    if backend == "memory":
+        from src.cache.memory import MemoryResultCache
+        return MemoryResultCache(max_entries, ttl_seconds)
+    if backend == "sqlite":
+        from src.cache.sqlite import SQLiteResultCache
+        return SQLiteResultCache(path, max_entries, ttl_seconds)
+    raise ValueError(f"Unknown cache backend: {backend}")
@@ -0,0 +1,105 @@
+"""
+Base classes and helpers for caching completed reflection runs.
+"""
+import hashlib
+import json
+import re
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Optional
+
+_WHITESPACE_RE = re.compile(r"\s+")
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a query so trivially different spellings share a cache entry.
+    
+    Args:
+        query: Raw user query
+    
+    Returns:
+        Query with surrounding whitespace stripped, inner whitespace collapsed and case folded
+    """
+    return _WHITESPACE_RE.sub(" ", query.strip()).casefold()
+
+def make_cache_key(query: str, config: Dict[str, Any]) -> str:
+    """
+    Build a stable cache key from the normalized query and the agent configuration.
+    
+    Args:
+        query: Raw user query
+        config: Agent settings that influence the result (models, prompts, iterations)
+    
+    Returns:
+        Hex digest identifying the (query, configuration) pair
+    """
+    payload = json.dumps({"query": normalize_query(query), "config": config}, sort_keys=True)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+class CacheStats:
+    """Thread-safe hit/miss/eviction counters shared by all cache backends."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def record(self, field: str, amount: int = 1):
+        """Increment one of the counters."""
+        with self._lock:
+            setattr(self, field, getattr(self, field) + amount)
+    
+    def snapshot(self) -> Dict[str, Any]:
+        """Return the current counters along with the derived hit rate."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "sets": self.sets,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": self.hits / lookups if lookups else 0.0
+            }
+
+class ResultCache(ABC):
+    """
+    Interface for caches of completed agent results.
+    
+    Backends store the dict returned by ReflectionPatternAgent.run keyed by
+    make_cache_key, bound the number of entries and expire them after a TTL.
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.metrics = CacheStats()
+    
+    @abstractmethod
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the cached result for key, or None on a miss."""
+    
+    @abstractmethod
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        """Store a result, evicting the least recently used entries if full."""
+    
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+    
+    @abstractmethod
+    def __len__(self) -> int:
+        """Number of entries currently stored."""
+    
+    def stats(self) -> Dict[str, Any]:
+        """Return hit/miss metrics together with the backend's size limits."""
+        return {
+            "backend": type(self).__name__,
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            **self.metrics.snapshot()
+        }
@@ -0,0 +1,57 @@
+"""
+In-memory LRU/TTL backend for the result cache.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from src.cache.base import ResultCache
+
+class MemoryResultCache(ResultCache):
+    """
+    Process-local cache ordered by recency of use.
+    
+    Lookups are a dict access plus a move_to_end, so hits are served in
+    microseconds. Entries older than ttl_seconds are dropped lazily on access.
+    """
+    
+    def __init__(self, max_entries: int = 1024, ttl_seconds: Optional[float] = 3600):
+        super().__init__(max_entries, ttl_seconds)
+        self._entries: "OrderedDict[str, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.metrics.record("misses")
+                return None
+            
+            stored_at, result = entry
+            if self.ttl_seconds is not None and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.metrics.record("expirations")
+                self.metrics.record("misses")
+                return None
+            
+            self._entries.move_to_end(key)
+            self.metrics.record("hits")
+            return result
+    
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic(), result)
+            self._entries.move_to_end(key)
+            self.metrics.record("sets")
+            
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.metrics.record("evictions")
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+    
+    def __len__(self) -> int:
+        return len(self._entries)
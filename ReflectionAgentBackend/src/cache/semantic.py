@@ -0,0 +1,294 @@
+"""
+Semantic near-duplicate cache backed by local embeddings and a NumPy vector index.
+"""
+import itertools
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.messages import messages_from_dict, messages_to_dict
+
+from src.cache.base import CacheStats, normalize_query
+
+_TOKEN_RE = re.compile(r"\w+")
+
+class Embedder(ABC):
+    """Interface for query embedders used by the semantic cache."""
+    
+    dim: int
+    
+    @abstractmethod
+    def embed(self, text: str) -> np.ndarray:
+        """Return an L2-normalized float32 vector of length dim."""
+
+class HashingEmbedder(Embedder):
+    """
+    Offline embedder using the hashing trick over word and character n-grams.
+    
+    Word unigrams and bigrams capture phrasing, character trigrams make it
+    tolerant to inflections and typos. Term frequencies are log-scaled, which
+    gives TF-IDF-like damping of repeated words without a fitted vocabulary.
+    
+    It measures shared wording, not meaning: it catches near-verbatim repeats
+    (typos, punctuation, a filler word), but a real paraphrase scores lower than
+    a different question that reuses most of the words. Matching paraphrases
+    needs an Embedder backed by a sentence-embedding model.
+    """
+    
+    def __init__(self, dim: int = 1024, char_ngram: int = 3):
+        self.dim = dim
+        self.char_ngram = char_ngram
+    
+    def _features(self, text: str) -> List[str]:
+        words = _TOKEN_RE.findall(normalize_query(text))
+        features = list(words)
+        features.extend(f"{a} {b}" for a, b in zip(words, words[1:]))
+        n = self.char_ngram
+        for word in words:
+            padded = f"<{word}>"
+            features.extend(f"#{padded[i:i + n]}" for i in range(max(1, len(padded) - n + 1)))
+        return features
+    
+    def embed(self, text: str) -> np.ndarray:
+        features = self._features(text)
+        hashes = np.fromiter(
+            (zlib.crc32(feature.encode("utf-8")) for feature in features),
+            dtype=np.uint32, count=len(features)
+        )
+        # The top bit picks the sign so colliding features tend to cancel out
+        indices = (hashes & 0x7FFFFFFF) % self.dim
+        signs = np.where(hashes & 0x80000000, 1.0, -1.0)
+        counts = np.bincount(indices, weights=signs, minlength=self.dim)
+        
+        vector = (np.sign(counts) * np.log1p(np.abs(counts))).astype(np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm > 0 else vector
+
+class VectorIndex:
+    """
+    Dense cosine-similarity index over normalized vectors.
+    
+    Vectors live in one contiguous float32 matrix that grows by doubling, so a
+    lookup is a single matrix-vector product regardless of index size.
+    """
+    
+    def __init__(self, dim: int, initial_capacity: int = 64):
+        self.dim = dim
+        self._vectors = np.zeros((initial_capacity, dim), dtype=np.float32)
+        self._size = 0
+    
+    def __len__(self) -> int:
+        return self._size
+    
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._vectors[:self._size]
+    
+    def add(self, vector: np.ndarray) -> int:
+        """Append a vector and return its position."""
+        if self._size == len(self._vectors):
+            grown = np.zeros((len(self._vectors) * 2, self.dim), dtype=np.float32)
+            grown[:self._size] = self._vectors[:self._size]
+            self._vectors = grown
+        self._vectors[self._size] = vector
+        self._size += 1
+        return self._size - 1
+    
+    def remove(self, position: int) -> int:
+        """Remove a vector by moving the last one into its slot; returns the moved position."""
+        last = self._size - 1
+        self._vectors[position] = self._vectors[last]
+        self._size -= 1
+        return last
+    
+    def similarities(self, vector: np.ndarray) -> np.ndarray:
+        """Cosine similarity of vector against every stored vector."""
+        return self.vectors @ vector
+
+class SemanticCache:
+    """
+    Cache that returns a stored final response for near-duplicate queries.
+    
+    Entries are partitioned by namespace (the agent's cache configuration key)
+    so results produced under different models or prompts never match. When
+    max_entries is reached the least recently used entry is evicted.
+    """
+    
+    def __init__(
+        self,
+        embedder: Optional[Embedder] = None,
+        threshold: float = 0.92,
+        max_entries: int = 5000,
+        ttl_seconds: Optional[float] = None,
+        path: Optional[str] = None
+    ):
+        self.embedder = embedder or HashingEmbedder()
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds if ttl_seconds and ttl_seconds > 0 else None
+        self.path = path
+        self.metrics = CacheStats()
+        self._lock = threading.Lock()
+        self._reset()
+        
+        if path and os.path.exists(path):
+            self.load(path)
+    
+    def __len__(self) -> int:
+        return len(self._entries)
+    
+    def _reset(self, capacity: int = 64) -> None:
+        self._index = VectorIndex(self.embedder.dim, capacity)
+        self._entries: List[Dict[str, Any]] = []
+        # Stable id of the entry at each index position, and id -> position ordered by recency of use
+        self._ids: List[int] = []
+        self._recency: "OrderedDict[int, int]" = OrderedDict()
+        self._next_id = itertools.count()
+    
+    def _add(self, vector: np.ndarray, entry: Dict[str, Any]) -> None:
+        position = self._index.add(vector)
+        entry_id = next(self._next_id)
+        self._entries.append(entry)
+        self._ids.append(entry_id)
+        self._recency[entry_id] = position
+    
+    def _remove(self, position: int) -> None:
+        del self._recency[self._ids[position]]
+        moved = self._index.remove(position)
+        self._entries[position] = self._entries[moved]
+        self._ids[position] = self._ids[moved]
+        self._entries.pop()
+        self._ids.pop()
+        if moved != position:
+            # Reassigning an existing key keeps its place in the recency order
+            self._recency[self._ids[position]] = position
+    
+    def lookup(self, query: str, namespace: str = "") -> Optional[Tuple[Dict[str, Any], float]]:
+        """
+        Find the closest stored query in the namespace.
+        
+        Args:
+            query: Incoming user query
+            namespace: Agent configuration key the result must have been produced under
+        
+        Returns:
+            (result, similarity) when a match at or above the threshold exists, otherwise None
+        """
+        vector = self.embedder.embed(query)
+        now = time.time()
+        
+        with self._lock:
+            if not self._entries:
+                self.metrics.record("misses")
+                return None
+            
+            similarities = self._index.similarities(vector)
+            candidates = np.flatnonzero(similarities >= self.threshold)
+            match = None
+            expired = []
+            # Scan the few candidates above the threshold from most to least similar
+            for position in candidates[np.argsort(-similarities[candidates])]:
+                entry = self._entries[position]
+                if entry["namespace"] != namespace:
+                    continue
+                if self.ttl_seconds is not None and now - entry["created_at"] > self.ttl_seconds:
+                    # A less similar candidate may still be valid
+                    expired.append(int(position))
+                    continue
+                entry["accessed_at"] = now
+                self._recency.move_to_end(self._ids[position])
+                match = entry["result"], float(similarities[position])
+                break
+            
+            # Highest position first: each removal moves the last entry, which is never still pending
+            for position in sorted(expired, reverse=True):
+                self._remove(position)
+                self.metrics.record("expirations")
+            
+            self.metrics.record("misses" if match is None else "hits")
+            return match
+    
+    def store(self, query: str, result: Dict[str, Any], namespace: str = "") -> None:
+        """Add a completed result, evicting the least recently used entry when full."""
+        vector = self.embedder.embed(query)
+        now = time.time()
+        
+        with self._lock:
+            while self._entries and len(self._entries) >= self.max_entries:
+                self._remove(next(iter(self._recency.values())))
+                self.metrics.record("evictions")
+            
+            self._add(vector, {
+                "query": query,
+                "namespace": namespace,
+                "result": result,
+                "created_at": now,
+                "accessed_at": now
+            })
+            self.metrics.record("sets")
+    
+    def clear(self) -> None:
+        with self._lock:
+            self._reset()
+    
+    def save(self, path: Optional[str] = None) -> None:
+        """Persist vectors and entries to an .npz file, replacing it atomically."""
+        path = path or self.path
+        if not path:
+            return
+        
+        with self._lock:
+            entries = [
+                {**entry, "result": {**entry["result"], "messages": messages_to_dict(entry["result"].get("messages", []))}}
+                for entry in self._entries
+            ]
+            vectors = self._index.vectors.copy()
+        
+        # Every worker saves on shutdown, so each writes its own temporary file and renames it into place:
+        # the last save wins whole instead of several interleaving into a corrupt file.
+        # Writing through a file object keeps numpy from appending .npz to the name.
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)),
+                                        prefix=os.path.basename(path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                np.savez(f, vectors=vectors, entries=np.array(json.dumps(entries)))
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    
+    def load(self, path: Optional[str] = None) -> None:
+        """Load vectors and entries previously written by save."""
+        path = path or self.path
+        with np.load(path) as data:
+            vectors = data["vectors"]
+            entries = json.loads(str(data["entries"]))
+        
+        if vectors.shape[1:] != (self.embedder.dim,):
+            raise ValueError(f"Semantic cache at {path} has dimension {vectors.shape[1:]}, expected {self.embedder.dim}")
+        
+        with self._lock:
+            self._reset(max(64, len(vectors)))
+            # Added least recently used first, so the recency order survives a restart
+            for position in sorted(range(len(entries)), key=lambda i: entries[i]["accessed_at"]):
+                entry = entries[position]
+                entry["result"]["messages"] = messages_from_dict(entry["result"].get("messages", []))
+                self._add(vectors[position], entry)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": type(self).__name__,
+            "size": len(self),
+            "max_entries": self.max_entries,
+            "threshold": self.threshold,
+            "ttl_seconds": self.ttl_seconds,
+            **self.metrics.snapshot()
+        }
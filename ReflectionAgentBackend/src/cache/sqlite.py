@@ -0,0 +1,118 @@
+"""
+On-disk SQLite backend for the result cache, built on SQLAlchemy Core.
+"""
+import json
+import time
+from typing import Any, Dict, Optional
+
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from sqlalchemy import Column, Float, MetaData, String, Table, Text, create_engine, delete, event, func, select, update
+from sqlalchemy.exc import OperationalError
+
+from src.cache.base import ResultCache
+
+_metadata = MetaData()
+
+_results = Table(
+    "reflection_results",
+    _metadata,
+    Column("key", String(64), primary_key=True),
+    Column("value", Text, nullable=False),
+    Column("created_at", Float, nullable=False),
+    Column("accessed_at", Float, nullable=False, index=True),
+)
+
+class SQLiteResultCache(ResultCache):
+    """
+    Cache persisted to a local SQLite file so it survives restarts.
+    
+    Results are stored as JSON, with LangChain messages converted through
+    messages_to_dict. When the table grows past max_entries the least
+    recently accessed rows are deleted.
+    
+    The file can be shared by several server worker processes: the database
+    runs in WAL mode so readers never wait for a writer, and writers wait up
+    to busy_timeout seconds for each other instead of failing.
+    """
+    
+    def __init__(self, path: str = "cache.db", max_entries: int = 10000, ttl_seconds: Optional[float] = 3600,
+                 busy_timeout: float = 5.0):
+        super().__init__(max_entries, ttl_seconds)
+        self.path = path
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False,
+                                                                         "timeout": busy_timeout})
+        event.listen(self.engine, "connect", self._configure_connection)
+        try:
+            _metadata.create_all(self.engine)
+        except OperationalError:
+            # Another worker created the table between the existence check and CREATE TABLE
+            _metadata.create_all(self.engine)
+    
+    @staticmethod
+    def _configure_connection(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+    
+    @staticmethod
+    def _serialize(result: Dict[str, Any]) -> str:
+        payload = dict(result)
+        payload["messages"] = messages_to_dict(result.get("messages", []))
+        return json.dumps(payload)
+    
+    @staticmethod
+    def _deserialize(value: str) -> Dict[str, Any]:
+        payload = json.loads(value)
+        payload["messages"] = messages_from_dict(payload.get("messages", []))
+        return payload
+    
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        now = time.time()
+        # Read outside a write transaction so concurrent lookups from other workers never block
+        with self.engine.connect() as conn:
+            row = conn.execute(
+                select(_results.c.value, _results.c.created_at).where(_results.c.key == key)
+            ).first()
+        if row is None:
+            self.metrics.record("misses")
+            return None
+        
+        if self.ttl_seconds is not None and now - row.created_at > self.ttl_seconds:
+            with self.engine.begin() as conn:
+                conn.execute(delete(_results).where(_results.c.key == key))
+            self.metrics.record("expirations")
+            self.metrics.record("misses")
+            return None
+        
+        try:
+            with self.engine.begin() as conn:
+                conn.execute(update(_results).where(_results.c.key == key).values(accessed_at=now))
+        except OperationalError:
+            # The recency update only affects eviction order; skip it if writers are backed up
+            pass
+        
+        self.metrics.record("hits")
+        return self._deserialize(row.value)
+    
+    def set(self, key: str, result: Dict[str, Any]) -> None:
+        now = time.time()
+        value = self._serialize(result)
+        with self.engine.begin() as conn:
+            conn.execute(delete(_results).where(_results.c.key == key))
+            conn.execute(_results.insert().values(key=key, value=value, created_at=now, accessed_at=now))
+            self.metrics.record("sets")
+            
+            overflow = conn.execute(select(func.count()).select_from(_results)).scalar_one() - self.max_entries
+            if overflow > 0:
+                oldest = select(_results.c.key).order_by(_results.c.accessed_at).limit(overflow)
+                conn.execute(delete(_results).where(_results.c.key.in_(oldest.scalar_subquery())))
+                self.metrics.record("evictions", overflow)
+    
+    def clear(self) -> None:
+        with self.engine.begin() as conn:
+            conn.execute(delete(_results))
+    
+    def __len__(self) -> int:
+        with self.engine.connect() as conn:
+            return conn.execute(select(func.count()).select_from(_results)).scalar_one()
@@ -0,0 +1,34 @@
+"""
+Checkpointing of reflection graph runs, so interrupted runs can be resumed.
+"""
+from typing import Optional
+
+class RunConflictError(RuntimeError):
+    """Raised when a run id is reused for a different query, or while that run is still in progress."""
+
+    def __init__(self, run_id: str, reason: str):
+        super().__init__(f"Run {run_id} {reason}")
+        self.run_id = run_id
+
+def create_checkpointer(backend: str, path: str = "checkpoints.db", ttl_seconds: Optional[float] = 86400):
+    """
+    Create a LangGraph checkpoint saver for the configured backend.
+
+    Args:
+        backend: "memory", "sqlite", or "none" to disable checkpointing
+        path: Database file used by the sqlite backend
+        ttl_seconds: How long the sqlite backend keeps checkpoints (0 or None keeps them forever)
+
+    Returns:
+        The checkpoint saver, or None when checkpointing is disabled
+    """
+    backend = (backend or "none").lower()
+    if backend == "none":
+        return None
+    if backend == "memory":
+        from langgraph.checkpoint.memory import MemorySaver
+        return MemorySaver()
+    if backend == "sqlite":
+        from src.checkpoint.sqlite import SQLiteCheckpointSaver
+        return SQLiteCheckpointSaver(path, ttl_seconds)
+    raise ValueError(f"Unknown checkpoint backend: {backend}")
@@ -0,0 +1,310 @@
+"""
+SQLite checkpointer for the reflection graph, built on SQLAlchemy Core.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+    get_checkpoint_metadata,
+)
+from langgraph.checkpoint.serde.types import TASKS
+from sqlalchemy import (
+    Column, Float, Integer, LargeBinary, MetaData, String, Table, create_engine, delete, event, select
+)
+from sqlalchemy.dialects.sqlite import insert
+from sqlalchemy.exc import OperationalError
+
+_metadata = MetaData()
+
+_checkpoints = Table(
+    "reflection_checkpoints",
+    _metadata,
+    Column("thread_id", String, primary_key=True),
+    Column("checkpoint_ns", String, primary_key=True),
+    Column("checkpoint_id", String, primary_key=True),
+    Column("parent_checkpoint_id", String),
+    Column("type", String),
+    Column("checkpoint", LargeBinary, nullable=False),
+    Column("metadata_type", String),
+    Column("metadata", LargeBinary, nullable=False),
+    Column("created_at", Float, nullable=False, index=True),
+)
+
+_writes = Table(
+    "reflection_checkpoint_writes",
+    _metadata,
+    Column("thread_id", String, primary_key=True),
+    Column("checkpoint_ns", String, primary_key=True),
+    Column("checkpoint_id", String, primary_key=True),
+    Column("task_id", String, primary_key=True),
+    Column("idx", Integer, primary_key=True),
+    Column("channel", String, nullable=False),
+    Column("type", String),
+    Column("value", LargeBinary),
+    Column("task_path", String, nullable=False, default=""),
+    Column("created_at", Float, nullable=False, index=True),
+)
+
+class SQLiteCheckpointSaver(BaseCheckpointSaver):
+    """
+    LangGraph checkpoint saver persisted to a local SQLite file.
+
+    Every superstep of a run is saved under the run's thread id, together with
+    the writes of the nodes that finished in it, so a run interrupted by a
+    timeout or a restart resumes after its last completed model call. Like the
+    SQLite result cache, the file runs in WAL mode and can be shared by several
+    worker processes. Checkpoints older than ttl_seconds are pruned as new ones
+    are written.
+    """
+
+    # Prune expired checkpoints once every this many writes
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str = "checkpoints.db", ttl_seconds: Optional[float] = 86400,
+                 busy_timeout: float = 5.0):
+        super().__init__()
+        self.path = path
+        self.ttl_seconds = ttl_seconds or None
+        self.engine = create_engine(f"sqlite:///{path}", connect_args={"check_same_thread": False,
+                                                                         "timeout": busy_timeout})
+        event.listen(self.engine, "connect", self._configure_connection)
+        try:
+            _metadata.create_all(self.engine)
+        except OperationalError:
+            # Another worker created the tables between the existence check and CREATE TABLE
+            _metadata.create_all(self.engine)
+        self._lock = threading.Lock()
+        self._puts = 0
+
+    @staticmethod
+    def _configure_connection(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        cursor.execute("PRAGMA journal_mode=WAL")
+        cursor.execute("PRAGMA synchronous=NORMAL")
+        cursor.close()
+
+    def _load_writes(self, conn, thread_id: str, checkpoint_ns: str,
+                     checkpoint_id: str) -> List[Tuple[str, str, Any]]:
+        rows = conn.execute(
+            select(_writes.c.task_id, _writes.c.channel, _writes.c.type, _writes.c.value)
+            .where(_writes.c.thread_id == thread_id, _writes.c.checkpoint_ns == checkpoint_ns,
+                   _writes.c.checkpoint_id == checkpoint_id)
+            .order_by(_writes.c.task_id, _writes.c.idx)
+        ).all()
+        return [(row.task_id, row.channel, self.serde.loads_typed((row.type, row.value))) for row in rows]
+
+    def _load_sends(self, conn, thread_id: str, checkpoint_ns: str, parent_checkpoint_id: Optional[str]) -> List[Any]:
+        """Sends written by the parent checkpoint's tasks, which the current checkpoint still has to run"""
+        if not parent_checkpoint_id:
+            return []
+        rows = conn.execute(
+            select(_writes.c.type, _writes.c.value)
+            .where(_writes.c.thread_id == thread_id, _writes.c.checkpoint_ns == checkpoint_ns,
+                   _writes.c.checkpoint_id == parent_checkpoint_id, _writes.c.channel == TASKS)
+            .order_by(_writes.c.task_path, _writes.c.task_id, _writes.c.idx)
+        ).all()
+        return [self.serde.loads_typed((row.type, row.value)) for row in rows]
+
+    def _to_tuple(self, conn, row, metadata: Optional[CheckpointMetadata] = None) -> CheckpointTuple:
+        def config(checkpoint_id: str) -> RunnableConfig:
+            return {"configurable": {"thread_id": row.thread_id, "checkpoint_ns": row.checkpoint_ns,
+                                     "checkpoint_id": checkpoint_id}}
+
+        return CheckpointTuple(
+            config=config(row.checkpoint_id),
+            checkpoint={
+                **self.serde.loads_typed((row.type, row.checkpoint)),
+                "pending_sends": self._load_sends(conn, row.thread_id, row.checkpoint_ns, row.parent_checkpoint_id)
+            },
+            metadata=metadata if metadata is not None else self.serde.loads_typed((row.metadata_type, row.metadata)),
+            parent_config=config(row.parent_checkpoint_id) if row.parent_checkpoint_id else None,
+            pending_writes=self._load_writes(conn, row.thread_id, row.checkpoint_ns, row.checkpoint_id)
+        )
+
+    def get_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        """Return the requested checkpoint of a thread, or its latest one when no checkpoint id is given"""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = select(_checkpoints).where(_checkpoints.c.thread_id == thread_id,
+                                           _checkpoints.c.checkpoint_ns == checkpoint_ns)
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            query = query.where(_checkpoints.c.checkpoint_id == checkpoint_id)
+        else:
+            # Checkpoint ids are time-ordered, so the largest is the latest
+            query = query.order_by(_checkpoints.c.checkpoint_id.desc()).limit(1)
+
+        with self.engine.connect() as conn:
+            row = conn.execute(query).first()
+            return self._to_tuple(conn, row) if row is not None else None
+
+    def list(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> Iterator[CheckpointTuple]:
+        """Yield matching checkpoints, newest first"""
+        query = select(_checkpoints).order_by(_checkpoints.c.checkpoint_id.desc())
+        if config is not None:
+            query = query.where(_checkpoints.c.thread_id == config["configurable"]["thread_id"])
+            checkpoint_ns = config["configurable"].get("checkpoint_ns")
+            if checkpoint_ns is not None:
+                query = query.where(_checkpoints.c.checkpoint_ns == checkpoint_ns)
+            checkpoint_id = get_checkpoint_id(config)
+            if checkpoint_id:
+                query = query.where(_checkpoints.c.checkpoint_id == checkpoint_id)
+        if before is not None and (before_id := get_checkpoint_id(before)):
+            query = query.where(_checkpoints.c.checkpoint_id < before_id)
+
+        results = []
+        with self.engine.connect() as conn:
+            for row in conn.execute(query):
+                if limit is not None and len(results) >= limit:
+                    break
+                # Metadata is stored serialized, so filters are applied after loading it
+                metadata = self.serde.loads_typed((row.metadata_type, row.metadata))
+                if filter and not all(metadata.get(key) == value for key, value in filter.items()):
+                    continue
+                results.append(self._to_tuple(conn, row, metadata))
+        yield from results
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        """Save a checkpoint and return the config that points at it"""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        saved = checkpoint.copy()
+        # Pending sends are rebuilt from the parent's writes when the checkpoint is loaded
+        saved.pop("pending_sends", None)
+        checkpoint_type, checkpoint_value = self.serde.dumps_typed(saved)
+        metadata_type, metadata_value = self.serde.dumps_typed(get_checkpoint_metadata(config, metadata))
+        values = {
+            "thread_id": thread_id,
+            "checkpoint_ns": checkpoint_ns,
+            "checkpoint_id": checkpoint["id"],
+            "parent_checkpoint_id": config["configurable"].get("checkpoint_id"),
+            "type": checkpoint_type,
+            "checkpoint": checkpoint_value,
+            "metadata_type": metadata_type,
+            "metadata": metadata_value,
+            "created_at": time.time()
+        }
+        statement = insert(_checkpoints).values(**values)
+        with self.engine.begin() as conn:
+            conn.execute(statement.on_conflict_do_update(
+                index_elements=["thread_id", "checkpoint_ns", "checkpoint_id"],
+                set_={key: statement.excluded[key] for key in values if key not in
+                      ("thread_id", "checkpoint_ns", "checkpoint_id")}
+            ))
+        self._maybe_prune()
+        return {"configurable": {"thread_id": thread_id, "checkpoint_ns": checkpoint_ns,
+                                 "checkpoint_id": checkpoint["id"]}}
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        """Save the writes of a finished task so they are not recomputed when the run resumes"""
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        checkpoint_id = config["configurable"]["checkpoint_id"]
+        now = time.time()
+        with self.engine.begin() as conn:
+            for index, (channel, value) in enumerate(writes):
+                idx = WRITES_IDX_MAP.get(channel, index)
+                value_type, value_bytes = self.serde.dumps_typed(value)
+                statement = insert(_writes).values(
+                    thread_id=thread_id, checkpoint_ns=checkpoint_ns, checkpoint_id=checkpoint_id,
+                    task_id=task_id, idx=idx, channel=channel, type=value_type, value=value_bytes,
+                    task_path=task_path, created_at=now
+                )
+                # Regular writes are kept from the first attempt; special writes (errors, interrupts) are replaced
+                if idx >= 0:
+                    statement = statement.on_conflict_do_nothing()
+                else:
+                    statement = statement.on_conflict_do_update(
+                        index_elements=["thread_id", "checkpoint_ns", "checkpoint_id", "task_id", "idx"],
+                        set_={"channel": channel, "type": value_type, "value": value_bytes,
+                              "task_path": task_path, "created_at": now}
+                    )
+                conn.execute(statement)
+
+    async def aget_tuple(self, config: RunnableConfig) -> Optional[CheckpointTuple]:
+        return await asyncio.to_thread(self.get_tuple, config)
+
+    async def alist(
+        self,
+        config: Optional[RunnableConfig],
+        *,
+        filter: Optional[Dict[str, Any]] = None,
+        before: Optional[RunnableConfig] = None,
+        limit: Optional[int] = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        results = await asyncio.to_thread(lambda: list(self.list(config, filter=filter, before=before, limit=limit)))
+        for result in results:
+            yield result
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await asyncio.to_thread(self.put, config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[Tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        await asyncio.to_thread(self.put_writes, config, writes, task_id, task_path)
+
+    def delete_thread(self, thread_id: str) -> None:
+        """Delete every checkpoint and write of a thread"""
+        with self.engine.begin() as conn:
+            conn.execute(delete(_writes).where(_writes.c.thread_id == thread_id))
+            conn.execute(delete(_checkpoints).where(_checkpoints.c.thread_id == thread_id))
+
+    def prune(self) -> None:
+        """Delete checkpoints and writes older than ttl_seconds"""
+        if self.ttl_seconds is None:
+            return
+        cutoff = time.time() - self.ttl_seconds
+        with self.engine.begin() as conn:
+            conn.execute(delete(_writes).where(_writes.c.created_at < cutoff))
+            conn.execute(delete(_checkpoints).where(_checkpoints.c.created_at < cutoff))
+
+    def _maybe_prune(self) -> None:
+        with self._lock:
+            self._puts += 1
+            due = self._puts % self.PRUNE_EVERY == 0
+        if due:
+            try:
+                self.prune()
+            except OperationalError:
+                # Pruning is housekeeping; another worker will get to it
+                pass
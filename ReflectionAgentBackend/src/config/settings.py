@@ -1,24 +1,154 @@
 """
 Configuration settings for the Reflection Agent Backend.
 Loads environment variables and provides defaults.
+
+POST /api/config/reload re-imports this module, so edits to .env apply
+without a restart; variables set in the process environment keep priority,
+and a variable removed from .env falls back to its default.
 """
 import os
-from dotenv import load_dotenv
+from dotenv import dotenv_values
+
+# Variables the process started with, captured once so a reload cannot mistake .env values for them
+_PROCESS_ENV = globals().get("_PROCESS_ENV") or frozenset(os.environ)
 
 # Load environment variables from .env file if it exists
-load_dotenv()
+_DOTENV = {name: value for name, value in dotenv_values().items() if name not in _PROCESS_ENV and value is not None}
+# Variables an earlier load took from .env and that are no longer in it
+for _name in set(globals().get("_DOTENV_NAMES", ())) - set(_DOTENV):
+    os.environ.pop(_name, None)
+os.environ.update(_DOTENV)
+_DOTENV_NAMES = frozenset(_DOTENV)
 
 # API Settings
 PORT = int(os.environ.get("PORT", 5001))
 HOST = os.environ.get("HOST", "0.0.0.0")
 DEBUG = os.environ.get("DEBUG", "false").lower() == "true"
+# Server worker processes outside DEBUG mode; each builds its own agent
+WORKERS = int(os.environ.get("WORKERS", "1"))
 
 # Model Settings
+LLM_BACKEND = os.environ.get("LLM_BACKEND", "gemini").lower()  # gemini, or fake for offline load tests
 GOOGLE_API_KEY = os.environ.get("GEMINI_API_KEY", "")
 MAIN_MODEL = os.environ.get("MAIN_MODEL", "gemini-2.0-flash-exp")
 REFLECTION_MODEL = os.environ.get("REFLECTION_MODEL", "gemini-2.0-flash")
+# Routing tier: cheap model for first drafts, MAIN_MODEL on escalation (empty disables routing)
+DRAFT_MODEL = os.environ.get("DRAFT_MODEL", "")
+# Query classes (simple, moderate, complex) whose first draft goes straight to MAIN_MODEL
+ROUTING_ESCALATE_CLASSES = [c.strip() for c in os.environ.get("ROUTING_ESCALATE_CLASSES", "complex").split(",") if c.strip()]
+# Prices per million input:output tokens, e.g. "gemini-2.0-flash-lite=0.075:0.3,gemini-2.0-flash=0.1:0.4"
+MODEL_PRICES = os.environ.get("MODEL_PRICES", "")
 MAX_ITERATIONS = int(os.environ.get("MAX_ITERATIONS", "3"))
+
+# Per-Request Override Settings
+# Generation models a request may pick besides MAIN_MODEL and DRAFT_MODEL, e.g. "gemini-2.0-flash,gemini-1.5-pro"
+ALLOWED_MODELS = [m.strip() for m in os.environ.get("ALLOWED_MODELS", "").split(",") if m.strip()]
+# Highest max_iterations a request may ask for
+MAX_ITERATIONS_LIMIT = int(os.environ.get("MAX_ITERATIONS_LIMIT", "10"))
+# JSON file of named prompt variants, {"name": {"main": "...", "reflection": "..."}}; "concise" is built in
+PROMPT_VARIANTS_PATH = os.environ.get("PROMPT_VARIANTS_PATH", "")
+# Distinct override combinations kept resolved for reuse
+PROFILE_POOL_SIZE = int(os.environ.get("PROFILE_POOL_SIZE", "32"))
 VERBOSE = os.environ.get("VERBOSE", "true").lower() == "true"
+# How the transcript is compacted before regeneration: full, latest or condensed
+COMPACTION_STRATEGY = os.environ.get("COMPACTION_STRATEGY", "condensed").lower()
+# Reflection output format: text (parsed tolerantly) or structured (schema-constrained)
+REFLECTION_MODE = os.environ.get("REFLECTION_MODE", "text").lower()
+
+# Graph topology: sequential (generate/reflect loop) or speculative (parallel drafts, one judging pass)
+GRAPH_TOPOLOGY = os.environ.get("GRAPH_TOPOLOGY", "sequential").lower()
+# Sampling temperature of each speculative draft; the number of entries is the number of drafts
+SPECULATIVE_TEMPERATURES = [float(t) for t in os.environ.get("SPECULATIVE_TEMPERATURES", "0.3,0.7,1.0").split(",") if t.strip()]
+
+# Convergence Settings (empty disables a criterion)
+TARGET_SCORE = os.environ.get("TARGET_SCORE", "9")
+MIN_SCORE_DELTA = os.environ.get("MIN_SCORE_DELTA", "0.5")
+DRAFT_SIMILARITY_THRESHOLD = os.environ.get("DRAFT_SIMILARITY_THRESHOLD", "0.95")
+TARGET_SCORE = float(TARGET_SCORE) if TARGET_SCORE else None
+MIN_SCORE_DELTA = float(MIN_SCORE_DELTA) if MIN_SCORE_DELTA else None
+DRAFT_SIMILARITY_THRESHOLD = float(DRAFT_SIMILARITY_THRESHOLD) if DRAFT_SIMILARITY_THRESHOLD else None
+
+# Reflection Gate Settings
+REFLECTION_GATE_ENABLED = os.environ.get("REFLECTION_GATE_ENABLED", "false").lower() == "true"
+REFLECTION_GATE_THRESHOLD = float(os.environ.get("REFLECTION_GATE_THRESHOLD", "0.8"))
+REFLECTION_GATE_MODEL_PATH = os.environ.get("REFLECTION_GATE_MODEL_PATH", "")  # JSON weights from ReflectionGate.save
+# Requests per minute per model, e.g. "gemini-2.0-flash=15,gemini-2.0-flash-exp=10"
+MODEL_RATE_LIMITS = os.environ.get("MODEL_RATE_LIMITS", "")
+# Tokens per minute per model, same format, e.g. "gemini-2.0-flash=1000000"
+MODEL_TOKEN_LIMITS = os.environ.get("MODEL_TOKEN_LIMITS", "")
+# Seconds a run may take; model calls that cannot be admitted in time are rejected (empty disables)
+REQUEST_TIMEOUT_SECONDS = os.environ.get("REQUEST_TIMEOUT_SECONDS", "60")
+REQUEST_TIMEOUT_SECONDS = float(REQUEST_TIMEOUT_SECONDS) if REQUEST_TIMEOUT_SECONDS else None
+# Deviations of a phase's recent durations added to its mean when checking whether it fits before the deadline
+DEADLINE_ESTIMATE_MARGIN = float(os.environ.get("DEADLINE_ESTIMATE_MARGIN", "1.0"))
+
+# Resilience Settings
+MAX_RETRIES = int(os.environ.get("MAX_RETRIES", "3"))
+RETRY_DELAY = float(os.environ.get("RETRY_DELAY", "1.0"))  # Base backoff in seconds, doubled per attempt
+RETRY_MAX_DELAY = float(os.environ.get("RETRY_MAX_DELAY", "30"))
+MODEL_TIMEOUT_SECONDS = float(os.environ.get("MODEL_TIMEOUT_SECONDS", "60"))
+MODEL_CLIENT_MAX_RETRIES = int(os.environ.get("MODEL_CLIENT_MAX_RETRIES", "0"))  # Retries inside the Gemini client
+CIRCUIT_FAILURE_THRESHOLD = int(os.environ.get("CIRCUIT_FAILURE_THRESHOLD", "5"))  # 0 disables the circuit breaker
+CIRCUIT_RESET_SECONDS = float(os.environ.get("CIRCUIT_RESET_SECONDS", "30"))
+
+# Model Connection Settings, shared by every client of a model
+MODEL_TRANSPORT = os.environ.get("MODEL_TRANSPORT", "grpc").lower()  # grpc or rest
+MODEL_MAX_CONNECTIONS = int(os.environ.get("MODEL_MAX_CONNECTIONS", "1"))  # Connections per model
+MODEL_KEEPALIVE_SECONDS = float(os.environ.get("MODEL_KEEPALIVE_SECONDS", "30"))  # 0 disables keep-alive pings
+
+# Startup Settings
+# Query run once in the background after startup to open model connections; empty to skip
+WARMUP_QUERY = os.environ.get("WARMUP_QUERY", "")
+
+# Response Settings
+# Transcript inlined in responses by default: full (every message), summary (query, latest feedback, answer) or final (none)
+RESPONSE_DETAIL = os.environ.get("RESPONSE_DETAIL", "full").lower()
+# Recent run transcripts kept for GET /api/runs/{run_id}/transcript
+TRANSCRIPT_MAX_ENTRIES = int(os.environ.get("TRANSCRIPT_MAX_ENTRIES", "1000"))
+TRANSCRIPT_TTL_SECONDS = float(os.environ.get("TRANSCRIPT_TTL_SECONDS", "3600"))
+
+# Batch Settings
+BATCH_MAX_CONCURRENCY = int(os.environ.get("BATCH_MAX_CONCURRENCY", "8"))
+BATCH_MAX_QUERIES = int(os.environ.get("BATCH_MAX_QUERIES", "1000"))
+
+# Fake LLM Settings (used when LLM_BACKEND=fake)
+FAKE_LLM_LATENCY = float(os.environ.get("FAKE_LLM_LATENCY", "0.2"))
+FAKE_LLM_LATENCY_DISTRIBUTION = os.environ.get("FAKE_LLM_LATENCY_DISTRIBUTION", "constant")
+FAKE_LLM_TOKENS_PER_SECOND = float(os.environ.get("FAKE_LLM_TOKENS_PER_SECOND", "0"))
+FAKE_LLM_VERDICTS = os.environ.get("FAKE_LLM_VERDICTS", "yes,no").split(",")
+FAKE_LLM_FAILURE_RATE = float(os.environ.get("FAKE_LLM_FAILURE_RATE", "0"))
+
+# Result Cache Settings
+CACHE_BACKEND = os.environ.get("CACHE_BACKEND", "memory").lower()  # memory, sqlite or none
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", "1024"))
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", "3600"))
+CACHE_PATH = os.environ.get("CACHE_PATH", "cache.db")
+
+# Checkpoint Settings
+CHECKPOINT_BACKEND = os.environ.get("CHECKPOINT_BACKEND", "none").lower()  # none, memory or sqlite
+CHECKPOINT_PATH = os.environ.get("CHECKPOINT_PATH", "checkpoints.db")
+CHECKPOINT_TTL_SECONDS = float(os.environ.get("CHECKPOINT_TTL_SECONDS", "86400"))
+
+# Session Settings
+SESSION_MAX_SESSIONS = int(os.environ.get("SESSION_MAX_SESSIONS", "1000"))  # 0 disables sessions
+SESSION_IDLE_SECONDS = float(os.environ.get("SESSION_IDLE_SECONDS", "3600"))
+# Token budget of the earlier turns replayed verbatim before a follow-up
+SESSION_HISTORY_TOKENS = int(os.environ.get("SESSION_HISTORY_TOKENS", "1500"))
+# Size limit of the rolling summary of turns that no longer fit the budget
+SESSION_SUMMARY_TOKENS = int(os.environ.get("SESSION_SUMMARY_TOKENS", "300"))
+# How that summary is written: extractive (no model call) or model (the reflection model)
+SESSION_SUMMARY_MODE = os.environ.get("SESSION_SUMMARY_MODE", "extractive").lower()
+
+# Coalescing Settings
+# Identical queries arriving while one is running share that run's result or stream instead of starting another
+COALESCE_REQUESTS = os.environ.get("COALESCE_REQUESTS", "true").lower() == "true"
+
+# Semantic Cache Settings
+SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() == "true"
+SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.92"))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", "5000"))
+SEMANTIC_CACHE_DIM = int(os.environ.get("SEMANTIC_CACHE_DIM", "1024"))
+SEMANTIC_CACHE_PATH = os.environ.get("SEMANTIC_CACHE_PATH", "")
 
 # LangSmith Settings
 LANGSMITH_API_KEY = os.environ.get("LANGCHAIN_API_KEY", "")
@@ -0,0 +1,99 @@
+"""
+Context compaction for regeneration prompts.
+
+Each generate step after the first only needs the original question, the
+latest draft and what to fix in it. Compaction rebuilds the prompt from those
+pieces instead of resending every earlier draft and critique.
+"""
+from typing import List, Optional
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage
+
+from src.core.verdict import extract_sections
+
+FEEDBACK_PREFIX = "FEEDBACK:"
+
+COMPACTION_STRATEGIES = ("full", "latest", "condensed")
+
+def check_strategy(strategy: str) -> str:
+    """Return strategy if it is one of COMPACTION_STRATEGIES, else raise ValueError."""
+    if strategy not in COMPACTION_STRATEGIES:
+        raise ValueError(f"Unknown compaction strategy {strategy}; choose one of {', '.join(COMPACTION_STRATEGIES)}")
+    return strategy
+
+def is_feedback(message: BaseMessage) -> bool:
+    """Whether a message is a reflection critique added by the reflect step."""
+    return isinstance(message, HumanMessage) and message.content.startswith(FEEDBACK_PREFIX)
+
+def condense_feedback(feedback: str) -> str:
+    """
+    Reduce a full critique to the parts needed for the next draft.
+    
+    Args:
+        feedback: Content of a FEEDBACK message
+    
+    Returns:
+        Feedback text containing only the weaknesses and suggestions, or the
+        original text when neither section can be found
+    """
+    sections = extract_sections(feedback[len(FEEDBACK_PREFIX):] if feedback.startswith(FEEDBACK_PREFIX) else feedback)
+    kept = [f"{name}:\n{sections[name]}" for name in ("WEAKNESSES", "SUGGESTIONS") if sections.get(name)]
+    if not kept:
+        return feedback
+    return f"{FEEDBACK_PREFIX} " + "\n\n".join(kept)
+
+def query_index(messages: List[BaseMessage]) -> Optional[int]:
+    """
+    Position of the current turn's query: the last human message that is not a critique.
+    
+    Everything before it (system prompt, earlier turns of a session) is context;
+    everything after it is this run's drafts and feedback.
+    """
+    for i in range(len(messages) - 1, -1, -1):
+        if isinstance(messages[i], HumanMessage) and not is_feedback(messages[i]):
+            return i
+    return None
+
+def latest_draft(messages: List[BaseMessage]) -> Optional[AIMessage]:
+    """The newest draft of the current turn, ignoring answers of earlier turns in the context."""
+    start = query_index(messages)
+    tail = messages[start + 1:] if start is not None else messages
+    return next((m for m in reversed(tail) if isinstance(m, AIMessage)), None)
+
+def compact_messages(messages: List[BaseMessage], strategy: str = "condensed") -> List[BaseMessage]:
+    """
+    Build the prompt for the next generate step from the run transcript.
+    
+    Strategies:
+        full: send the whole transcript unchanged
+        latest: keep everything up to the user query, the latest draft and the latest feedback
+        condensed: like latest, but the feedback is reduced to its WEAKNESSES and SUGGESTIONS
+    
+    Args:
+        messages: Full run transcript
+        strategy: One of COMPACTION_STRATEGIES
+    
+    Returns:
+        Messages to send to the main model
+    """
+    if check_strategy(strategy) == "full":
+        return messages
+    
+    # Everything up to the query (system prompt, earlier conversation) is kept verbatim
+    start = query_index(messages)
+    if start is None:
+        return messages
+    
+    tail = messages[start + 1:]
+    draft = latest_draft(messages)
+    latest_feedback = next((m for m in reversed(tail) if is_feedback(m)), None)
+    
+    compacted = list(messages[:start + 1])
+    if draft is not None:
+        compacted.append(draft)
+    if latest_feedback is not None:
+        content = latest_feedback.content
+        if strategy == "condensed":
+            content = condense_feedback(content)
+        compacted.append(HumanMessage(content=content))
+    return compacted
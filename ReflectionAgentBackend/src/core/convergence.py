@@ -0,0 +1,113 @@
+"""
+Convergence criteria that end the reflection loop before the iteration cap.
+"""
+import re
+from difflib import SequenceMatcher
+from typing import List, Optional
+
+# Reasons a run can stop, recorded as stop_reason in the run state and result
+STOP_MAX_ITERATIONS = "max_iterations"
+STOP_NO_IMPROVEMENT_NEEDED = "no_improvement_needed"
+STOP_GATE = "reflection_gate"
+STOP_TARGET_SCORE = "target_score"
+STOP_SCORE_PLATEAU = "score_plateau"
+STOP_DRAFT_SIMILARITY = "draft_similarity"
+STOP_REFLECTION_FAILED = "reflection_failed"
+STOP_RATE_LIMITED = "rate_limited"
+# The next phase could not finish before the run's deadline, or was cancelled at it
+STOP_DEADLINE = "deadline"
+# A refinement failed after retries; the previous draft stands
+STOP_GENERATION_FAILED = "generation_failed"
+# Speculative topology: the best candidate was refined once
+STOP_REFINED = "refined"
+
+# Diminishing-returns stops, which answer with the best-scored draft rather than the newest
+BEST_DRAFT_STOP_REASONS = frozenset({STOP_SCORE_PLATEAU, STOP_DRAFT_SIMILARITY})
+
+# Runs that ended early and return their latest draft rather than a concluded one
+PARTIAL_STOP_REASONS = frozenset({STOP_DEADLINE, STOP_RATE_LIMITED, STOP_REFLECTION_FAILED, STOP_GENERATION_FAILED})
+
+_WORD_RE = re.compile(r"\w+")
+
+def draft_similarity(previous: str, current: str) -> float:
+    """
+    Similarity of two drafts in [0, 1], compared word by word.
+    
+    Args:
+        previous: Earlier draft
+        current: New draft
+    
+    Returns:
+        1.0 for identical wording, lower as the drafts diverge
+    """
+    a = _WORD_RE.findall(previous.lower())
+    b = _WORD_RE.findall(current.lower())
+    if not a and not b:
+        return 1.0
+    matcher = SequenceMatcher(None, a, b, autojunk=False)
+    # quick_ratio is a cheap upper bound; skip the full comparison when it already rules a match out
+    if matcher.quick_ratio() == 0.0:
+        return 0.0
+    return matcher.ratio()
+
+class ConvergencePolicy:
+    """
+    Decide when further iterations are unlikely to pay off.
+    
+    Any criterion left as None is disabled.
+    
+    Args:
+        target_score: Stop once a reflection scores the draft at least this high (0-10)
+        min_score_delta: Stop when a draft improves on the previous score by less than this
+        similarity_threshold: Stop when a new draft is at least this similar to the previous one
+    """
+    
+    def __init__(self, target_score: Optional[float] = None, min_score_delta: Optional[float] = None,
+                 similarity_threshold: Optional[float] = None):
+        self.target_score = target_score
+        self.min_score_delta = min_score_delta
+        self.similarity_threshold = similarity_threshold
+    
+    def after_reflection(self, scores: List[Optional[float]]) -> Optional[str]:
+        """
+        Check the score history after a reflection.
+        
+        Args:
+            scores: Scores of every reflected draft so far, latest last
+        
+        Returns:
+            A stop reason, or None to keep iterating
+        """
+        if not scores or scores[-1] is None:
+            return None
+        
+        latest = scores[-1]
+        if self.target_score is not None and latest >= self.target_score:
+            return STOP_TARGET_SCORE
+        
+        if self.min_score_delta is not None and len(scores) >= 2 and scores[-2] is not None:
+            if latest - scores[-2] < self.min_score_delta:
+                return STOP_SCORE_PLATEAU
+        
+        return None
+    
+    def after_generation(self, previous_draft: Optional[str], draft: str) -> Optional[str]:
+        """
+        Compare a new draft with the previous one.
+        
+        Returns:
+            A stop reason, or None to keep iterating
+        """
+        if self.similarity_threshold is None or previous_draft is None:
+            return None
+        if draft_similarity(previous_draft, draft) >= self.similarity_threshold:
+            return STOP_DRAFT_SIMILARITY
+        return None
+    
+    def describe(self) -> dict:
+        """Settings that influence results, used in cache keys and health output."""
+        return {
+            "target_score": self.target_score,
+            "min_score_delta": self.min_score_delta,
+            "similarity_threshold": self.similarity_threshold
+        }
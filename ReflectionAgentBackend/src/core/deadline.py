@@ -0,0 +1,97 @@
+"""
+Deadline-aware execution: phase duration estimates and cancellation at the run's deadline.
+
+Every run has a wall-clock deadline in its graph config. Before the loop
+moves on, the node that just finished checks whether the phases that would
+follow fit in the time left, using smoothed durations of recent phases on
+the same model; if they do not, the run stops with the draft it has. Async
+model calls still in flight when the deadline passes are cancelled.
+
+The synchronous path (run, run_batch) cannot cancel a blocking model call:
+a call in flight at the deadline runs to completion, bounded only by the
+client's MODEL_TIMEOUT_SECONDS, and the run stops at the next node boundary.
+It can therefore overrun its deadline by up to one model call, and a late
+first draft is returned as a partial answer instead of failing.
+"""
+import asyncio
+import threading
+import time
+from typing import Any, Awaitable, Dict, Optional, Tuple, TypeVar
+
+from src.utils.metrics import DEADLINE_CANCELLATIONS
+
+T = TypeVar("T")
+
+# Weight of the newest sample in the smoothed duration and deviation
+LATENCY_SMOOTHING = 0.2
+
+class DeadlineExceeded(RuntimeError):
+    """Raised when a run's deadline passes before it has a draft to return."""
+
+    # Retrying within the same run cannot help
+    retryable = False
+
+    def __init__(self, phase: str):
+        super().__init__(f"Deadline passed during {phase}")
+        self.phase = phase
+
+class PhaseLatency:
+    """
+    Smoothed duration of each (phase, model), shared by all runs.
+
+    Args:
+        margin: Deviations added to the mean duration, so estimates err on the long side
+    """
+
+    def __init__(self, margin: float = 1.0):
+        self.margin = margin
+        self._lock = threading.Lock()
+        # (phase, model) -> [mean, mean absolute deviation, samples]
+        self._phases: Dict[Tuple[str, str], list] = {}
+
+    def record(self, phase: str, model: str, seconds: float) -> None:
+        with self._lock:
+            entry = self._phases.get((phase, model))
+            if entry is None:
+                self._phases[(phase, model)] = [seconds, 0.0, 1]
+                return
+            error = seconds - entry[0]
+            entry[0] += LATENCY_SMOOTHING * error
+            entry[1] += LATENCY_SMOOTHING * (abs(error) - entry[1])
+            entry[2] += 1
+
+    def estimate(self, phase: str, model: str) -> Optional[float]:
+        """Expected seconds of the phase on the model, or None before it has been observed"""
+        with self._lock:
+            entry = self._phases.get((phase, model))
+            return entry[0] + self.margin * entry[1] if entry is not None else None
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                f"{phase}/{model}": {"mean": round(mean, 4), "deviation": round(deviation, 4), "samples": samples}
+                for (phase, model), (mean, deviation, samples) in self._phases.items()
+            }
+
+def remaining(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left before a wall-clock deadline, None without one"""
+    return deadline - time.time() if deadline is not None else None
+
+async def until_deadline(awaitable: Awaitable[T], deadline: Optional[float], phase: str) -> T:
+    """
+    Await a model call, cancelling it if the deadline passes first.
+
+    Raises:
+        DeadlineExceeded: If the call was cancelled at the deadline
+    """
+    left = remaining(deadline)
+    if left is None:
+        return await awaitable
+    try:
+        return await asyncio.wait_for(awaitable, max(left, 0.0))
+    except asyncio.TimeoutError:
+        # The call's own per-attempt timeout raises the same error; only the deadline is ours
+        if time.time() < deadline:
+            raise
+        DEADLINE_CANCELLATIONS.inc(phase=phase)
+        raise DeadlineExceeded(phase)
@@ -0,0 +1,188 @@
+"""
+Pre-reflection gate that skips the reflection call for clearly adequate first drafts.
+"""
+import json
+import math
+import re
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+# Error texts that mark a draft as a failed answer (generate_response used to emit these as placeholders)
+ERROR_MARKERS = (
+    "i encountered an error processing your request",
+    "i'm sorry, i encountered an error",
+)
+
+REFUSAL_MARKERS = (
+    "i can't help with",
+    "i cannot help with",
+    "i can't assist",
+    "i cannot assist",
+    "i'm unable to",
+    "i am unable to",
+    "as an ai",
+)
+
+HEDGE_MARKERS = (
+    "i'm not sure",
+    "i am not sure",
+    "i don't know",
+    "it's unclear",
+)
+
+COMPLEX_KEYWORDS = (
+    "explain", "compare", "analyze", "analyse", "design", "implement", "evaluate",
+    "step by step", "pros and cons", "trade-off", "tradeoff", "write a", "essay",
+    "code", "algorithm", "prove", "derive", "plan", "strategy", "why",
+)
+
+_WORD_RE = re.compile(r"\w+")
+
+DEFAULT_WEIGHTS = {
+    "bias": 3.0,
+    "query_length": -2.5,
+    "complexity": -3.0,
+    "questions": -1.0,
+    "short_response": -2.0,
+    "error_marker": -12.0,
+    "refusal": -4.0,
+    "hedging": -1.5,
+}
+
+def classify_query(query: str) -> str:
+    """
+    Classify a query as "simple", "moderate" or "complex" using cheap lexical cues.
+    
+    Args:
+        query: User query
+    
+    Returns:
+        The complexity class
+    """
+    text = query.lower()
+    words = len(_WORD_RE.findall(text))
+    keywords = sum(1 for keyword in COMPLEX_KEYWORDS if keyword in text)
+    
+    if "```" in query or words > 60 or keywords >= 2 or text.count("?") > 1:
+        return "complex"
+    if words > 20 or keywords == 1:
+        return "moderate"
+    return "simple"
+
+_COMPLEXITY_SCORES = {"simple": 0.0, "moderate": 0.5, "complex": 1.0}
+
+def extract_features(query: str, response: str) -> Dict[str, float]:
+    """
+    Compute the gate's features for a query and its first draft.
+    
+    Args:
+        query: User query
+        response: First AI draft
+    
+    Returns:
+        Dict of feature name to value, each roughly in [0, 1]
+    """
+    query_text = query.lower()
+    response_text = response.lower()
+    query_words = len(_WORD_RE.findall(query_text))
+    response_words = len(_WORD_RE.findall(response_text))
+    
+    return {
+        "query_length": min(query_words / 50.0, 1.0),
+        "complexity": _COMPLEXITY_SCORES[classify_query(query)],
+        "questions": min(query_text.count("?") / 3.0, 1.0),
+        # A one-liner answering a non-trivial question is suspicious
+        "short_response": 1.0 if response_words < query_words else 0.0,
+        "error_marker": 1.0 if any(marker in response_text for marker in ERROR_MARKERS) else 0.0,
+        "refusal": 1.0 if any(marker in response_text for marker in REFUSAL_MARKERS) else 0.0,
+        "hedging": 1.0 if any(marker in response_text for marker in HEDGE_MARKERS) else 0.0,
+    }
+
+class ReflectionGate:
+    """
+    Decide whether a first draft is good enough to return without reflection.
+    
+    A logistic score over the lexical features above estimates the probability
+    that reflection would accept the draft; drafts scoring at or above the
+    threshold skip the reflection call. The default weights are hand-tuned and
+    can be replaced with weights learned from logged reflection verdicts.
+    """
+    
+    def __init__(self, threshold: float = 0.8, weights: Optional[Dict[str, float]] = None):
+        self.threshold = threshold
+        self.weights = dict(weights or DEFAULT_WEIGHTS)
+        self._lock = threading.Lock()
+        self.evaluated = 0
+        self.skipped = 0
+    
+    def confidence(self, query: str, response: str) -> float:
+        """Estimated probability that the draft needs no improvement."""
+        features = extract_features(query, response)
+        z = self.weights.get("bias", 0.0) + sum(
+            self.weights.get(name, 0.0) * value for name, value in features.items()
+        )
+        return 1.0 / (1.0 + math.exp(-z))
+    
+    def should_skip(self, query: str, response: str) -> Tuple[bool, float]:
+        """
+        Decide whether reflection can be skipped, recording the decision.
+        
+        Returns:
+            (skip, confidence)
+        """
+        confidence = self.confidence(query, response)
+        skip = confidence >= self.threshold
+        with self._lock:
+            self.evaluated += 1
+            if skip:
+                self.skipped += 1
+        return skip, confidence
+    
+    def fit(self, examples: Iterable[Tuple[str, str, bool]], epochs: int = 200, learning_rate: float = 0.1) -> None:
+        """
+        Learn weights by logistic regression from (query, draft, needed_improvement) examples.
+        
+        Args:
+            examples: Logged first drafts with the reflection verdict they received
+            epochs: Passes of batch gradient descent
+            learning_rate: Step size
+        """
+        samples = [(extract_features(q, r), 0.0 if needed else 1.0) for q, r, needed in examples]
+        if not samples:
+            return
+        
+        weights = {name: 0.0 for name in self.weights}
+        for _ in range(epochs):
+            gradients = {name: 0.0 for name in weights}
+            for features, label in samples:
+                z = weights["bias"] + sum(weights.get(n, 0.0) * v for n, v in features.items())
+                error = 1.0 / (1.0 + math.exp(-z)) - label
+                gradients["bias"] += error
+                for name, value in features.items():
+                    gradients[name] = gradients.get(name, 0.0) + error * value
+            for name in weights:
+                weights[name] -= learning_rate * gradients.get(name, 0.0) / len(samples)
+        
+        self.weights = weights
+    
+    def save(self, path: str) -> None:
+        """Write the threshold and weights to a JSON file."""
+        with open(path, "w") as f:
+            json.dump({"threshold": self.threshold, "weights": self.weights}, f, indent=2)
+    
+    @classmethod
+    def load(cls, path: str) -> "ReflectionGate":
+        """Create a gate from a JSON file written by save."""
+        with open(path) as f:
+            data = json.load(f)
+        return cls(threshold=data.get("threshold", 0.8), weights=data.get("weights"))
+    
+    def stats(self) -> Dict[str, float]:
+        """Number of drafts evaluated and reflection calls saved."""
+        with self._lock:
+            return {
+                "threshold": self.threshold,
+                "evaluated": self.evaluated,
+                "reflections_saved": self.skipped,
+                "skip_rate": self.skipped / self.evaluated if self.evaluated else 0.0
+            }
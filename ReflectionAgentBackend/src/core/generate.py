@@ -1,46 +1,87 @@
 """
 Response generation module for the Reflection Agent.
 """
-from typing import List
-from langchain_core.messages import BaseMessage, AIMessage
-from src.utils.utils import logger
+from typing import List, Optional
+from langchain_core.messages import BaseMessage
+from src.utils.utils import call_with_retry, acall_with_retry, logger
+from src.utils.metrics import MODEL_ERRORS, MODEL_RETRIES, model_name
+from src.utils.resilience import CircuitBreaker, CircuitOpenError
+from src.utils.scheduler import AdmissionRejected
+
+def _retry_counter(main_llm):
+    """on_retry callback counting generation retries for the model"""
+    name = model_name(main_llm)
+    return lambda attempt, error, delay: MODEL_RETRIES.inc(model=name, phase="generate")
 
 def generate_response(messages: List[BaseMessage], main_llm, verbose: bool = False, 
-                    retry_delay: float = 2.0, max_retries: int = 3, iteration_count: int = 1):
+                    retry_delay: float = 2.0, max_retries: int = 3, iteration_count: int = 1,
+                    breaker: Optional[CircuitBreaker] = None, max_delay: float = 30.0):
     """
-    Generate a response from the main LLM with improved error handling.
+    Generate a response from the main LLM, retrying transient failures with backoff.
     
     Args:
         messages: List of messages in the conversation
         main_llm: The LLM to use for generation
         verbose: Whether to print debug messages
-        retry_delay: Time to wait between retries
+        retry_delay: Base backoff delay, doubled on every retry
         max_retries: Maximum number of retries
         iteration_count: Current iteration number
+        breaker: Optional circuit breaker guarding the main model
+        max_delay: Upper bound on a single backoff wait
     
     Returns:
         List[BaseMessage]: Updated message list with the new AI response
+    
+    Raises:
+        CircuitOpenError: If the model's circuit is open
+        Exception: The last model error once retries are exhausted or the error is not transient
     """
     if verbose:
         logger.info(f"Generating response (iteration {iteration_count})")
     
     try:
-        # Use the LLM's invoke method to generate a response
-        ai_message = None
-        
-        try:
-            # Generate the response
-            ai_message = main_llm.invoke(messages)
-        except Exception as e:
-            logger.error(f"Error generating response: {str(e)}")
-            # Create a simple error message if generation fails
-            ai_message = AIMessage(content="I encountered an error processing your request. Let me try again.")
-        
-        # Return the extended message list with the new AI response
-        return messages + [ai_message]
-        
+        ai_message = call_with_retry(
+            main_llm.invoke, messages,
+            max_retries=max_retries, retry_delay=retry_delay, max_delay=max_delay,
+            verbose=verbose, breaker=breaker, on_retry=_retry_counter(main_llm)
+        )
     except Exception as e:
-        logger.error(f"Error in generate_response: {str(e)}")
-        # Return a fallback response in case of error
-        error_message = AIMessage(content="I'm sorry, I encountered an error while processing your request. Please try again.")
-        return messages + [error_message]
+        # A failed generation is not turned into a draft: reflecting on an error message wastes calls
+        logger.error(f"Error generating response: {str(e)}")
+        if not isinstance(e, (CircuitOpenError, AdmissionRejected)):
+            MODEL_ERRORS.inc(model=model_name(main_llm), phase="generate")
+        raise
+    
+    # Return the extended message list with the new AI response
+    return messages + [ai_message]
+
+async def agenerate_response(messages: List[BaseMessage], main_llm, verbose: bool = False,
+                    retry_delay: float = 2.0, max_retries: int = 3, iteration_count: int = 1,
+                    breaker: Optional[CircuitBreaker] = None, max_delay: float = 30.0,
+                    timeout: Optional[float] = None):
+    """
+    Async counterpart of generate_response that awaits the LLM and its backoff instead of blocking.
+    
+    Args:
+        (as in generate_response)
+        timeout: Optional per-attempt timeout in seconds
+    
+    Returns:
+        List[BaseMessage]: Updated message list with the new AI response
+    """
+    if verbose:
+        logger.info(f"Generating response (iteration {iteration_count})")
+    
+    try:
+        ai_message = await acall_with_retry(
+            main_llm.ainvoke, messages,
+            max_retries=max_retries, retry_delay=retry_delay, max_delay=max_delay, timeout=timeout,
+            verbose=verbose, breaker=breaker, on_retry=_retry_counter(main_llm)
+        )
+    except Exception as e:
+        logger.error(f"Error generating response: {str(e)}")
+        if not isinstance(e, (CircuitOpenError, AdmissionRejected)):
+            MODEL_ERRORS.inc(model=model_name(main_llm), phase="generate")
+        raise
+    
+    return messages + [ai_message]
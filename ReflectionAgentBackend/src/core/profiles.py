@@ -0,0 +1,132 @@
+"""
+Per-request run profiles: configuration variants that share the agent's compiled graph.
+
+A request may override the generation model, the iteration cap, the
+prompt variant and the compaction strategy. Each distinct combination resolves to a RunProfile holding
+everything the graph nodes need for it (system message, compiled reflection
+chain, cache configuration), built once and kept in a small LRU pool. Runs
+carry their profile in the graph config, so one compiled graph serves every
+variant side by side: interactive callers can ask for a single pass while
+batch callers keep deep reflection.
+"""
+import json
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from langchain_core.messages import SystemMessage
+
+from src.cache.base import make_cache_key
+from src.utils.utils import get_default_system_prompts
+
+# Name of the prompt variant built from the agent's own system prompts
+DEFAULT_PROMPT_VARIANT = "default"
+
+def load_prompt_variants(path: str = "") -> Dict[str, Dict[str, str]]:
+    """
+    Load named prompt variants from a JSON file.
+
+    Args:
+        path: File of the form {"name": {"main": "...", "reflection": "..."}}; either prompt
+            may be left out to keep the default one. Empty for the built-in variants only.
+
+    Returns:
+        Dict mapping variant name to its main and reflection system prompts
+    """
+    defaults = get_default_system_prompts()
+    variants = {
+        # Answer directly in one pass; suited to interactive callers with a low iteration cap
+        "concise": {
+            "main": "You are a helpful AI assistant. Answer the user's query accurately and directly, "
+                    "in as few words as a complete answer needs. Skip preambles and restating the question.",
+            "reflection": defaults["reflection"]
+        }
+    }
+    if path:
+        with open(path, encoding="utf-8") as f:
+            for name, prompts in json.load(f).items():
+                variants[name] = {role: prompts.get(role) or defaults[role] for role in ("main", "reflection")}
+    return variants
+
+class RunProfile:
+    """
+    Resolved configuration of one variant, shared by every run that asks for it.
+
+    Args:
+        key: Pool key, (model, max_iterations, prompt_variant, compaction_strategy)
+        model: Generation model for every step, or None to use the agent's model or router
+        max_iterations: Iteration cap of the run
+        prompt_variant: Name of the prompt variant
+        compaction_strategy: How the transcript is reduced before each regeneration
+        main_system_prompt: System prompt in front of every run
+        reflection_system_prompt: System prompt of reflection and judging calls
+        reflection_chain: Reflection chain compiled for reflection_system_prompt
+        cache_config: Settings that influence results, for cache and coalescing keys
+    """
+
+    def __init__(self, key: Tuple[Any, ...], model: Optional[str], max_iterations: int, prompt_variant: str,
+                 compaction_strategy: str, main_system_prompt: str, reflection_system_prompt: str, reflection_chain,
+                 cache_config: Dict[str, Any]):
+        self.key = key
+        self.model = model
+        self.max_iterations = max_iterations
+        self.prompt_variant = prompt_variant
+        self.compaction_strategy = compaction_strategy
+        self.main_system_message = SystemMessage(content=main_system_prompt)
+        self.reflection_system_prompt = reflection_system_prompt
+        self.reflection_chain = reflection_chain
+        self.cache_config = cache_config
+        # Semantic matches are only valid between runs with the same configuration
+        self.cache_namespace = make_cache_key("", cache_config)
+
+    def describe(self) -> Dict[str, Any]:
+        return {"model": self.model, "max_iterations": self.max_iterations, "prompt_variant": self.prompt_variant,
+                "compaction_strategy": self.compaction_strategy}
+
+class ProfilePool:
+    """
+    Least-recently-used pool of run profiles keyed by their configuration.
+
+    Args:
+        build: Builds the profile of a key; called at most once per key while it stays pooled
+        max_entries: Profiles kept before the least recently used one is dropped
+    """
+
+    def __init__(self, build: Callable[[Tuple[Any, ...]], RunProfile], max_entries: int = 32):
+        self._build = build
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._profiles: "OrderedDict[Tuple[Any, ...], RunProfile]" = OrderedDict()
+        self._hits = 0
+        self._builds = 0
+        self._evictions = 0
+
+    def get(self, key: Tuple[Any, ...]) -> RunProfile:
+        with self._lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                self._profiles.move_to_end(key)
+                self._hits += 1
+                return profile
+        # Built outside the lock; two threads racing on a new key build it twice and keep one
+        profile = self._build(key)
+        with self._lock:
+            profile = self._profiles.setdefault(key, profile)
+            self._profiles.move_to_end(key)
+            self._builds += 1
+            while len(self._profiles) > self.max_entries:
+                # Runs still holding an evicted profile keep using it
+                self._profiles.popitem(last=False)
+                self._evictions += 1
+        return profile
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._profiles),
+                "max_entries": self.max_entries,
+                "hits": self._hits,
+                "builds": self._builds,
+                "evictions": self._evictions,
+                "profiles": [profile.describe() for profile in self._profiles.values()]
+            }
@@ -1,14 +1,106 @@
 """
 Reflection module for evaluating and critiquing AI responses.
 """
-from typing import List
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage
+from typing import Any, Dict, List, Optional
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
 from langchain_core.prompts import ChatPromptTemplate
-from src.utils.utils import logger
+from src.core.verdict import CandidateVerdicts, ReflectionVerdict, parse_candidate_reflections, parse_reflection, parse_stats
+from src.utils.utils import call_with_retry, acall_with_retry, logger
+from src.utils.metrics import MODEL_ERRORS, MODEL_RETRIES, model_name
+from src.utils.resilience import CircuitBreaker, CircuitOpenError
+from src.utils.scheduler import AdmissionRejected
+
+def _find_last_exchange(messages: List[BaseMessage]):
+    """Return the last user message and the last AI response in the conversation."""
+    last_user_msg = None
+    last_ai_msg = None
+    
+    for msg in reversed(messages):
+        if isinstance(msg, AIMessage) and last_ai_msg is None:
+            last_ai_msg = msg
+        elif isinstance(msg, HumanMessage) and last_user_msg is None:
+            last_user_msg = msg
+            break
+    
+    return last_user_msg, last_ai_msg
+
+REFLECTION_REQUEST = "USER QUERY:\n{query}\n\nAI RESPONSE:\n{response}"
+
+def build_reflection_chain(reflection_llm, reflection_system_prompt: str, structured: bool = False):
+    """
+    Compile the prompt | llm chain used to critique a response, once per agent.
+    
+    The query and response are template variables filled in on every call, so
+    braces in them (or in the system prompt, which is a literal message) are
+    never parsed as template syntax.
+    """
+    reflection_prompt = ChatPromptTemplate.from_messages([
+        SystemMessage(content=reflection_system_prompt),
+        ("human", REFLECTION_REQUEST)
+    ])
+    if structured:
+        # Keep the raw message so a malformed tool call can still be parsed as text
+        return reflection_prompt | reflection_llm.with_structured_output(ReflectionVerdict, include_raw=True)
+    return reflection_prompt | reflection_llm
+
+def _reflection_inputs(last_user_msg, last_ai_msg) -> Dict[str, str]:
+    return {"query": str(last_user_msg.content), "response": str(last_ai_msg.content)}
+
+def _retry_counter(reflection_llm):
+    """on_retry callback counting reflection retries for the model"""
+    name = model_name(reflection_llm)
+    return lambda attempt, error, delay: MODEL_RETRIES.inc(model=name, phase="reflect")
+
+def _reflection_failed(messages: List[BaseMessage], reflection_llm, error: Exception):
+    """Result used when reflection fails for good: keep the current draft and report why"""
+    logger.error(f"Error in reflection: {str(error)}")
+    if not isinstance(error, (CircuitOpenError, AdmissionRejected)):
+        MODEL_ERRORS.inc(model=model_name(reflection_llm), phase="reflect")
+    return {
+        "messages": messages,
+        "needs_improvement": False,
+        "verdict": None,
+        "error": str(error),
+        "rate_limited": isinstance(error, AdmissionRejected)
+    }
+
+def _process_reflection(messages: List[BaseMessage], reflection_result, structured: bool = False):
+    """Turn the reflection output into the feedback message, typed verdict and improvement flag."""
+    if structured:
+        verdict = reflection_result.get("parsed")
+        raw = reflection_result.get("raw")
+        usage = getattr(raw, "usage_metadata", None)
+        reflection_content = raw.content if raw is not None and isinstance(raw.content, str) else ""
+        if verdict is not None:
+            parse_stats.record("structured")
+            reflection_content = verdict.to_feedback()
+        else:
+            verdict = parse_reflection(reflection_content)
+            parse_stats.record("text" if verdict is not None else "failures")
+    else:
+        reflection_content = reflection_result.content
+        usage = getattr(reflection_result, "usage_metadata", None)
+        verdict = parse_reflection(reflection_content)
+        parse_stats.record("text" if verdict is not None else "failures")
+    
+    if verdict is None:
+        logger.warning("Could not parse a verdict from the reflection; treating the response as final")
+    
+    # Add feedback message to the conversation
+    feedback = HumanMessage(content=f"FEEDBACK: {reflection_content}")
+    
+    return {
+        "messages": messages + [feedback],
+        "needs_improvement": verdict.needs_improvement if verdict is not None else False,
+        "verdict": verdict,
+        "usage": usage
+    }
 
 def evaluate_response(messages: List[BaseMessage], reflection_llm, reflection_system_prompt: str,
                      verbose: bool = False, retry_delay: float = 2.0, max_retries: int = 3, 
-                     iteration_count: int = 1):
+                     iteration_count: int = 1, structured: bool = False,
+                     breaker: Optional[CircuitBreaker] = None, max_delay: float = 30.0,
+                     chain=None):
     """
     Evaluate the last AI response and provide feedback on how to improve it.
     
@@ -17,64 +109,199 @@ def evaluate_response(messages: List[BaseMessage], reflection_llm, reflection_sy
         reflection_llm: The LLM to use for reflection
         reflection_system_prompt: System prompt for the reflection model
         verbose: Whether to print debug messages
-        retry_delay: Time to wait between retries
+        retry_delay: Base backoff delay, doubled on every retry
         max_retries: Maximum number of retries
         iteration_count: Current iteration number
+        structured: Whether to request schema-constrained output instead of free text
+        breaker: Optional circuit breaker guarding the reflection model
+        max_delay: Upper bound on a single backoff wait
+        chain: Chain compiled by build_reflection_chain; built for this call if omitted
     
     Returns:
-        Dict with feedback messages and whether improvement is needed
+        Dict with feedback messages, the parsed verdict (or None), whether improvement is needed
+        and the reflection call's token usage; "error" is set when reflection failed and the
+        draft is kept as is
     """
     if verbose:
         logger.info(f"Evaluating response (iteration {iteration_count})")
     
-    # Get the last user query and AI response
-    last_user_msg = None
-    last_ai_msg = None
-    
-    for msg in reversed(messages):
-        if isinstance(msg, AIMessage) and last_ai_msg is None:
-            last_ai_msg = msg
-        elif isinstance(msg, HumanMessage) and last_user_msg is None:
-            last_user_msg = msg
-            break
+    last_user_msg, last_ai_msg = _find_last_exchange(messages)
     
     if not last_user_msg or not last_ai_msg:
         logger.warning("Could not find last user message or AI response for reflection")
         return {
             "messages": messages,
-            "needs_improvement": False
+            "needs_improvement": False,
+            "verdict": None
         }
     
     try:
-        # Create the reflection prompt
-        reflection_prompt = ChatPromptTemplate.from_messages([
-            ("system", reflection_system_prompt),
-            ("human", f"USER QUERY:\n{last_user_msg.content}\n\nAI RESPONSE:\n{last_ai_msg.content}")
-        ])
-        
         # Generate the reflection
-        reflection_chain = reflection_prompt | reflection_llm
-        reflection_result = reflection_chain.invoke({})
-        reflection_content = reflection_result.content
-        
-        # Check if the response needs improvement based on the reflection
-        needs_improvement = False
-        if "REFLECTION:" in reflection_content and "NEEDS IMPROVEMENT: " in reflection_content:
-            needs_improvement_text = reflection_content.split("NEEDS IMPROVEMENT: ")[1].split("\n")[0].strip().lower()
-            needs_improvement = needs_improvement_text == "yes"
-        
-        # Add feedback message to the conversation
-        feedback = HumanMessage(content=f"FEEDBACK: {reflection_content}")
-        
-        return {
-            "messages": messages + [feedback],
-            "needs_improvement": needs_improvement
-        }
-    
+        if chain is None:
+            chain = build_reflection_chain(reflection_llm, reflection_system_prompt, structured)
+        reflection_result = call_with_retry(
+            chain.invoke, _reflection_inputs(last_user_msg, last_ai_msg),
+            max_retries=max_retries, retry_delay=retry_delay, max_delay=max_delay,
+            verbose=verbose, breaker=breaker, on_retry=_retry_counter(reflection_llm)
+        )
     except Exception as e:
-        logger.error(f"Error in reflection: {str(e)}")
         # In case of error, continue without reflection
+        return _reflection_failed(messages, reflection_llm, e)
+    
+    return _process_reflection(messages, reflection_result, structured)
+
+async def aevaluate_response(messages: List[BaseMessage], reflection_llm, reflection_system_prompt: str,
+                     verbose: bool = False, retry_delay: float = 2.0, max_retries: int = 3,
+                     iteration_count: int = 1, structured: bool = False,
+                     breaker: Optional[CircuitBreaker] = None, max_delay: float = 30.0,
+                     timeout: Optional[float] = None, chain=None):
+    """
+    Async counterpart of evaluate_response that awaits the reflection chain and its backoff.
+    
+    Args:
+        (as in evaluate_response)
+        timeout: Optional per-attempt timeout in seconds
+    
+    Returns:
+        Dict as returned by evaluate_response
+    """
+    if verbose:
+        logger.info(f"Evaluating response (iteration {iteration_count})")
+    
+    last_user_msg, last_ai_msg = _find_last_exchange(messages)
+    
+    if not last_user_msg or not last_ai_msg:
+        logger.warning("Could not find last user message or AI response for reflection")
         return {
             "messages": messages,
-            "needs_improvement": False
+            "needs_improvement": False,
+            "verdict": None
         }
+    
+    try:
+        if chain is None:
+            chain = build_reflection_chain(reflection_llm, reflection_system_prompt, structured)
+        reflection_result = await acall_with_retry(
+            chain.ainvoke, _reflection_inputs(last_user_msg, last_ai_msg),
+            max_retries=max_retries, retry_delay=retry_delay, max_delay=max_delay, timeout=timeout,
+            verbose=verbose, breaker=breaker, on_retry=_retry_counter(reflection_llm)
+        )
+    except Exception as e:
+        return _reflection_failed(messages, reflection_llm, e)
+    
+    return _process_reflection(messages, reflection_result, structured)
+
+JUDGE_INSTRUCTIONS = """You will be given several candidate responses to the same query.
+Evaluate each candidate separately and independently of the others.
+Begin the evaluation of each candidate with a line "CANDIDATE <number>:" and follow it with the sections described above."""
+
+def build_judge_runnable(reflection_llm, structured: bool = False):
+    """Runnable that scores candidates; built once per agent, since binding the output schema is not free."""
+    if structured:
+        return reflection_llm.with_structured_output(CandidateVerdicts, include_raw=True)
+    return reflection_llm
+
+def _build_judge_request(reflection_system_prompt: str, query: str, candidates: List[str]) -> List[BaseMessage]:
+    """Build the messages of the single reflection call that scores every candidate."""
+    body = "\n\n".join(f"CANDIDATE RESPONSE {i}:\n{text}" for i, text in enumerate(candidates, 1))
+    # Plain messages rather than a prompt template, so braces in drafts are never read as variables
+    return [
+        SystemMessage(content=f"{reflection_system_prompt}\n\n{JUDGE_INSTRUCTIONS}"),
+        HumanMessage(content=f"USER QUERY:\n{query}\n\n{body}")
+    ]
+
+def _process_judgement(result, count: int, structured: bool = False) -> Dict[str, Any]:
+    """Turn the judging output into one verdict per candidate."""
+    if structured:
+        parsed = result.get("parsed")
+        raw = result.get("raw")
+        usage = getattr(raw, "usage_metadata", None)
+        if parsed is not None and len(parsed.verdicts) == count:
+            parse_stats.record("structured")
+            return {"verdicts": list(parsed.verdicts), "usage": usage}
+        text = raw.content if raw is not None and isinstance(raw.content, str) else ""
+    else:
+        usage = getattr(result, "usage_metadata", None)
+        text = result.content
+    
+    verdicts = parse_candidate_reflections(text, count)
+    parse_stats.record("text" if any(v is not None for v in verdicts) else "failures")
+    return {"verdicts": verdicts, "usage": usage}
+
+def _judgement_failed(reflection_llm, count: int, error: Exception) -> Dict[str, Any]:
+    """Result used when judging fails for good: no verdicts, and why"""
+    failed = _reflection_failed([], reflection_llm, error)
+    return {"verdicts": [None] * count, "error": failed["error"], "rate_limited": failed["rate_limited"]}
+
+def evaluate_candidates(query: str, candidates: List[str], reflection_llm, reflection_system_prompt: str,
+                        verbose: bool = False, retry_delay: float = 2.0, max_retries: int = 3,
+                        structured: bool = False, breaker: Optional[CircuitBreaker] = None,
+                        max_delay: float = 30.0, runnable=None) -> Dict[str, Any]:
+    """
+    Score several candidate responses to one query with a single reflection call.
+    
+    Args:
+        query: The user query the candidates answer
+        candidates: Candidate response texts
+        reflection_llm: The LLM to use for reflection
+        reflection_system_prompt: System prompt for the reflection model
+        verbose: Whether to print debug messages
+        retry_delay: Base backoff delay, doubled on every retry
+        max_retries: Maximum number of retries
+        structured: Whether to request schema-constrained output instead of free text
+        breaker: Optional circuit breaker guarding the reflection model
+        max_delay: Upper bound on a single backoff wait
+        runnable: Runnable from build_judge_runnable; built for this call if omitted
+    
+    Returns:
+        Dict with one verdict (or None) per candidate and the call's token usage; "error" is
+        set when the call failed
+    """
+    if verbose:
+        logger.info(f"Judging {len(candidates)} candidate responses")
+    
+    if runnable is None:
+        runnable = build_judge_runnable(reflection_llm, structured)
+    messages = _build_judge_request(reflection_system_prompt, query, candidates)
+    try:
+        result = call_with_retry(
+            runnable.invoke, messages,
+            max_retries=max_retries, retry_delay=retry_delay, max_delay=max_delay,
+            verbose=verbose, breaker=breaker, on_retry=_retry_counter(reflection_llm)
+        )
+    except Exception as e:
+        return _judgement_failed(reflection_llm, len(candidates), e)
+    
+    return _process_judgement(result, len(candidates), structured)
+
+async def aevaluate_candidates(query: str, candidates: List[str], reflection_llm, reflection_system_prompt: str,
+                               verbose: bool = False, retry_delay: float = 2.0, max_retries: int = 3,
+                               structured: bool = False, breaker: Optional[CircuitBreaker] = None,
+                               max_delay: float = 30.0, timeout: Optional[float] = None,
+                               runnable=None) -> Dict[str, Any]:
+    """
+    Async counterpart of evaluate_candidates.
+    
+    Args:
+        (as in evaluate_candidates)
+        timeout: Optional per-attempt timeout in seconds
+    
+    Returns:
+        Dict as returned by evaluate_candidates
+    """
+    if verbose:
+        logger.info(f"Judging {len(candidates)} candidate responses")
+    
+    if runnable is None:
+        runnable = build_judge_runnable(reflection_llm, structured)
+    messages = _build_judge_request(reflection_system_prompt, query, candidates)
+    try:
+        result = await acall_with_retry(
+            runnable.ainvoke, messages,
+            max_retries=max_retries, retry_delay=retry_delay, max_delay=max_delay, timeout=timeout,
+            verbose=verbose, breaker=breaker, on_retry=_retry_counter(reflection_llm)
+        )
+    except Exception as e:
+        return _judgement_failed(reflection_llm, len(candidates), e)
+    
+    return _process_judgement(result, len(candidates), structured)
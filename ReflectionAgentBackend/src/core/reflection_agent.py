@@ -2,16 +2,80 @@
 Core implementation of the Reflection Pattern Agent.
 """
 import os
-from typing import List, Dict, Any, Optional
+import time
+import uuid
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import List, Dict, Any, Optional, AsyncIterator, Sequence, TYPE_CHECKING
 import logging
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
-from langgraph.graph import MessageGraph, END
-from langsmith import Client
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, AIMessageChunk, SystemMessage
+from langgraph.config import get_config, get_stream_writer
+from langgraph.graph import StateGraph, START, END
+from langgraph.types import Send
+from langgraph.utils.runnable import RunnableCallable
 
 # Import the new modular components
-from src.core.generate import generate_response
-from src.core.reflect import evaluate_response
-from src.utils.utils import initialize_llm, get_default_system_prompts, logger
+from src.core.generate import generate_response, agenerate_response
+from src.core.reflect import (
+    build_judge_runnable,
+    build_reflection_chain,
+    evaluate_response,
+    aevaluate_response,
+    evaluate_candidates,
+    aevaluate_candidates
+)
+from src.core.state import ReflectionState
+from src.core.session import SessionStore
+from src.core.gate import ReflectionGate
+from src.core.compaction import FEEDBACK_PREFIX, check_strategy, compact_messages, latest_draft
+from src.core.verdict import PASSING_SCORE
+from src.core.routing import ModelRouter, summarize_routing
+from src.core.profiles import DEFAULT_PROMPT_VARIANT, ProfilePool, RunProfile
+from src.core.deadline import DeadlineExceeded, PhaseLatency, remaining, until_deadline
+from src.core.convergence import (
+    ConvergencePolicy,
+    STOP_MAX_ITERATIONS,
+    STOP_NO_IMPROVEMENT_NEEDED,
+    STOP_GATE,
+    STOP_REFLECTION_FAILED,
+    STOP_RATE_LIMITED,
+    STOP_REFINED,
+    STOP_DEADLINE,
+    STOP_GENERATION_FAILED,
+    BEST_DRAFT_STOP_REASONS,
+    PARTIAL_STOP_REASONS
+)
+from src.cache.base import ResultCache, make_cache_key
+from src.checkpoint import RunConflictError
+from src.utils.utils import (
+    initialize_llm,
+    create_rate_limiters,
+    estimate_tokens,
+    get_default_system_prompts,
+    with_temperature,
+    logger
+)
+from src.utils.resilience import CircuitOpenError, create_circuit_breakers
+from src.utils.singleflight import SingleFlight
+from src.utils.scheduler import AdmissionRejected, PRIORITY_FIRST_DRAFT, PRIORITY_REFINEMENT, scheduled_call
+from src.utils.metrics import (
+    CACHE_LOOKUPS,
+    PHASE_SECONDS,
+    ROUTING_DECISIONS,
+    ROUTING_SECONDS,
+    RUN_ITERATIONS,
+    RUNS,
+    record_usage
+)
+
+if TYPE_CHECKING:
+    from langgraph.checkpoint.base import BaseCheckpointSaver
+    from src.cache.semantic import SemanticCache
+    from src.utils.clients import ClientPool
+
+# Sampling temperatures of the speculative topology's parallel drafts
+DEFAULT_DRAFT_TEMPERATURES = (0.3, 0.7, 1.0)
 
 # Setup logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(asctime)s - %(message)s')
@@ -30,20 +94,102 @@ class ReflectionPatternAgent:
         max_retries: int = 3,
         use_langsmith: bool = False,
         langsmith_api_key: Optional[str] = None,
-        langsmith_project: str = "reflection-pattern-agent"
+        langsmith_project: str = "reflection-pattern-agent",
+        cache: Optional[ResultCache] = None,
+        semantic_cache: Optional["SemanticCache"] = None,
+        checkpointer: Optional["BaseCheckpointSaver"] = None,
+        sessions: Optional[SessionStore] = None,
+        coalescer: Optional[SingleFlight] = None,
+        rate_limits: Optional[Dict[str, float]] = None,
+        token_limits: Optional[Dict[str, float]] = None,
+        request_timeout: Optional[float] = None,
+        reflection_gate: Optional[ReflectionGate] = None,
+        compaction_strategy: str = "condensed",
+        reflection_mode: str = "text",
+        convergence: Optional[ConvergencePolicy] = None,
+        call_timeout: Optional[float] = None,
+        retry_max_delay: float = 30.0,
+        circuit_failure_threshold: int = 5,
+        circuit_reset_timeout: float = 30.0,
+        topology: str = "sequential",
+        draft_temperatures: Optional[Sequence[float]] = None,
+        client_pool: Optional["ClientPool"] = None,
+        router: Optional[ModelRouter] = None,
+        prompt_variants: Optional[Dict[str, Dict[str, str]]] = None,
+        allowed_models: Optional[Sequence[str]] = None,
+        max_iterations_limit: Optional[int] = None,
+        profile_pool_size: int = 32,
+        phase_latency: Optional[PhaseLatency] = None,
+        main_llm=None,
+        reflection_llm=None,
+        draft_llm=None,
+        predecessor: Optional["ReflectionPatternAgent"] = None
     ):
-        """Initialize the Reflection Pattern Agent with improved error handling."""
+        """
+        Initialize the Reflection Pattern Agent with improved error handling.
+        
+        predecessor is the agent this one replaces after a settings reload: its rate limiters
+        and circuit breakers are kept where their settings are unchanged, and both agents share
+        the record of runs in progress.
+        """
+        self.main_model = main_model
+        self.reflection_model = reflection_model
         self.max_iterations = max_iterations
         self.verbose = verbose
-        self.iteration_count = 0
         self.retry_delay = retry_delay
         self.max_retries = max_retries
-        # Flag to track if no further reflection is needed
-        self.no_reflection_needed = False
+        # Per-attempt timeout for async model calls and the cap on a single backoff wait
+        self.call_timeout = call_timeout
+        self.retry_max_delay = retry_max_delay
+        # Optional gate that lets clearly adequate first drafts skip reflection
+        self.reflection_gate = reflection_gate
+        # How the transcript is reduced before each regeneration (see src.core.compaction)
+        self.compaction_strategy = check_strategy(compaction_strategy)
+        # "structured" asks the reflection model for a schema-constrained verdict, "text" parses free text
+        self.reflection_mode = reflection_mode
+        # Score and draft-similarity criteria for stopping before max_iterations
+        self.convergence = convergence or ConvergencePolicy()
+        # "sequential" loops generate/reflect; "speculative" drafts in parallel and judges once
+        self.topology = topology
+        self.draft_temperatures = list(draft_temperatures or DEFAULT_DRAFT_TEMPERATURES)
+        
+        # Per-model request and token budgets, shared by both roles when they use the same model
+        self.rate_limiters = create_rate_limiters(rate_limits, token_limits,
+                                                  predecessor.rate_limiters if predecessor else None)
+        # Seconds each run may take; calls that cannot be admitted in time are rejected instead of queued
+        self.request_timeout = request_timeout
+        # Recent phase durations, used to stop before a phase that cannot finish by the deadline
+        self.phase_latency = phase_latency or PhaseLatency()
+        # Per-model circuit breakers so a degraded model fails fast instead of tying up every run
+        inherited_breakers = predecessor.circuit_breakers if predecessor else {}
+        self.circuit_breakers = create_circuit_breakers(
+            [main_model, reflection_model, *([router.draft_model] if router else []),
+             *(model for model in inherited_breakers if model in (allowed_models or []))],
+            circuit_failure_threshold, circuit_reset_timeout, inherited_breakers
+        )
+        self._circuit_settings = (circuit_failure_threshold, circuit_reset_timeout)
         
-        # Initialize models using the utility function
-        self.main_llm = initialize_llm(main_model, google_api_key, True, verbose)
-        self.reflection_llm = initialize_llm(reflection_model, google_api_key, False, verbose)
+        # Initialize models using the utility function unless ready-made clients are supplied;
+        # with a client pool, every client of a model shares the pool's connections
+        self.client_pool = client_pool
+        self._google_api_key = google_api_key
+        self._llm_lock = threading.Lock()
+        self.main_llm = main_llm or initialize_llm(main_model, google_api_key, True, verbose,
+                                                   self.rate_limiters.get(main_model), client_pool)
+        self.reflection_llm = reflection_llm or initialize_llm(reflection_model, google_api_key, False, verbose,
+                                                               self.rate_limiters.get(reflection_model), client_pool)
+        # Optional routing tier: first drafts on a cheap model, escalation to the main model
+        self.router = router
+        self.generation_llms = {main_model: self.main_llm}
+        if router is not None:
+            self.generation_llms[router.draft_model] = draft_llm or initialize_llm(
+                router.draft_model, google_api_key, True, verbose, self.rate_limiters.get(router.draft_model), client_pool
+            )
+        # Per generation model, one client per speculative draft, each sampling at its own temperature
+        self.draft_llms = {
+            model: [with_temperature(llm, t) for t in self.draft_temperatures]
+            for model, llm in self.generation_llms.items()
+        } if topology == "speculative" else {}
         
         # Set up default system prompts if not provided
         default_prompts = get_default_system_prompts()
@@ -55,6 +201,54 @@ class ReflectionPatternAgent:
         
         self.main_system_message = SystemMessage(content=main_system_prompt)
         self.reflection_system_prompt = reflection_system_prompt
+        # Compiled once and reused by every reflection; only the query and draft vary per call
+        self.reflection_chain = build_reflection_chain(
+            self.reflection_llm, reflection_system_prompt, structured=reflection_mode == "structured"
+        )
+        self.judge_runnable = build_judge_runnable(self.reflection_llm, structured=reflection_mode == "structured")
+        # Prompt variants a request may pick; "default" is always the pair above
+        self.prompt_variants = {
+            **(prompt_variants or {}),
+            DEFAULT_PROMPT_VARIANT: {"main": main_system_prompt, "reflection": reflection_system_prompt}
+        }
+        
+        # Optional cache of completed runs, keyed by query and the settings below
+        self.cache = cache
+        self.semantic_cache = semantic_cache
+        self._cache_config = {
+            "main_model": main_model,
+            "reflection_model": reflection_model,
+            "main_system_prompt": main_system_prompt,
+            "reflection_system_prompt": reflection_system_prompt,
+            "max_iterations": max_iterations,
+            "reflection_gate": reflection_gate.threshold if reflection_gate else None,
+            "compaction_strategy": compaction_strategy,
+            "reflection_mode": reflection_mode,
+            "convergence": self.convergence.describe(),
+            "topology": topology,
+            "draft_temperatures": self.draft_temperatures if topology == "speculative" else None,
+            "routing": router.describe() if router else None
+        }
+        
+        # Generation models a request may ask for, and the highest iteration cap it may set
+        self.allowed_models = list(dict.fromkeys([main_model, *self.generation_llms, *(allowed_models or [])]))
+        self.max_iterations_limit = max_iterations_limit
+        # Resolved per-request variants; runs carry theirs in the graph config, so all share one graph
+        self.profiles = ProfilePool(self._build_profile, profile_pool_size)
+        self.default_profile = self.resolve_profile()
+        
+        # Optional checkpointer that saves every step, so interrupted runs resume instead of restarting
+        self.checkpointer = checkpointer
+        # Ids of runs executing in this process; the lock makes checking and claiming an id one step
+        if predecessor is not None:
+            self._active_runs, self._runs_lock = predecessor._active_runs, predecessor._runs_lock
+        else:
+            self._active_runs = set()
+            self._runs_lock = threading.Lock()
+        # Optional store of earlier turns, so follow-up queries can refer back to them
+        self.sessions = sessions
+        # Optional single-flight layer, so identical concurrent queries share one run
+        self.coalescer = coalescer
         
         # Initialize LangSmith client if enabled
         self.use_langsmith = use_langsmith
@@ -68,6 +262,7 @@ class ReflectionPatternAgent:
             
             if self.use_langsmith:
                 try:
+                    from langsmith import Client
                     self.langsmith_client = Client()
                     if verbose:
                         logger.info("Successfully initialized LangSmith client")
@@ -78,70 +273,586 @@ class ReflectionPatternAgent:
         # Initialize the message graph
         self._create_graph()
     
-    def generate(self, messages: List[BaseMessage]) -> List[BaseMessage]:
-        """Generate a response with robust error handling"""
-        self.iteration_count += 1
-        return generate_response(
-            messages, 
-            self.main_llm, 
-            self.verbose, 
-            self.retry_delay, 
-            self.max_retries,
-            self.iteration_count
+    def resolve_profile(self, options: Optional[Dict[str, Any]] = None) -> RunProfile:
+        """
+        Profile of a run with the given per-request overrides, from the pool when already built.
+        
+        Args:
+            options: Optional "model", "max_iterations", "prompt_variant", "compaction_strategy" and
+                "timeout_seconds" overrides; missing or None values keep the agent's own settings
+        
+        Raises:
+            ValueError: If an override names a model, prompt variant or compaction strategy this
+                agent does not offer, sets an iteration cap outside 1..max_iterations_limit or a
+                timeout that is not positive
+        """
+        options = options or {}
+        model = options.get("model") or None
+        if model is not None and model not in self.allowed_models:
+            raise ValueError(f"Model {model} is not available; choose one of {', '.join(self.allowed_models)}")
+        if model == self.main_model and self.router is None:
+            # Same as no override, so both share a profile
+            model = None
+        max_iterations = options.get("max_iterations")
+        if max_iterations is None:
+            max_iterations = self.max_iterations
+        elif max_iterations < 1 or (self.max_iterations_limit and max_iterations > self.max_iterations_limit):
+            raise ValueError(f"max_iterations must be between 1 and {self.max_iterations_limit or max_iterations}")
+        timeout_seconds = options.get("timeout_seconds")
+        if timeout_seconds is not None and timeout_seconds <= 0:
+            raise ValueError(f"timeout_seconds must be positive, got {timeout_seconds}")
+        prompt_variant = options.get("prompt_variant") or DEFAULT_PROMPT_VARIANT
+        if prompt_variant not in self.prompt_variants:
+            raise ValueError(f"Unknown prompt variant {prompt_variant}; choose one of {', '.join(sorted(self.prompt_variants))}")
+        compaction_strategy = check_strategy(options.get("compaction_strategy") or self.compaction_strategy)
+        return self.profiles.get((model, max_iterations, prompt_variant, compaction_strategy))
+    
+    def _build_profile(self, key) -> RunProfile:
+        """Build the profile of a pool key (see resolve_profile), compiling only what differs"""
+        model, max_iterations, prompt_variant, compaction_strategy = key
+        prompts = self.prompt_variants[prompt_variant]
+        if prompts["reflection"] == self.reflection_system_prompt:
+            reflection_chain = self.reflection_chain
+        else:
+            reflection_chain = build_reflection_chain(
+                self.reflection_llm, prompts["reflection"], structured=self.reflection_mode == "structured"
+            )
+        cache_config = {
+            **self._cache_config,
+            "main_system_prompt": prompts["main"],
+            "reflection_system_prompt": prompts["reflection"],
+            "max_iterations": max_iterations,
+            "compaction_strategy": compaction_strategy
+        }
+        if model is not None:
+            # A requested model writes every draft, so routing does not apply
+            self._generation_llm(model)
+            cache_config.update(main_model=model, routing=None)
+        return RunProfile(key, model, max_iterations, prompt_variant, compaction_strategy, prompts["main"],
+                          prompts["reflection"], reflection_chain, cache_config)
+    
+    def _generation_llm(self, model: str):
+        """Generation client of a model, created on first use for models only requests ask for"""
+        llm = self.generation_llms.get(model)
+        if llm is not None:
+            return llm
+        with self._llm_lock:
+            if model not in self.generation_llms:
+                llm = initialize_llm(model, self._google_api_key, True, self.verbose,
+                                     self.rate_limiters.get(model), self.client_pool)
+                if self.topology == "speculative":
+                    self.draft_llms[model] = [with_temperature(llm, t) for t in self.draft_temperatures]
+                self.circuit_breakers.update(create_circuit_breakers([model], *self._circuit_settings, self.circuit_breakers))
+                self.generation_llms[model] = llm
+            return self.generation_llms[model]
+    
+    def _profile(self) -> RunProfile:
+        """Profile of the run executing the current graph step"""
+        return get_config().get("configurable", {}).get("profile") or self.default_profile
+    
+    def _gate_first_draft(self, state: ReflectionState, draft: BaseMessage, iteration_count: int) -> Dict[str, Any]:
+        """Ask the reflection gate whether the first draft can skip reflection"""
+        if (self.reflection_gate is None or iteration_count != 1 or iteration_count >= self._profile().max_iterations
+                or not isinstance(draft, AIMessage)):
+            return {}
+        
+        skip, confidence = self.reflection_gate.should_skip(state.get("query", ""), draft.content)
+        if skip:
+            get_stream_writer()({"event": "gate", "iteration": iteration_count, "skipped": True, "confidence": confidence})
+            if self.verbose:
+                logger.info(f"\n--- Reflection skipped by gate (confidence {confidence:.2f}) ---")
+        return {"reflection_skipped": skip}
+    
+    def _route(self, state: ReflectionState, iteration_count: int):
+        """Generation model of this step and why it was chosen (no reason without a router or with a requested model)"""
+        requested = self._profile().model
+        if requested is not None:
+            return requested, None
+        if self.router is None:
+            return self.main_model, None
+        routing = state.get("routing") or []
+        model, reason = self.router.route(
+            state.get("query", ""), iteration_count, state.get("needs_improvement", False),
+            routing[-1]["model"] if routing else None
         )
+        if self.verbose:
+            logger.info(f"Routing iteration {iteration_count} to {model} ({reason})")
+        return model, reason
     
-    def reflect(self, messages: List[BaseMessage]) -> List[BaseMessage]:
-        """Reflect on the response with error handling"""
-        result = evaluate_response(
-            messages, 
-            self.reflection_llm, 
-            self.reflection_system_prompt,
-            self.verbose, 
-            self.retry_delay, 
-            self.max_retries,
-            self.iteration_count
+    def _prepare_generation(self, state: ReflectionState):
+        """Start a generate step: announce it, pick its model and compact the transcript into the prompt"""
+        iteration_count = state.get("iteration_count", 0) + 1
+        model, reason = self._route(state, iteration_count)
+        event = {"event": "phase", "phase": "generate", "status": "started", "iteration": iteration_count}
+        get_stream_writer()({**event, "model": model} if reason else event)
+        prompt = compact_messages(state["messages"], self._profile().compaction_strategy)
+        return iteration_count, prompt, model, reason
+    
+    def _finish_generation(self, state: ReflectionState, prompt: List[BaseMessage], messages: List[BaseMessage],
+                           iteration_count: int, model: str, reason: Optional[str], seconds: float) -> Dict[str, Any]:
+        """Turn the generated message into a state update with its prompt token count and stop decision"""
+        draft = messages[-1]
+        usage = getattr(draft, "usage_metadata", None)
+        prompt_tokens = usage["input_tokens"] if usage else estimate_tokens(prompt)
+        record_usage(model, "generate", usage)
+        
+        if self.verbose:
+            logger.info(f"Generation prompt for iteration {iteration_count}: {len(prompt)} messages, {prompt_tokens} tokens")
+        
+        update = {
+            # Only the new draft is appended; the transcript itself is never compacted
+            "messages": [draft],
+            "iteration_count": iteration_count,
+            "prompt_tokens": [prompt_tokens],
+            **self._gate_first_draft(state, draft, iteration_count)
+        }
+        if reason is not None:
+            update["routing"] = [self.router.record(iteration_count, model, reason, seconds, usage)]
+        
+        # Only drafts of this turn count; a session's earlier answers are context, not a previous draft
+        previous_draft = latest_draft(state["messages"])
+        stop_reason = self.convergence.after_generation(
+            previous_draft.content if previous_draft is not None else None, draft.content
         )
+        if stop_reason is None and update.get("reflection_skipped"):
+            stop_reason = STOP_GATE
+        if stop_reason is None and iteration_count >= self._profile().max_iterations:
+            stop_reason = STOP_MAX_ITERATIONS
+        # Reflecting only pays off if the refinement it asks for can also finish in time
+        if stop_reason is None and not self._fits(("reflect", self.reflection_model),
+                                                  ("generate", self._refinement_model())):
+            stop_reason = STOP_DEADLINE
+        if stop_reason is not None:
+            update["stop_reason"] = stop_reason
+        return update
+    
+    def _deadline(self) -> Optional[float]:
+        # The deadline travels in the run config rather than the state, so a resumed run gets a fresh one
+        return get_config().get("configurable", {}).get("deadline")
+    
+    def _fits(self, *phases) -> bool:
+        """Whether (phase, model) steps can finish before the run's deadline at their estimated durations"""
+        left = remaining(self._deadline())
+        if left is None:
+            return True
+        # Phases not observed yet count as free; cancellation at the deadline still bounds them
+        return sum(self.phase_latency.estimate(phase, model) or 0.0 for phase, model in phases) < left
+    
+    def _refinement_model(self) -> str:
+        """Model of the run's next refinement: the requested one, otherwise the main model routing escalates to"""
+        return self._profile().model or self.main_model
+    
+    def _schedule(self, iteration_count: int, tokens: int):
+        """Describe the next model call to the scheduler: first drafts go ahead of refinements"""
+        priority = PRIORITY_FIRST_DRAFT if iteration_count <= 1 else PRIORITY_REFINEMENT
+        return scheduled_call(priority, self._deadline(), tokens)
+    
+    def _keep_latest_draft(self, iteration_count: int, error: Exception) -> Dict[str, Any]:
+        """Stop with the latest draft when a later step fails, is not admitted or runs out of time"""
+        if isinstance(error, AdmissionRejected):
+            stop_reason = STOP_RATE_LIMITED
+        elif isinstance(error, DeadlineExceeded):
+            stop_reason = STOP_DEADLINE
+        else:
+            stop_reason = STOP_GENERATION_FAILED
+        if self.verbose:
+            logger.info(f"\n--- Iteration {iteration_count} did not finish ({stop_reason}); keeping the latest draft ---")
+        return {"stop_reason": stop_reason}
+    
+    def generate(self, state: ReflectionState) -> Dict[str, Any]:
+        """Generate a response with robust error handling"""
+        iteration_count, prompt, model, reason = self._prepare_generation(state)
+        start = time.perf_counter()
+        try:
+            with self._schedule(iteration_count, estimate_tokens(prompt)) as call, \
+                    PHASE_SECONDS.time(phase="generate", model=model):
+                messages = generate_response(
+                    prompt, 
+                    self.generation_llms[model],
+                    self.verbose, 
+                    self.retry_delay, 
+                    self.max_retries,
+                    iteration_count,
+                    breaker=self.circuit_breakers.get(model),
+                    max_delay=self.retry_max_delay
+                )
+        except Exception as e:
+            # Without a draft there is nothing to fall back on
+            if iteration_count == 1:
+                raise
+            return self._keep_latest_draft(iteration_count, e)
+        seconds = time.perf_counter() - start
+        self.phase_latency.record("generate", model, seconds)
+        call.settle(getattr(messages[-1], "usage_metadata", None))
+        return self._finish_generation(state, prompt, messages, iteration_count, model, reason, seconds)
+    
+    async def agenerate(self, state: ReflectionState) -> Dict[str, Any]:
+        """Generate a response without blocking the event loop"""
+        iteration_count, prompt, model, reason = self._prepare_generation(state)
+        start = time.perf_counter()
+        try:
+            with self._schedule(iteration_count, estimate_tokens(prompt)) as call, \
+                    PHASE_SECONDS.time(phase="generate", model=model):
+                messages = await until_deadline(agenerate_response(
+                    prompt,
+                    self.generation_llms[model],
+                    self.verbose,
+                    self.retry_delay,
+                    self.max_retries,
+                    iteration_count,
+                    breaker=self.circuit_breakers.get(model),
+                    max_delay=self.retry_max_delay,
+                    timeout=self.call_timeout
+                ), self._deadline(), "generate")
+        except Exception as e:
+            if iteration_count == 1:
+                raise
+            return self._keep_latest_draft(iteration_count, e)
+        seconds = time.perf_counter() - start
+        self.phase_latency.record("generate", model, seconds)
+        call.settle(getattr(messages[-1], "usage_metadata", None))
+        return self._finish_generation(state, prompt, messages, iteration_count, model, reason, seconds)
+    
+    def _finish_reflection(self, state: ReflectionState, result: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+        """Turn the reflection result into a state update carrying the typed verdict and stop decision"""
+        record_usage(self.reflection_model, "reflect", result.get("usage"))
+        if not result.get("error"):
+            self.phase_latency.record("reflect", self.reflection_model, seconds)
+        verdict = result.get("verdict")
+        update = {"messages": result["messages"], "needs_improvement": result["needs_improvement"]}
+        scores = list(state.get("scores", []))
+        if verdict is not None:
+            update["verdict"] = verdict.model_dump()
+            update["scores"] = [verdict.score]
+            scores.append(verdict.score)
+            best = state.get("best_draft")
+            draft = latest_draft(state["messages"])
+            # Ties go to the newer draft, which already took earlier feedback into account
+            if verdict.score is not None and draft is not None and (best is None or verdict.score >= best["score"]):
+                update["best_draft"] = {"content": draft.content, "score": verdict.score,
+                                        "iteration": state.get("iteration_count", 0)}
         
-        # Update the flag based on the reflection result
-        self.no_reflection_needed = not result["needs_improvement"]
+        if result.get("rate_limited"):
+            update["stop_reason"] = STOP_RATE_LIMITED
+        elif result.get("error"):
+            # The draft stands as the answer rather than regenerating without feedback
+            update["stop_reason"] = STOP_REFLECTION_FAILED
+        elif not result["needs_improvement"]:
+            update["stop_reason"] = STOP_NO_IMPROVEMENT_NEEDED
+        else:
+            stop_reason = self.convergence.after_reflection(scores)
+            if stop_reason is None and not self._fits(("generate", self._refinement_model())):
+                stop_reason = STOP_DEADLINE
+            if stop_reason is not None:
+                update["stop_reason"] = stop_reason
+        return update
+    
+    def _reflection_tokens(self, state: ReflectionState) -> int:
+        """Rough prompt size of a reflection call: system prompt, query and latest draft"""
+        draft = state["messages"][-1].content if state["messages"] else ""
+        return (len(self._profile().reflection_system_prompt) + len(state.get("query", "")) + len(str(draft))) // 4 + 12
+    
+    def reflect(self, state: ReflectionState) -> Dict[str, Any]:
+        """Reflect on the response with error handling"""
+        iteration_count = state.get("iteration_count", 0)
+        profile = self._profile()
+        get_stream_writer()({"event": "phase", "phase": "reflect", "status": "started", "iteration": iteration_count})
+        start = time.perf_counter()
+        with self._schedule(iteration_count, self._reflection_tokens(state)) as call, \
+                PHASE_SECONDS.time(phase="reflect", model=self.reflection_model):
+            result = evaluate_response(
+                state["messages"], 
+                self.reflection_llm, 
+                profile.reflection_system_prompt,
+                self.verbose, 
+                self.retry_delay, 
+                self.max_retries,
+                iteration_count,
+                structured=self.reflection_mode == "structured",
+                breaker=self.circuit_breakers.get(self.reflection_model),
+                max_delay=self.retry_max_delay,
+                chain=profile.reflection_chain
+            )
+        call.settle(result.get("usage"))
+        return self._finish_reflection(state, result, time.perf_counter() - start)
+    
+    async def areflect(self, state: ReflectionState) -> Dict[str, Any]:
+        """Reflect on the response without blocking the event loop"""
+        iteration_count = state.get("iteration_count", 0)
+        profile = self._profile()
+        get_stream_writer()({"event": "phase", "phase": "reflect", "status": "started", "iteration": iteration_count})
+        start = time.perf_counter()
+        try:
+            with self._schedule(iteration_count, self._reflection_tokens(state)) as call, \
+                    PHASE_SECONDS.time(phase="reflect", model=self.reflection_model):
+                result = await until_deadline(aevaluate_response(
+                    state["messages"],
+                    self.reflection_llm,
+                    profile.reflection_system_prompt,
+                    self.verbose,
+                    self.retry_delay,
+                    self.max_retries,
+                    iteration_count,
+                    structured=self.reflection_mode == "structured",
+                    breaker=self.circuit_breakers.get(self.reflection_model),
+                    max_delay=self.retry_max_delay,
+                    timeout=self.call_timeout,
+                    chain=profile.reflection_chain
+                ), self._deadline(), "reflect")
+        except DeadlineExceeded as e:
+            return self._keep_latest_draft(iteration_count, e)
+        call.settle(result.get("usage"))
+        return self._finish_reflection(state, result, time.perf_counter() - start)
+    
+    def _fan_out(self, state: ReflectionState) -> List[Send]:
+        """Start one draft task per temperature, all from the same prompt and on the same model"""
+        prompt = compact_messages(state["messages"], self._profile().compaction_strategy)
+        model, reason = self._route(state, 1)
+        return [
+            Send("draft", {"index": index, "prompt": prompt, "model": model, "reason": reason})
+            for index in range(len(self.draft_temperatures))
+        ]
+    
+    def _start_draft(self, task: Dict[str, Any]) -> None:
+        event = {"event": "phase", "phase": "draft", "status": "started", "iteration": 1, "candidate": task["index"]}
+        get_stream_writer()({**event, "model": task["model"]} if task.get("reason") else event)
+    
+    def _draft_model(self, task: Dict[str, Any]) -> str:
+        # Tasks checkpointed before routing existed carry no model
+        return task.get("model", self.main_model)
+    
+    def _finish_draft(self, task: Dict[str, Any], messages: List[BaseMessage], model: str,
+                      seconds: float) -> Dict[str, Any]:
+        """Record a finished speculative draft as a candidate for judging"""
+        draft = messages[-1]
+        usage = getattr(draft, "usage_metadata", None)
+        record_usage(model, "generate", usage)
+        self.phase_latency.record("draft", model, seconds)
+        index = task["index"]
+        update = {
+            "candidates": [{"index": index, "temperature": self.draft_temperatures[index], "content": draft.content}],
+            "prompt_tokens": [usage["input_tokens"] if usage else estimate_tokens(task["prompt"])]
+        }
+        if task.get("reason") is not None:
+            update["routing"] = [self.router.record(1, model, task["reason"], seconds, usage, candidate=index)]
+        return update
+    
+    def draft(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Produce one speculative candidate at this task's temperature"""
+        self._start_draft(task)
+        model = self._draft_model(task)
+        start = time.perf_counter()
+        try:
+            with self._schedule(1, estimate_tokens(task["prompt"])) as call, \
+                    PHASE_SECONDS.time(phase="draft", model=model):
+                messages = generate_response(
+                    task["prompt"],
+                    self.draft_llms[model][task["index"]],
+                    self.verbose,
+                    self.retry_delay,
+                    self.max_retries,
+                    1,
+                    breaker=self.circuit_breakers.get(model),
+                    max_delay=self.retry_max_delay
+                )
+        except Exception:
+            # Extra candidates are best effort: judging goes ahead with the drafts that succeeded
+            if task["index"] == 0:
+                raise
+            return {}
+        call.settle(getattr(messages[-1], "usage_metadata", None))
+        return self._finish_draft(task, messages, model, time.perf_counter() - start)
+    
+    async def adraft(self, task: Dict[str, Any]) -> Dict[str, Any]:
+        """Produce one speculative candidate without blocking the event loop"""
+        self._start_draft(task)
+        model = self._draft_model(task)
+        start = time.perf_counter()
+        try:
+            with self._schedule(1, estimate_tokens(task["prompt"])) as call, \
+                    PHASE_SECONDS.time(phase="draft", model=model):
+                messages = await until_deadline(agenerate_response(
+                    task["prompt"],
+                    self.draft_llms[model][task["index"]],
+                    self.verbose,
+                    self.retry_delay,
+                    self.max_retries,
+                    1,
+                    breaker=self.circuit_breakers.get(model),
+                    max_delay=self.retry_max_delay,
+                    timeout=self.call_timeout
+                ), self._deadline(), "draft")
+        except Exception as e:
+            # Extra candidates are best effort: judging goes ahead with the drafts that succeeded.
+            # At the deadline every draft is cut off alike, and judging finds out whether any finished.
+            if task["index"] == 0 and not isinstance(e, DeadlineExceeded):
+                raise
+            return {}
+        call.settle(getattr(messages[-1], "usage_metadata", None))
+        return self._finish_draft(task, messages, model, time.perf_counter() - start)
+    
+    def _start_judging(self, state: ReflectionState):
+        """Announce judging and return the candidates in draft order with their estimated prompt size"""
+        get_stream_writer()({"event": "phase", "phase": "reflect", "status": "started", "iteration": 1})
+        candidates = sorted(state["candidates"], key=lambda candidate: candidate["index"])
+        if not candidates:
+            # Every draft was cut off at the deadline, so there is nothing to return
+            raise DeadlineExceeded("draft")
+        tokens = (len(self._profile().reflection_system_prompt) + len(state.get("query", ""))
+                  + sum(len(str(candidate["content"])) for candidate in candidates)) // 4 + 12 * len(candidates)
+        return candidates, tokens
+    
+    def _finish_judging(self, state: ReflectionState, candidates: List[Dict[str, Any]],
+                        result: Dict[str, Any], seconds: float) -> Dict[str, Any]:
+        """Keep the best-rated candidate as the draft and decide whether it gets one refinement"""
+        record_usage(self.reflection_model, "reflect", result.get("usage"))
+        if not result.get("error"):
+            self.phase_latency.record("judge", self.reflection_model, seconds)
+        verdicts = result["verdicts"]
+        
+        def rating(position: int) -> float:
+            verdict = verdicts[position]
+            if verdict is None:
+                return -1.0
+            if verdict.score is not None:
+                return verdict.score
+            return 0.0 if verdict.needs_improvement else PASSING_SCORE
+        
+        # Ties go to the earlier, lower-temperature draft
+        best = max(range(len(candidates)), key=lambda position: (rating(position), -position))
+        verdict = verdicts[best]
+        if self.verbose:
+            logger.info(f"\n--- Selected candidate {candidates[best]['index']} of {len(candidates)} ---")
+        
+        update = {
+            "messages": [AIMessage(content=candidates[best]["content"])],
+            "iteration_count": 1,
+            "scores": [v.score if v is not None else None for v in verdicts],
+            "needs_improvement": verdict.needs_improvement if verdict is not None else False
+        }
+        if verdict is not None:
+            update["verdict"] = verdict.model_dump()
+            update["messages"].append(HumanMessage(content=f"{FEEDBACK_PREFIX} {verdict.to_feedback()}"))
         
-        return result["messages"]
+        if result.get("rate_limited"):
+            update["stop_reason"] = STOP_RATE_LIMITED
+        elif result.get("error"):
+            update["stop_reason"] = STOP_REFLECTION_FAILED
+        elif verdict is None or not verdict.needs_improvement:
+            update["stop_reason"] = STOP_NO_IMPROVEMENT_NEEDED
+        else:
+            stop_reason = self.convergence.after_reflection([verdict.score])
+            if stop_reason is None and self._profile().max_iterations <= 1:
+                stop_reason = STOP_MAX_ITERATIONS
+            if stop_reason is None and not self._fits(("generate", self._refinement_model())):
+                stop_reason = STOP_DEADLINE
+            if stop_reason is not None:
+                update["stop_reason"] = stop_reason
+        return update
+    
+    def judge(self, state: ReflectionState) -> Dict[str, Any]:
+        """Score every candidate with one reflection call"""
+        candidates, tokens = self._start_judging(state)
+        start = time.perf_counter()
+        with self._schedule(1, tokens) as call, \
+                PHASE_SECONDS.time(phase="reflect", model=self.reflection_model):
+            result = evaluate_candidates(
+                state["query"],
+                [candidate["content"] for candidate in candidates],
+                self.reflection_llm,
+                self._profile().reflection_system_prompt,
+                self.verbose,
+                self.retry_delay,
+                self.max_retries,
+                structured=self.reflection_mode == "structured",
+                breaker=self.circuit_breakers.get(self.reflection_model),
+                max_delay=self.retry_max_delay,
+                runnable=self.judge_runnable
+            )
+        call.settle(result.get("usage"))
+        return self._finish_judging(state, candidates, result, time.perf_counter() - start)
+    
+    async def ajudge(self, state: ReflectionState) -> Dict[str, Any]:
+        """Score every candidate with one reflection call without blocking the event loop"""
+        candidates, tokens = self._start_judging(state)
+        start = time.perf_counter()
+        try:
+            with self._schedule(1, tokens) as call, \
+                    PHASE_SECONDS.time(phase="reflect", model=self.reflection_model):
+                result = await until_deadline(aevaluate_candidates(
+                    state["query"],
+                    [candidate["content"] for candidate in candidates],
+                    self.reflection_llm,
+                    self._profile().reflection_system_prompt,
+                    self.verbose,
+                    self.retry_delay,
+                    self.max_retries,
+                    structured=self.reflection_mode == "structured",
+                    breaker=self.circuit_breakers.get(self.reflection_model),
+                    max_delay=self.retry_max_delay,
+                    timeout=self.call_timeout,
+                    runnable=self.judge_runnable
+                ), self._deadline(), "judge")
+        except DeadlineExceeded:
+            # Unjudged, the first draft is the best guess: it was sampled at the lowest temperature
+            return {
+                "messages": [AIMessage(content=candidates[0]["content"])],
+                "iteration_count": 1,
+                "stop_reason": STOP_DEADLINE
+            }
+        call.settle(result.get("usage"))
+        return self._finish_judging(state, candidates, result, time.perf_counter() - start)
+    
+    def refine(self, state: ReflectionState) -> Dict[str, Any]:
+        """Apply the judge's feedback to the selected candidate once"""
+        update = self.generate(state)
+        update.setdefault("stop_reason", STOP_REFINED)
+        return update
+    
+    async def arefine(self, state: ReflectionState) -> Dict[str, Any]:
+        """Apply the judge's feedback to the selected candidate once without blocking the event loop"""
+        update = await self.agenerate(state)
+        update.setdefault("stop_reason", STOP_REFINED)
+        return update
     
     def _create_graph(self):
         """Create the LangGraph workflow"""
-        builder = MessageGraph()
+        builder = StateGraph(ReflectionState)
         
-        builder.add_node("generate", self.generate)
-        builder.add_node("reflect", self.reflect)
+        def route(node: str, next_node: str):
+            def should_continue(state: ReflectionState) -> str:
+                with ROUTING_SECONDS.time(node=node):
+                    # Nodes record why the run should stop in its own state, so concurrent runs never interfere
+                    stop_reason = state.get("stop_reason")
+                    decision = END if stop_reason else next_node
+                ROUTING_DECISIONS.inc(node=node, decision=decision)
+                if stop_reason and self.verbose:
+                    logger.info(f"\n--- Stopping: {stop_reason} ---")
+                return decision
+            return should_continue
         
-        builder.set_entry_point("generate")
-        
-        def should_continue(messages: List[BaseMessage]) -> str:
-            ai_responses = sum(1 for msg in messages if isinstance(msg, AIMessage))
+        if self.topology == "speculative":
+            # Parallel drafts at varied temperatures, one judging pass, then at most one refinement
+            builder.add_node("draft", RunnableCallable(self.draft, self.adraft, name="draft"))
+            builder.add_node("judge", RunnableCallable(self.judge, self.ajudge, name="judge"))
+            builder.add_node("refine", RunnableCallable(self.refine, self.arefine, name="refine"))
             
-            if ai_responses >= self.max_iterations:
-                if self.verbose:
-                    logger.info(f"\n--- Reached maximum iterations ({self.max_iterations}) ---")
-                return END
-            
-            # Check the flag to see if no reflection is needed
-            if self.no_reflection_needed:
-                if self.verbose:
-                    logger.info("\n--- No further reflection needed ---")
-                return END
-            
-            last_message = messages[-1] if messages else None
+            builder.add_conditional_edges(START, self._fan_out, ["draft"])
+            builder.add_edge("draft", "judge")
+            builder.add_conditional_edges("judge", route("judge", "refine"))
+            builder.add_edge("refine", END)
+        else:
+            # Register sync and async implementations so both graph.invoke and graph.ainvoke work
+            builder.add_node("generate", RunnableCallable(self.generate, self.agenerate, name="generate"))
+            builder.add_node("reflect", RunnableCallable(self.reflect, self.areflect, name="reflect"))
             
-            if isinstance(last_message, AIMessage):
-                return "reflect"
+            builder.set_entry_point("generate")
             
-            if isinstance(last_message, HumanMessage) and "feedback" in last_message.content:
-                return "generate"
+            after_generate = route("generate", "reflect")
+            after_reflect = route("reflect", "generate")
             
-            return END
-        
-        builder.add_conditional_edges("generate", should_continue)
-        builder.add_conditional_edges("reflect", should_continue)
+            builder.add_conditional_edges("generate", after_generate)
+            builder.add_conditional_edges("reflect", after_reflect)
         
         # Configure LangSmith tracing if enabled
         if self.use_langsmith:
@@ -151,46 +862,521 @@ class ReflectionPatternAgent:
             os.environ["LANGCHAIN_PROJECT"] = self.langsmith_project
             
             # Compile without passing langsmith_config directly
-            self.graph = builder.compile()
+            self.graph = builder.compile(checkpointer=self.checkpointer)
             
             if self.verbose:
                 logger.info(f"LangSmith tracing enabled for project: {self.langsmith_project}")
         else:
             # If LangSmith is not enabled, just compile without any config
-            self.graph = builder.compile()
+            self.graph = builder.compile(checkpointer=self.checkpointer)
     
-    def run(self, query: str) -> Dict[str, Any]:
-        """Run the agent with comprehensive error handling"""
-        self.iteration_count = 0
-        # Reset the flag at the start of each run
-        self.no_reflection_needed = False
-        
-        messages = [self.main_system_message, HumanMessage(content=query)]
+    def _initial_state(self, query: str, history: Sequence[BaseMessage] = (),
+                       profile: Optional[RunProfile] = None) -> ReflectionState:
+        """Build the starting graph state for a single run, after any earlier turns of its session"""
+        system_message = (profile or self.default_profile).main_system_message
+        return {
+            "messages": [system_message, *history, HumanMessage(content=query)],
+            "query": query,
+            "iteration_count": 0,
+            "needs_improvement": False,
+            "reflection_skipped": False,
+            "prompt_tokens": [],
+            "scores": [],
+            "best_draft": None,
+            "verdict": None,
+            "stop_reason": None,
+            "candidates": [],
+            "routing": []
+        }
+    
+    def _reserve_run(self, run_id: Optional[str]) -> str:
+        """
+        Claim the id of a run, generated unless the caller supplied one; it names the checkpoint thread when checkpointing.
         
+        The caller must release the id with self._active_runs.discard once the run ends.
+        """
+        run_id = run_id or uuid.uuid4().hex
+        with self._runs_lock:
+            if run_id in self._active_runs:
+                raise RunConflictError(run_id, "is already in progress")
+            self._active_runs.add(run_id)
+        return run_id
+    
+    def _run_config(self, run_id: str, profile: Optional[RunProfile] = None,
+                    timeout_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Graph config for one run: its checkpoint thread, profile and the deadline of this attempt"""
+        if timeout_seconds is None:
+            timeout_seconds = self.request_timeout
+        configurable = {
+            "deadline": time.time() + timeout_seconds if timeout_seconds else None,
+            "profile": profile or self.default_profile
+        }
+        if self.checkpointer is not None:
+            configurable["thread_id"] = run_id
+        return {"configurable": configurable}
+    
+    def _resume_point(self, snapshot, query: str, run_id: str) -> Optional[ReflectionState]:
+        """Checkpointed state of a run that already started, after checking it answers the same query"""
+        if snapshot is None or not snapshot.values:
+            return None
+        if snapshot.values.get("query") != query:
+            raise RunConflictError(run_id, "was started for a different query")
         if self.verbose:
-            logger.info(f"User query: {query}")
+            logger.info(f"Resuming run {run_id} after iteration {snapshot.values.get('iteration_count', 0)}")
+        return snapshot.values
+    
+    def _build_result(self, final_state: ReflectionState) -> Dict[str, Any]:
+        """Extract the final AI response from the finished run state"""
+        final_messages = final_state["messages"]
+        final_response = None
+        for message in reversed(final_messages):
+            if isinstance(message, AIMessage):
+                final_response = message.content
+                break
+        best = final_state.get("best_draft")
+        if best is not None and final_state.get("stop_reason") in BEST_DRAFT_STOP_REASONS:
+            # More iterations stopped paying off, and the newest draft may have scored lower than an earlier one
+            final_response = best["content"]
+        
+        return {
+            "response": final_response or "No response generated.",
+            "iterations": final_state.get("iteration_count", 0),
+            "reflection_skipped": final_state.get("reflection_skipped", False),
+            "prompt_tokens": final_state.get("prompt_tokens", []),
+            "scores": final_state.get("scores", []),
+            "verdict": final_state.get("verdict"),
+            "stop_reason": final_state.get("stop_reason"),
+            # The loop was cut short and the answer is the best draft so far
+            "partial": final_state.get("stop_reason") in PARTIAL_STOP_REASONS,
+            "routing": summarize_routing(final_state.get("routing")),
+            "messages": final_messages
+        }
+    
+    def _build_error_result(self, state: ReflectionState, error: Exception) -> Dict[str, Any]:
+        """Build the result returned when the graph fails"""
+        logger.error(f"Error running reflection agent: {str(error)}")
+        
+        result = {
+            "response": "I encountered an error while processing your request. This might be due to technical limitations or temporary issues.",
+            "iterations": state.get("iteration_count", 0),
+            "error": str(error),
+            "messages": state["messages"]
+        }
+        if isinstance(error, (CircuitOpenError, AdmissionRejected)):
+            # Lets callers tell "come back later" apart from other failures
+            result["retry_after"] = error.retry_after
+            result["error_type"] = "rate_limited" if isinstance(error, AdmissionRejected) else "circuit_open"
+        elif isinstance(error, DeadlineExceeded):
+            result["error_type"] = "deadline"
+        return result
+    
+    def cache_key(self, query: str, profile: Optional[RunProfile] = None) -> str:
+        """Cache key for a query under this agent's (or the profile's) models, prompts and iteration cap"""
+        return make_cache_key(query, (profile or self.default_profile).cache_config)
+    
+    def _cache_lookup(self, query: str, profile: Optional[RunProfile] = None) -> Optional[Dict[str, Any]]:
+        """Return a cached result for the query from the exact or semantic cache, if present"""
+        profile = profile or self.default_profile
+        if self.cache is not None:
+            cached = self.cache.get(self.cache_key(query, profile))
+            CACHE_LOOKUPS.inc(cache="exact", result="miss" if cached is None else "hit")
+            if cached is not None:
+                if self.verbose:
+                    logger.info(f"Cache hit for query: {query}")
+                return {**cached, "cached": True}
+        
+        if self.semantic_cache is not None:
+            match = self.semantic_cache.lookup(query, profile.cache_namespace)
+            CACHE_LOOKUPS.inc(cache="semantic", result="miss" if match is None else "hit")
+            if match is not None:
+                cached, similarity = match
+                if self.verbose:
+                    logger.info(f"Semantic cache hit ({similarity:.3f}) for query: {query}")
+                return {**cached, "cached": True, "similarity": similarity}
+        
+        return None
+    
+    def _record_run(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Record run-level metrics for a freshly computed result"""
+        RUN_ITERATIONS.observe(result.get("iterations", 0))
+        RUNS.inc(stop_reason="error" if "error" in result else (result.get("stop_reason") or "unknown"))
+        return result
+    
+    def _cache_store(self, query: str, result: Dict[str, Any], profile: Optional[RunProfile] = None) -> None:
+        """Store a successful, complete result in the cache"""
+        if "error" in result or result.get("partial"):
+            return
         
+        profile = profile or self.default_profile
         try:
-            final_messages = self.graph.invoke(messages)
+            if self.cache is not None:
+                self.cache.set(self.cache_key(query, profile), result)
+            if self.semantic_cache is not None:
+                self.semantic_cache.store(query, result, profile.cache_namespace)
+        except Exception as e:
+            logger.warning(f"Failed to cache result: {str(e)}")
+    
+    def _session_history(self, session_id: Optional[str]) -> List[BaseMessage]:
+        return self.sessions.history(session_id) if self.sessions is not None else []
+    
+    def _remember(self, session_id: Optional[str], query: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a successful answer to its session and tag the result with the session id"""
+        if self.sessions is None or not session_id:
+            return result
+        if "error" not in result:
+            self.sessions.record(session_id, query, result["response"])
+        return {**result, "session_id": session_id}
+    
+    async def _aremember(self, session_id: Optional[str], query: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Like _remember, without blocking the event loop when the session summary is model-written"""
+        if self.sessions is None or not session_id:
+            return result
+        if "error" not in result:
+            await self.sessions.arecord(session_id, query, result["response"])
+        return {**result, "session_id": session_id}
+    
+    def _with_run_id(self, result: Dict[str, Any], run_id: str) -> Dict[str, Any]:
+        """Tag a result with its run id, leaving the (possibly cached) original untouched"""
+        return {**result, "run_id": run_id}
+    
+    def _coalescing(self, run_id: Optional[str], history: Sequence[BaseMessage],
+                    timeout_seconds: Optional[float] = None) -> bool:
+        """Whether a run may be shared with identical concurrent requests"""
+        # A caller-chosen run id names its own checkpoint thread, and a follow-up depends on its session.
+        # A run under the caller's own deadline may stop early, which is no answer for callers with another.
+        return self.coalescer is not None and run_id is None and not history and timeout_seconds is None
+    
+    def _shared(self, result: Dict[str, Any], shared: bool) -> Dict[str, Any]:
+        """Mark a result that came from a run another request started"""
+        return {**result, "coalesced": True} if shared else result
+    
+    def run(self, query: str, run_id: Optional[str] = None, session_id: Optional[str] = None,
+            options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Run the agent with comprehensive error handling.
+        
+        With a checkpointer, passing the run_id of an earlier interrupted run
+        continues it from its last completed step instead of starting over.
+        With a session store, passing a session_id puts the earlier turns of
+        that session in front of the query and records the answer in it.
+        With a coalescer, a query identical to one already running waits for
+        that run's result instead of starting another.
+        options overrides the model, iteration cap, prompt variant or
+        timeout_seconds of this run alone (see resolve_profile).
+        Unlike arun, a model call in flight at the deadline is not cancelled;
+        the run stops at the next step boundary (see src.core.deadline).
+        """
+        profile = self.resolve_profile(options)
+        timeout_seconds = (options or {}).get("timeout_seconds")
+        history = self._session_history(session_id)
+        # Follow-ups depend on their session, so they neither use nor fill the shared caches
+        cached = self._cache_lookup(query, profile) if not history else None
+        if cached is not None:
+            return self._remember(session_id, query, cached)
+        
+        if self._coalescing(run_id, history, timeout_seconds):
+            result, shared = self.coalescer.do(
+                self.cache_key(query, profile), lambda: self._execute(query, None, history, profile, timeout_seconds)
+            )
+            result = self._shared(result, shared)
+        else:
+            result = self._execute(query, run_id, history, profile, timeout_seconds)
+        return self._remember(session_id, query, result)
+    
+    def _execute(self, query: str, run_id: Optional[str], history: Sequence[BaseMessage],
+                 profile: RunProfile, timeout_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Run or resume the graph for one query and cache a fresh result"""
+        run_id = self._reserve_run(run_id)
+        try:
+            config = self._run_config(run_id, profile, timeout_seconds)
+            snapshot = self.graph.get_state(config) if self.checkpointer is not None else None
+            restored = self._resume_point(snapshot, query, run_id)
+            state = restored or self._initial_state(query, history, profile)
             
-            final_response = None
-            for message in reversed(final_messages):
-                if isinstance(message, AIMessage):
-                    final_response = message.content
-                    break
+            if self.verbose:
+                logger.info(f"User query: {query}")
             
-            return {
-                "response": final_response or "No response generated.",
-                "iterations": self.iteration_count,
-                "messages": final_messages
-            }
+            if restored is not None and not snapshot.next:
+                # The run already finished; its checkpoint holds the result
+                return self._with_run_id(self._build_result(restored), run_id)
+            try:
+                final_state = self.graph.invoke(None if restored is not None else state, config)
+                result = self._record_run(self._build_result(final_state))
+            except Exception as e:
+                return self._with_run_id(self._record_run(self._build_error_result(state, e)), run_id)
+        finally:
+            self._active_runs.discard(run_id)
+        
+        if not history:
+            self._cache_store(query, result, profile)
+        return self._with_run_id(result, run_id)
+    
+    async def arun(self, query: str, run_id: Optional[str] = None, session_id: Optional[str] = None,
+                   options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Run the agent asynchronously so the caller's event loop is never blocked"""
+        profile = self.resolve_profile(options)
+        timeout_seconds = (options or {}).get("timeout_seconds")
+        history = self._session_history(session_id)
+        # Follow-ups depend on their session, so they neither use nor fill the shared caches
+        cached = self._cache_lookup(query, profile) if not history else None
+        if cached is not None:
+            return await self._aremember(session_id, query, cached)
+        
+        if self._coalescing(run_id, history, timeout_seconds):
+            result, shared = await self.coalescer.ado(
+                self.cache_key(query, profile), lambda: self._aexecute(query, None, history, profile, timeout_seconds)
+            )
+            result = self._shared(result, shared)
+        else:
+            result = await self._aexecute(query, run_id, history, profile, timeout_seconds)
+        return await self._aremember(session_id, query, result)
+    
+    async def _aexecute(self, query: str, run_id: Optional[str], history: Sequence[BaseMessage],
+                        profile: RunProfile, timeout_seconds: Optional[float] = None) -> Dict[str, Any]:
+        """Async counterpart of _execute"""
+        run_id = self._reserve_run(run_id)
+        try:
+            config = self._run_config(run_id, profile, timeout_seconds)
+            snapshot = await self.graph.aget_state(config) if self.checkpointer is not None else None
+            restored = self._resume_point(snapshot, query, run_id)
+            state = restored or self._initial_state(query, history, profile)
             
-        except Exception as e:
-            logger.error(f"Error running reflection agent: {str(e)}")
+            if self.verbose:
+                logger.info(f"User query: {query}")
             
-            return {
-                "response": "I encountered an error while processing your request. This might be due to technical limitations or temporary issues.",
-                "iterations": self.iteration_count,
-                "error": str(e),
-                "messages": messages
-            }
+            if restored is not None and not snapshot.next:
+                # The run already finished; its checkpoint holds the result
+                return self._with_run_id(self._build_result(restored), run_id)
+            try:
+                final_state = await self.graph.ainvoke(None if restored is not None else state, config)
+                result = self._record_run(self._build_result(final_state))
+            except Exception as e:
+                return self._with_run_id(self._record_run(self._build_error_result(state, e)), run_id)
+        finally:
+            self._active_runs.discard(run_id)
+        
+        if not history:
+            self._cache_store(query, result, profile)
+        return self._with_run_id(result, run_id)
+    
+    async def aget_run(self, run_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Latest checkpointed result of a run, complete or partial.
+        
+        Returns None when there is no checkpointer or no run with this id. The
+        result carries a "status": "running" while this process executes it,
+        "completed" once it finished and "interrupted" if it stopped part way.
+        """
+        if self.checkpointer is None:
+            return None
+        snapshot = await self.graph.aget_state(self._run_config(run_id))
+        if not snapshot.values:
+            return None
+        if run_id in self._active_runs:
+            status = "running"
+        else:
+            status = "interrupted" if snapshot.next else "completed"
+        return {**self._build_result(snapshot.values), "run_id": run_id, "status": status, "next": list(snapshot.next)}
+    
+    async def aresume(self, run_id: str, options: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+        """
+        Continue an interrupted run from its last checkpoint; None if there is no such run.
+        
+        Overrides are not checkpointed, so a run started with options needs them again to resume alike.
+        """
+        if self.checkpointer is None:
+            return None
+        snapshot = await self.graph.aget_state(self._run_config(run_id))
+        if not snapshot.values:
+            return None
+        return await self.arun(snapshot.values["query"], run_id, options=options)
+    
+    def _build_batch_failure(self, error: Exception) -> Dict[str, Any]:
+        """Result reported for a batch item whose run raised instead of returning"""
+        logger.error(f"Batch query failed: {str(error)}")
+        return {
+            "response": "I encountered an error while processing your request.",
+            "iterations": 0,
+            "error": str(error),
+            "messages": []
+        }
+    
+    @staticmethod
+    def _check_batch_query(query: str) -> None:
+        """Reject an empty batch item, as the single-query endpoints reject an empty query"""
+        if not query or not query.strip():
+            raise ValueError("No query provided")
+    
+    def run_batch(self, queries: List[str], max_concurrency: int = 8,
+                  options: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        """
+        Run many queries on a thread pool and return their results in input order.
+        
+        A failing or empty query yields a result with an "error" field instead of aborting the batch.
+        options applies the same per-run overrides as run to every query.
+        """
+        results: List[Optional[Dict[str, Any]]] = [None] * len(queries)
+        
+        def run_one(query: str) -> Dict[str, Any]:
+            self._check_batch_query(query)
+            return self.run(query, options=options)
+        
+        with ThreadPoolExecutor(max_workers=max(1, max_concurrency)) as executor:
+            futures = {executor.submit(run_one, query): index for index, query in enumerate(queries)}
+            for future in as_completed(futures):
+                index = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = self._build_batch_failure(e)
+                results[index] = {"index": index, "query": queries[index], **result}
+        
+        return results
+    
+    async def arun_batch(self, queries: List[str], max_concurrency: int = 8,
+                         options: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run many queries concurrently and yield each result as soon as it finishes.
+        
+        At most max_concurrency reflection loops are in flight at once; per-model
+        rate limits are enforced by the shared rate limiters on the LLM clients.
+        Results carry their input "index" since they arrive out of order. A failing
+        or empty query yields a result with an "error" field, as in run_batch.
+        """
+        completed: asyncio.Queue = asyncio.Queue()
+        pending = iter(enumerate(queries))
+        
+        async def worker():
+            # Workers share one iterator, so each query is picked up exactly once
+            for index, query in pending:
+                try:
+                    self._check_batch_query(query)
+                    result = await self.arun(query, options=options)
+                except Exception as e:
+                    result = self._build_batch_failure(e)
+                await completed.put({"index": index, "query": query, **result})
+        
+        workers = [asyncio.create_task(worker()) for _ in range(max(1, min(max_concurrency, len(queries))))]
+        try:
+            for _ in range(len(queries)):
+                yield await completed.get()
+        finally:
+            # Stop outstanding work if the consumer goes away early
+            for task in workers:
+                task.cancel()
+    
+    async def astream(self, query: str, run_id: Optional[str] = None, session_id: Optional[str] = None,
+                      options: Optional[Dict[str, Any]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Run the agent and yield events as they happen.
+        
+        Emits "phase" events when generation or reflection starts and completes,
+        "token" events for every LLM chunk, a "reflection" event with each verdict,
+        an "iteration" event when an iteration finishes, and a closing "final" event
+        carrying the same payload as arun (or an "error" event on failure).
+        A leading "run" event carries the run id. With a coalescer, a query
+        identical to one already streaming replays that run's events so far and
+        then follows it live, with "coalesced" set on its "run" event.
+        options overrides settings of this run as in run.
+        """
+        profile = self.resolve_profile(options)
+        timeout_seconds = (options or {}).get("timeout_seconds")
+        history = self._session_history(session_id)
+        cached = self._cache_lookup(query, profile) if not history else None
+        if cached is not None:
+            yield {"event": "final", **(await self._aremember(session_id, query, cached))}
+            return
+        
+        if self._coalescing(run_id, history, timeout_seconds):
+            events, shared = self.coalescer.subscribe(
+                self.cache_key(query, profile), lambda: self._astream_run(query, None, history, profile, timeout_seconds)
+            )
+        else:
+            events, shared = self._astream_run(query, run_id, history, profile, timeout_seconds), False
+        
+        async for event in events:
+            if event["event"] == "run":
+                event = self._shared(event, shared)
+            elif event["event"] == "final":
+                event = await self._aremember(session_id, query, self._shared(event, shared))
+            yield event
+    
+    async def _astream_run(self, query: str, run_id: Optional[str], history: Sequence[BaseMessage],
+                           profile: RunProfile, timeout_seconds: Optional[float] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Events of running or resuming the graph for one query, caching a fresh result"""
+        run_id = self._reserve_run(run_id)
+        try:
+            config = self._run_config(run_id, profile, timeout_seconds)
+            snapshot = await self.graph.aget_state(config) if self.checkpointer is not None else None
+            restored = self._resume_point(snapshot, query, run_id)
+            state = restored or self._initial_state(query, history, profile)
+            final_state = state
+            iteration = last_completed = state.get("iteration_count", 0)
+            
+            if self.verbose:
+                logger.info(f"User query (streaming): {query}")
+            
+            yield {"event": "run", "run_id": run_id, "resumed": restored is not None, "iteration": iteration}
+            if restored is not None and not snapshot.next:
+                yield {"event": "final", **self._with_run_id(self._build_result(restored), run_id)}
+                return
+            
+            try:
+                async for mode, chunk in self.graph.astream(
+                    None if restored is not None else state, config,
+                    stream_mode=["custom", "messages", "updates", "values"]
+                ):
+                    if mode == "custom":
+                        iteration = chunk.get("iteration", iteration)
+                        yield chunk
+                    elif mode == "messages":
+                        message_chunk, metadata = chunk
+                        # Only LLM output chunks are tokens; node outputs are reported via "updates".
+                        # Speculative drafts interleave, so they are reported as whole candidates instead.
+                        if (isinstance(message_chunk, AIMessageChunk) and message_chunk.content
+                                and metadata.get("langgraph_node") != "draft"):
+                            yield {
+                                "event": "token",
+                                "phase": metadata.get("langgraph_node"),
+                                "iteration": iteration,
+                                "content": message_chunk.content
+                            }
+                    elif mode == "updates":
+                        for node, update in chunk.items():
+                            if node in ("generate", "refine"):
+                                yield {"event": "phase", "phase": "generate", "status": "completed", "iteration": iteration}
+                            elif node == "draft":
+                                for candidate in (update or {}).get("candidates", []):
+                                    yield {"event": "candidate", "iteration": 1, **candidate}
+                            elif node in ("reflect", "judge"):
+                                yield {
+                                    "event": "reflection",
+                                    "iteration": iteration,
+                                    "needs_improvement": update.get("needs_improvement", False),
+                                    "score": (update.get("verdict") or {}).get("score")
+                                }
+                                yield {"event": "iteration", "iteration": iteration, "status": "done"}
+                                last_completed = iteration
+                    else:
+                        final_state = chunk
+            except Exception as e:
+                logger.error(f"Error streaming reflection agent: {str(e)}")
+                RUNS.inc(stop_reason="error")
+                event = {"event": "error", "detail": str(e), "iterations": final_state.get("iteration_count", 0)}
+                if isinstance(e, (CircuitOpenError, AdmissionRejected)):
+                    event["retry_after"] = e.retry_after
+                    event["error_type"] = "rate_limited" if isinstance(e, AdmissionRejected) else "circuit_open"
+                elif isinstance(e, DeadlineExceeded):
+                    event["error_type"] = "deadline"
+                yield self._with_run_id(event, run_id)
+                return
+        finally:
+            self._active_runs.discard(run_id)
+        
+        if last_completed < iteration:
+            yield {"event": "iteration", "iteration": iteration, "status": "done"}
+        
+        result = self._record_run(self._build_result(final_state))
+        if not history:
+            self._cache_store(query, result, profile)
+        yield {"event": "final", **self._with_run_id(result, run_id)}
@@ -0,0 +1,172 @@
+"""
+Model routing tier: a cheap model writes first drafts, the main model only what needs it.
+
+The router picks the generation model for every generate step. First drafts
+go to the draft model unless the local difficulty classifier (see
+src.core.gate.classify_query) puts the query in an escalated class; once a
+reflection asks for improvement, every later draft of the run uses the main
+model. Each decision is recorded with an estimate of what it saved against
+running the main model throughout.
+"""
+import threading
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+from src.core.deadline import PhaseLatency
+from src.core.gate import classify_query
+from src.utils.metrics import MODEL_ROUTING_COST, MODEL_ROUTING_DECISIONS, MODEL_ROUTING_SECONDS
+
+# Why a generate step used the model it did
+ROUTE_FIRST_DRAFT = "first_draft"
+ROUTE_DIFFICULT_QUERY = "difficult_query"
+ROUTE_NEEDS_IMPROVEMENT = "needs_improvement"
+
+def parse_model_prices(value: str) -> Dict[str, Tuple[float, float]]:
+    """
+    Parse "model=input:output,..." prices per million tokens into a dict.
+
+    Args:
+        value: e.g. "gemini-2.0-flash-lite=0.075:0.3,gemini-2.0-flash=0.1:0.4"
+
+    Returns:
+        Dict mapping model name to (input price, output price)
+    """
+    prices = {}
+    for entry in value.split(","):
+        if not entry.strip():
+            continue
+        name, _, price = entry.partition("=")
+        prompt_price, _, completion_price = price.partition(":")
+        prices[name.strip()] = (float(prompt_price), float(completion_price or prompt_price))
+    return prices
+
+class ModelRouter:
+    """
+    Choose the generation model of each iteration and account for what routing saved.
+
+    Args:
+        draft_model: Fast, cheap model for first drafts
+        main_model: Stronger model used on escalation
+        escalate_classes: Query classes ("simple", "moderate", "complex") whose first draft
+            goes straight to the main model
+        prices: Per-model (input, output) price per million tokens, for cost savings
+    """
+
+    def __init__(self, draft_model: str, main_model: str, escalate_classes: Iterable[str] = ("complex",),
+                 prices: Optional[Dict[str, Tuple[float, float]]] = None):
+        self.draft_model = draft_model
+        self.main_model = main_model
+        self.escalate_classes = tuple(escalate_classes)
+        self.prices = prices or {}
+        self._lock = threading.Lock()
+        # Smoothed generate latency per model, without a margin: savings compare means
+        self._latency = PhaseLatency(margin=0.0)
+        self._decisions: Dict[str, int] = {}
+        self._saved_seconds = 0.0
+        self._saved_cost = 0.0
+
+    def route(self, query: str, iteration_count: int, needs_improvement: bool = False,
+              previous_model: Optional[str] = None) -> Tuple[str, str]:
+        """
+        Pick the model for a generate step.
+
+        Args:
+            query: The run's user query
+            iteration_count: Number of the step about to run, from 1
+            needs_improvement: Verdict of the latest reflection
+            previous_model: Model of the run's previous step, if any
+
+        Returns:
+            (model, reason)
+        """
+        if iteration_count <= 1:
+            if classify_query(query) in self.escalate_classes:
+                return self.main_model, ROUTE_DIFFICULT_QUERY
+            return self.draft_model, ROUTE_FIRST_DRAFT
+        if needs_improvement or previous_model == self.main_model:
+            return self.main_model, ROUTE_NEEDS_IMPROVEMENT
+        return previous_model or self.draft_model, ROUTE_FIRST_DRAFT
+
+    def cost(self, model: str, usage: Optional[Dict[str, int]]) -> Optional[float]:
+        """Price of a call from its token usage, or None when the model has no price"""
+        if not usage or model not in self.prices:
+            return None
+        prompt_price, completion_price = self.prices[model]
+        return (usage.get("input_tokens", 0) * prompt_price + usage.get("output_tokens", 0) * completion_price) / 1e6
+
+    def record(self, iteration_count: int, model: str, reason: str, seconds: float,
+               usage: Optional[Dict[str, int]] = None, candidate: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Account for a finished generate step and describe it for the run's routing log.
+
+        Savings compare the step with the same call on the main model: its smoothed
+        latency and its price for the same tokens. They are None until the main
+        model has been observed, or when either model has no price.
+        """
+        saved_seconds = saved_cost = None
+        cost = self.cost(model, usage)
+        main_cost = cost if model == self.main_model else self.cost(self.main_model, usage)
+        self._latency.record("generate", model, seconds)
+        # A main-model step is its own baseline and saves nothing
+        baseline = self._latency.estimate("generate", self.main_model) if model != self.main_model else seconds
+        with self._lock:
+            if baseline is not None:
+                saved_seconds = baseline - seconds
+            if main_cost is not None and cost is not None:
+                saved_cost = main_cost - cost
+            self._decisions[reason] = self._decisions.get(reason, 0) + 1
+            self._saved_seconds += saved_seconds or 0.0
+            self._saved_cost += saved_cost or 0.0
+
+        MODEL_ROUTING_DECISIONS.inc(model=model, reason=reason)
+        if baseline is not None:
+            MODEL_ROUTING_SECONDS.inc(seconds, kind="actual")
+            MODEL_ROUTING_SECONDS.inc(baseline, kind="baseline")
+        if saved_cost is not None:
+            MODEL_ROUTING_COST.inc(cost, kind="actual")
+            MODEL_ROUTING_COST.inc(main_cost, kind="baseline")
+
+        entry = {
+            "iteration": iteration_count,
+            "model": model,
+            "reason": reason,
+            "seconds": round(seconds, 4),
+            "saved_seconds": round(saved_seconds, 4) if saved_seconds is not None else None,
+            "saved_cost": saved_cost
+        }
+        if candidate is not None:
+            entry["candidate"] = candidate
+        return entry
+
+    def describe(self) -> dict:
+        """Settings that influence results, used in cache keys and health output."""
+        return {
+            "draft_model": self.draft_model,
+            "main_model": self.main_model,
+            "escalate_classes": list(self.escalate_classes)
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            steps = sum(self._decisions.values())
+            escalated = steps - self._decisions.get(ROUTE_FIRST_DRAFT, 0)
+            return {
+                **self.describe(),
+                "decisions": dict(self._decisions),
+                "escalation_rate": round(escalated / steps, 4) if steps else 0.0,
+                "average_seconds": {key.partition("/")[2]: entry["mean"] for key, entry in self._latency.stats().items()},
+                "saved_seconds": round(self._saved_seconds, 3),
+                "saved_cost": round(self._saved_cost, 6)
+            }
+
+def summarize_routing(decisions) -> Optional[Dict[str, Any]]:
+    """Per-run routing summary for results: every decision and the savings they add up to"""
+    if not decisions:
+        return None
+    saved_seconds = [d["saved_seconds"] for d in decisions if d.get("saved_seconds") is not None]
+    saved_cost = [d["saved_cost"] for d in decisions if d.get("saved_cost") is not None]
+    return {
+        "decisions": list(decisions),
+        "escalated": any(d["reason"] != ROUTE_FIRST_DRAFT for d in decisions),
+        "saved_seconds": round(sum(saved_seconds), 4) if saved_seconds else None,
+        "saved_cost": sum(saved_cost) if saved_cost else None
+    }
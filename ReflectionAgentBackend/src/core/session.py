@@ -0,0 +1,250 @@
+"""
+Server-side conversation sessions for multi-turn queries.
+
+A session keeps only what a follow-up needs: the final answers of earlier
+turns, never their drafts or FEEDBACK critiques. Recent turns are replayed
+verbatim while they fit a token budget; older turns are folded into a
+rolling summary of bounded size, so the prompt and the memory held per
+session stay bounded however long the conversation runs.
+"""
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.messages import AIMessage, BaseMessage, HumanMessage, SystemMessage
+
+from src.utils.utils import estimate_tokens, logger
+
+SUMMARY_PREFIX = "SUMMARY OF EARLIER CONVERSATION:"
+
+SUMMARY_PROMPT = (
+    "Update the running summary of a conversation between a user and an assistant. "
+    "Keep facts, decisions and open questions the user may refer back to; drop pleasantries. "
+    "Answer with the updated summary only, in at most {words} words."
+)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+def _first_sentence(text: str, max_chars: int = 200) -> str:
+    sentence = _SENTENCE_RE.split(" ".join(str(text).split()), maxsplit=1)[0]
+    return sentence if len(sentence) <= max_chars else sentence[:max_chars - 3] + "..."
+
+def extractive_summary(summary: str, turns: List[Tuple[str, str]], max_tokens: int) -> str:
+    """
+    Fold turns into a summary without a model call.
+
+    Each turn becomes one line with the first sentence of the question and of
+    the answer; the oldest lines are dropped once the summary exceeds max_tokens.
+
+    Args:
+        summary: Current summary, possibly empty
+        turns: (query, answer) pairs leaving the verbatim window, oldest first
+        max_tokens: Approximate size limit of the summary
+
+    Returns:
+        Updated summary
+    """
+    lines = [line for line in summary.splitlines() if line]
+    lines += [f"- Q: {_first_sentence(query)} A: {_first_sentence(answer)}" for query, answer in turns]
+    while len(lines) > 1 and sum(len(line) // 4 + 1 for line in lines) > max_tokens:
+        lines.pop(0)
+    return "\n".join(lines)
+
+class Session:
+    """Turns and summary of one conversation."""
+
+    def __init__(self):
+        self.turns: List[Tuple[str, str]] = []
+        self.summary = ""
+        self.last_used = time.monotonic()
+        # Turns folded into the summary so far, and turns out of the window still waiting to be
+        self.summarized_turns = 0
+        self.pending: List[Tuple[str, str]] = []
+        # Whether a caller is folding pending turns; only one does at a time, so no fold overwrites another
+        self.folding = False
+
+class SessionStore:
+    """
+    Process-local store of conversation sessions, evicting the least recently used.
+
+    Sessions idle for longer than idle_seconds are dropped lazily, and at most
+    max_sessions are kept. With a summary_llm the rolling summary is written by
+    that model; otherwise turns are summarized extractively.
+    """
+
+    def __init__(self, max_sessions: int = 1000, idle_seconds: Optional[float] = 3600,
+                 history_tokens: int = 1500, summary_tokens: int = 300, summary_llm=None):
+        self.max_sessions = max_sessions
+        self.idle_seconds = idle_seconds or None
+        self.history_tokens = history_tokens
+        self.summary_tokens = summary_tokens
+        self.summary_llm = summary_llm
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._evictions = 0
+        self._summaries = 0
+
+    def _get(self, session_id: str, create: bool = False) -> Optional[Session]:
+        """Look up a session under the lock, dropping it if it has been idle too long"""
+        session = self._sessions.get(session_id)
+        now = time.monotonic()
+        if session is not None and self.idle_seconds is not None and now - session.last_used > self.idle_seconds:
+            del self._sessions[session_id]
+            self._evictions += 1
+            session = None
+        if session is None:
+            if not create:
+                return None
+            session = self._sessions[session_id] = Session()
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+                self._evictions += 1
+        session.last_used = now
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def history(self, session_id: Optional[str]) -> List[BaseMessage]:
+        """
+        Messages to place between the system prompt and a new query of this session.
+
+        Returns:
+            The rolling summary (if any) followed by the recent turns as
+            human/AI pairs; empty for a new or unknown session
+        """
+        if not session_id:
+            return []
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return []
+            summary, turns = session.summary, list(session.turns)
+
+        messages: List[BaseMessage] = []
+        if summary:
+            messages.append(SystemMessage(content=f"{SUMMARY_PREFIX}\n{summary}"))
+        for query, answer in turns:
+            messages.extend([HumanMessage(content=query), AIMessage(content=answer)])
+        return messages
+
+    def _append(self, session_id: str, query: str, answer: str) -> Optional[Session]:
+        """
+        Add a turn and move the oldest turns out of the window until it fits the token budget.
+
+        Returns:
+            The session if the caller is to fold its pending turns into the summary; None if
+            nothing is pending or another caller is already folding and will take them too
+        """
+        with self._lock:
+            session = self._get(session_id, create=True)
+            session.turns.append((query, answer))
+            while len(session.turns) > 1 and self._window_tokens(session.turns) > self.history_tokens:
+                session.pending.append(session.turns.pop(0))
+            if not session.pending or session.folding:
+                return None
+            session.folding = True
+            return session
+
+    @staticmethod
+    def _window_tokens(turns: List[Tuple[str, str]]) -> int:
+        return sum(estimate_tokens([HumanMessage(content=query), AIMessage(content=answer)]) for query, answer in turns)
+
+    def _summary_request(self, summary: str, overflow: List[Tuple[str, str]]) -> List[BaseMessage]:
+        transcript = "\n\n".join(f"USER: {query}\nASSISTANT: {answer}" for query, answer in overflow)
+        return [
+            SystemMessage(content=SUMMARY_PROMPT.format(words=max(20, self.summary_tokens * 3 // 4))),
+            HumanMessage(content=f"CURRENT SUMMARY:\n{summary or '(empty)'}\n\nNEW TURNS:\n{transcript}")
+        ]
+
+    def _next_fold(self, session: Session) -> Tuple[List[Tuple[str, str]], str]:
+        """Take the session's pending turns and its summary, ending the fold when none are left"""
+        with self._lock:
+            overflow, session.pending = session.pending, []
+            if not overflow:
+                session.folding = False
+            return overflow, session.summary
+
+    def _end_fold(self, session: Session) -> None:
+        with self._lock:
+            session.folding = False
+
+    def _store_summary(self, session: Session, summary: Optional[str], base: str,
+                       overflow: List[Tuple[str, str]]) -> None:
+        if summary is None:
+            summary = extractive_summary(base, overflow, self.summary_tokens)
+        with self._lock:
+            # A model-written summary may overrun its word limit; the bound on memory is hard
+            session.summary = summary[:self.summary_tokens * 4]
+            session.summarized_turns += len(overflow)
+            self._summaries += 1
+
+    def record(self, session_id: Optional[str], query: str, answer: str) -> None:
+        """Add a finished turn to the session, folding turns that leave the window into the summary"""
+        if not session_id:
+            return
+        session = self._append(session_id, query, answer)
+        if session is None:
+            return
+        try:
+            # Turns that leave the window while this fold runs are folded by its next pass
+            while True:
+                overflow, summary = self._next_fold(session)
+                if not overflow:
+                    return
+                updated = None
+                if self.summary_llm is not None:
+                    try:
+                        updated = str(self.summary_llm.invoke(self._summary_request(summary, overflow)).content)
+                    except Exception as e:
+                        logger.warning(f"Session summary failed, falling back to extractive summary: {str(e)}")
+                self._store_summary(session, updated, summary, overflow)
+        except BaseException:
+            self._end_fold(session)
+            raise
+
+    async def arecord(self, session_id: Optional[str], query: str, answer: str) -> None:
+        """Add a finished turn without blocking the event loop on a model-written summary"""
+        if not session_id:
+            return
+        session = self._append(session_id, query, answer)
+        if session is None:
+            return
+        try:
+            # Turns that leave the window while this fold runs are folded by its next pass
+            while True:
+                overflow, summary = self._next_fold(session)
+                if not overflow:
+                    return
+                updated = None
+                if self.summary_llm is not None:
+                    try:
+                        updated = str((await self.summary_llm.ainvoke(self._summary_request(summary, overflow))).content)
+                    except Exception as e:
+                        logger.warning(f"Session summary failed, falling back to extractive summary: {str(e)}")
+                self._store_summary(session, updated, summary, overflow)
+        except BaseException:
+            self._end_fold(session)
+            raise
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Summary and recent turns of a session, or None if it does not exist"""
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return None
+            return {
+                "session_id": session_id,
+                "summary": session.summary,
+                "summarized_turns": session.summarized_turns,
+                "turns": [{"query": query, "response": answer} for query, answer in session.turns]
+            }
+
+    def delete(self, session_id: str) -> bool:
+        """Forget a session; returns whether it existed"""
+        with self._lock:
+            return self._sessions.pop(session_id, None) is not None
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {"sessions": len(self._sessions), "evictions": self._evictions, "summaries": self._summaries}
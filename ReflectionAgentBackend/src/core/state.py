@@ -0,0 +1,43 @@
+"""
+Graph state definition for the Reflection Agent.
+"""
+import operator
+from typing import Annotated, Any, Dict, List, Optional
+from typing_extensions import TypedDict
+from langchain_core.messages import BaseMessage
+from langgraph.graph.message import add_messages
+
+class ReflectionState(TypedDict):
+    """
+    Per-run state carried through the reflection graph.
+    
+    Keeping run bookkeeping here instead of on the agent lets a single compiled
+    graph serve many concurrent runs without them sharing counters or flags.
+    
+    Attributes:
+        messages: Conversation so far (merged by message id)
+        query: The user query this run answers
+        iteration_count: Number of generation steps completed in this run
+        needs_improvement: Verdict of the most recent reflection
+        reflection_skipped: Whether the reflection gate accepted the first draft as is
+        prompt_tokens: Prompt tokens sent to the main model, one entry per generate step
+        scores: Reflection score of each reflected draft (None when no score was given)
+        best_draft: Highest-scored draft so far as {"content", "score", "iteration"}, returned on
+            diminishing-returns stops so a score drop never costs the better answer
+        verdict: The most recent reflection verdict as a dict, if one could be parsed
+        stop_reason: Why the loop ended (see src.core.convergence), set by the node that decided it
+        candidates: Drafts produced in parallel by the speculative topology, before judging
+        routing: One entry per generate step with the model routed to, why, and the estimated savings
+    """
+    messages: Annotated[List[BaseMessage], add_messages]
+    query: str
+    iteration_count: int
+    needs_improvement: bool
+    reflection_skipped: bool
+    prompt_tokens: Annotated[List[int], operator.add]
+    scores: Annotated[List[Optional[float]], operator.add]
+    best_draft: Optional[Dict[str, Any]]
+    verdict: Optional[Dict[str, Any]]
+    stop_reason: Optional[str]
+    candidates: Annotated[List[Dict[str, Any]], operator.add]
+    routing: Annotated[List[Dict[str, Any]], operator.add]
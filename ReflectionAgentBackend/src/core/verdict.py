@@ -0,0 +1,179 @@
+"""
+Typed reflection verdicts and tolerant parsing of free-text reflections.
+"""
+import re
+import threading
+from typing import Dict, List, Optional
+
+from pydantic import BaseModel, Field
+
+SECTION_NAMES = ("REFLECTION", "STRENGTHS", "WEAKNESSES", "SUGGESTIONS", "SCORE", "NEEDS IMPROVEMENT")
+
+# Matches section headings such as "WEAKNESSES:", "3. Weaknesses:", "**Weaknesses**:" or "NEEDS_IMPROVEMENT:"
+_SECTION_RE = re.compile(
+    r"^[ \t>]*(?:\d+[.)][ \t]*)?[*_#]*[ \t]*("
+    + "|".join(name.replace(" ", r"[ _]?") for name in SECTION_NAMES)
+    + r")[ \t]*[*_]*[ \t]*:[*_]*",
+    re.IGNORECASE | re.MULTILINE,
+)
+_BULLET_RE = re.compile(r"^\s*(?:[-*•]|\d+[.)])\s*")
+_CANDIDATE_RE = re.compile(r"^[ \t>*_#]*CANDIDATE(?:[ \t]+RESPONSE)?[ \t]*#?(\d+)[ \t*_]*:?[*_]*[ \t]*$",
+                           re.IGNORECASE | re.MULTILINE)
+_SCORE_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:/\s*(\d+))?")
+
+# Verdicts without an explicit yes/no are decided by score against this pass mark (out of 10)
+PASSING_SCORE = 7.0
+
+class ReflectionVerdict(BaseModel):
+    """Structured outcome of reflecting on one AI response."""
+    
+    reflection: str = Field(default="", description="Overall analysis of the response's strengths and weaknesses")
+    score: Optional[float] = Field(default=None, ge=0, le=10, description="Quality of the response from 0 (useless) to 10 (excellent)")
+    strengths: List[str] = Field(default_factory=list, description="Specific aspects of the response that were effective")
+    weaknesses: List[str] = Field(default_factory=list, description="Areas where the response could be improved")
+    suggestions: List[str] = Field(default_factory=list, description="Specific recommendations to enhance the response")
+    needs_improvement: bool = Field(description="True if the response requires significant improvement")
+    
+    def to_feedback(self) -> str:
+        """Render the verdict in the sectioned text format used for FEEDBACK messages."""
+        def bullets(items: List[str]) -> str:
+            return "\n".join(f"- {item}" for item in items) or "- None"
+        
+        parts = [f"REFLECTION: {self.reflection}"]
+        parts.append(f"STRENGTHS:\n{bullets(self.strengths)}")
+        parts.append(f"WEAKNESSES:\n{bullets(self.weaknesses)}")
+        parts.append(f"SUGGESTIONS:\n{bullets(self.suggestions)}")
+        if self.score is not None:
+            parts.append(f"SCORE: {self.score:g}/10")
+        parts.append(f"NEEDS IMPROVEMENT: {'yes' if self.needs_improvement else 'no'}")
+        return "\n".join(parts)
+
+class CandidateVerdicts(BaseModel):
+    """Structured outcome of judging several candidate responses in one reflection call."""
+    
+    verdicts: List[ReflectionVerdict] = Field(description="One verdict per candidate, in the order the candidates were given")
+
+class ParseStats:
+    """Counters for how reflection outputs were turned into verdicts."""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        # Schema-constrained outputs that validated directly
+        self.structured = 0
+        # Verdicts recovered from free text by parse_reflection
+        self.text = 0
+        # Outputs from which no verdict could be recovered
+        self.failures = 0
+    
+    def record(self, field: str):
+        with self._lock:
+            setattr(self, field, getattr(self, field) + 1)
+    
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"structured": self.structured, "text": self.text, "failures": self.failures}
+
+# Process-wide counters, reported on the health endpoint
+parse_stats = ParseStats()
+
+def extract_sections(text: str) -> Dict[str, str]:
+    """
+    Split a reflection into its named sections.
+    
+    Args:
+        text: Raw reflection text
+    
+    Returns:
+        Dict mapping upper-case section name (e.g. "NEEDS IMPROVEMENT") to its stripped body;
+        missing sections are absent
+    """
+    matches = list(_SECTION_RE.finditer(text))
+    sections = {}
+    for i, match in enumerate(matches):
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        name = re.sub(r"[ _]+", " ", match.group(1)).upper()
+        if name == "NEEDSIMPROVEMENT":
+            name = "NEEDS IMPROVEMENT"
+        sections[name] = text[match.end():end].strip()
+    return sections
+
+def _parse_list(body: str) -> List[str]:
+    items = [_BULLET_RE.sub("", line).strip(" *_") for line in body.splitlines()]
+    return [item for item in items if item and item.lower() != "none"]
+
+def _parse_yes_no(body: str) -> Optional[bool]:
+    words = re.findall(r"[a-z]+", body.lower())
+    if not words:
+        return None
+    if words[0] in ("yes", "true", "y"):
+        return True
+    if words[0] in ("no", "false", "n"):
+        return False
+    return None
+
+def _parse_score(body: str) -> Optional[float]:
+    match = _SCORE_RE.search(body)
+    if not match:
+        return None
+    value = float(match.group(1))
+    scale = float(match.group(2)) if match.group(2) else 10.0
+    if scale <= 0:
+        return None
+    return max(0.0, min(10.0, value * 10.0 / scale))
+
+def parse_reflection(text: str) -> Optional[ReflectionVerdict]:
+    """
+    Parse a free-text reflection into a verdict, tolerating formatting drift.
+    
+    Headings may be numbered, bolded, mixed-case or missing their trailing
+    space. When the NEEDS IMPROVEMENT answer cannot be read, a SCORE below
+    PASSING_SCORE is taken to mean improvement is needed.
+    
+    Args:
+        text: Raw reflection text
+    
+    Returns:
+        The verdict, or None if neither a yes/no answer nor a score was found
+    """
+    sections = extract_sections(text)
+    needs_improvement = _parse_yes_no(sections.get("NEEDS IMPROVEMENT", ""))
+    score = _parse_score(sections["SCORE"]) if "SCORE" in sections else None
+    
+    if needs_improvement is None:
+        if score is None:
+            return None
+        needs_improvement = score < PASSING_SCORE
+    
+    return ReflectionVerdict(
+        reflection=sections.get("REFLECTION", ""),
+        score=score,
+        strengths=_parse_list(sections.get("STRENGTHS", "")),
+        weaknesses=_parse_list(sections.get("WEAKNESSES", "")),
+        suggestions=_parse_list(sections.get("SUGGESTIONS", "")),
+        needs_improvement=needs_improvement
+    )
+
+def parse_candidate_reflections(text: str, count: int) -> List[Optional[ReflectionVerdict]]:
+    """
+    Parse a reflection that judged several candidates, one "CANDIDATE <n>:" block each.
+    
+    Args:
+        text: Raw reflection text
+        count: Number of candidates that were judged
+    
+    Returns:
+        One verdict per candidate in order, None where a block is missing or unparseable;
+        an unmarked reflection of a single candidate is parsed as that candidate's verdict
+    """
+    verdicts: List[Optional[ReflectionVerdict]] = [None] * count
+    matches = list(_CANDIDATE_RE.finditer(text))
+    if not matches:
+        if count == 1:
+            verdicts[0] = parse_reflection(text)
+        return verdicts
+    for i, match in enumerate(matches):
+        index = int(match.group(1)) - 1
+        end = matches[i + 1].start() if i + 1 < len(matches) else len(text)
+        if 0 <= index < count and verdicts[index] is None:
+            verdicts[index] = parse_reflection(text[match.end():end])
+    return verdicts
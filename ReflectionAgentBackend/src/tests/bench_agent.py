@@ -0,0 +1,191 @@
+"""
+Load test and benchmark of the reflection agent and the /api/query endpoint.
+
+Drives ReflectionPatternAgent.arun and the FastAPI app (in process, through
+httpx's ASGI transport) with the offline fake LLM at rising concurrency, and
+reports latency percentiles, throughput and per-iteration overhead.
+
+Run from the ReflectionAgentBackend directory:
+    python -m src.tests.bench_agent --concurrency 1,8,32,128 --output bench.json
+    python -m src.tests.bench_agent --compare bench.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List
+
+def _percentile(samples: List[float], pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def _git_revision() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True, stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        return "unknown"
+
+async def _drive(call: Callable[[str], Awaitable[Dict[str, Any]]], concurrency: int, requests: int) -> Dict[str, Any]:
+    """Issue requests through call with at most concurrency in flight; collect timings."""
+    latencies: List[float] = []
+    iterations: List[int] = []
+    errors = 0
+    counter = iter(range(requests))
+    
+    async def worker():
+        nonlocal errors
+        for i in counter:
+            start = time.perf_counter()
+            try:
+                result = await call(f"benchmark query {i} at concurrency {concurrency}")
+            except Exception:
+                errors += 1
+                continue
+            latencies.append(time.perf_counter() - start)
+            if "error" in result:
+                errors += 1
+            iterations.append(result.get("iterations", 0))
+    
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+    
+    return {"latencies": latencies, "iterations": iterations, "errors": errors, "elapsed": elapsed}
+
+def _summarize(target: str, concurrency: int, requests: int, raw: Dict[str, Any], model_time_per_iteration: float) -> Dict[str, Any]:
+    latencies = raw["latencies"] or [0.0]
+    mean_iterations = statistics.mean(raw["iterations"]) if raw["iterations"] else 0.0
+    per_iteration = statistics.mean(latencies) / mean_iterations if mean_iterations else 0.0
+    return {
+        "target": target,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": raw["errors"],
+        "p50_ms": _percentile(latencies, 50) * 1000,
+        "p95_ms": _percentile(latencies, 95) * 1000,
+        "p99_ms": _percentile(latencies, 99) * 1000,
+        "requests_per_second": len(raw["latencies"]) / raw["elapsed"] if raw["elapsed"] else 0.0,
+        "mean_iterations": mean_iterations,
+        # Wall time per iteration beyond the simulated model latency
+        "overhead_per_iteration_ms": max(0.0, per_iteration - model_time_per_iteration) * 1000
+    }
+
+async def run_benchmark(targets: List[str], levels: List[int], requests_per_level: int, latency: float) -> List[Dict[str, Any]]:
+    """Run every target at every concurrency level and return one summary row per combination."""
+    # Imported here so the fake backend settings above take effect first
+    from src.core.reflection_agent import ReflectionPatternAgent
+    from src.config.settings import GRAPH_TOPOLOGY, SPECULATIVE_TEMPERATURES
+    import httpx
+    
+    rows = []
+    # Each iteration is one generation and usually one reflection call
+    model_time_per_iteration = 2 * latency
+    
+    if "agent" in targets:
+        agent = ReflectionPatternAgent(google_api_key="", max_iterations=3, topology=GRAPH_TOPOLOGY,
+                                       draft_temperatures=SPECULATIVE_TEMPERATURES)
+        for level in levels:
+            raw = await _drive(agent.arun, level, max(requests_per_level, level))
+            rows.append(_summarize("agent", level, max(requests_per_level, level), raw, model_time_per_iteration))
+            print(_format_row(rows[-1]))
+    
+    if "api" in targets:
+        from src.api.app import app, load_agent
+        # ASGITransport does not run the lifespan, so build the agent up front
+        api_agent = await load_agent()
+        api_agent.cache = None
+        api_agent.semantic_cache = None
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            async def call(query: str) -> Dict[str, Any]:
+                response = await client.post("/api/query", json={"query": query})
+                response.raise_for_status()
+                return response.json()
+            
+            for level in levels:
+                raw = await _drive(call, level, max(requests_per_level, level))
+                rows.append(_summarize("api", level, max(requests_per_level, level), raw, model_time_per_iteration))
+                print(_format_row(rows[-1]))
+    
+    return rows
+
+def _format_row(row: Dict[str, Any]) -> str:
+    return (
+        f"{row['target']:>6} c={row['concurrency']:<4} n={row['requests']:<5} "
+        f"p50={row['p50_ms']:8.1f}ms p95={row['p95_ms']:8.1f}ms p99={row['p99_ms']:8.1f}ms "
+        f"rps={row['requests_per_second']:8.1f} iters={row['mean_iterations']:.2f} "
+        f"overhead/iter={row['overhead_per_iteration_ms']:6.2f}ms errors={row['errors']}"
+    )
+
+def _compare(current: List[Dict[str, Any]], baseline_path: str) -> None:
+    """Print the relative change of each metric against a previous results file."""
+    with open(baseline_path) as f:
+        baseline = {(r["target"], r["concurrency"]): r for r in json.load(f)["results"]}
+    
+    print(f"\nComparison against {baseline_path}:")
+    for row in current:
+        previous = baseline.get((row["target"], row["concurrency"]))
+        if previous is None:
+            continue
+        changes = []
+        for metric in ("p50_ms", "p99_ms", "requests_per_second", "overhead_per_iteration_ms"):
+            if previous[metric]:
+                changes.append(f"{metric} {100.0 * (row[metric] - previous[metric]) / previous[metric]:+.1f}%")
+        print(f"{row['target']:>6} c={row['concurrency']:<4} " + "  ".join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--target", choices=["agent", "api", "both"], default="both")
+    parser.add_argument("--concurrency", default="1,8,32,128", help="Comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=64, help="Requests per concurrency level (at least the level)")
+    parser.add_argument("--latency", type=float, default=0.05, help="Simulated seconds per model call")
+    parser.add_argument("--latency-distribution", default="constant", choices=["constant", "uniform", "lognormal"])
+    parser.add_argument("--verdicts", default="yes,yes,no", help="Scripted reflection verdicts, cycled per call")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Probability of an injected model failure")
+    parser.add_argument("--topology", default="sequential", choices=["sequential", "speculative"],
+                        help="Graph topology of the agent under test")
+    parser.add_argument("--output", help="Write results as JSON to this file")
+    parser.add_argument("--compare", help="Compare against a previous JSON results file")
+    args = parser.parse_args()
+    
+    # Configure the fake backend before any src module reads the settings
+    os.environ.update({
+        "LLM_BACKEND": "fake",
+        "FAKE_LLM_LATENCY": str(args.latency),
+        "FAKE_LLM_LATENCY_DISTRIBUTION": args.latency_distribution,
+        "FAKE_LLM_VERDICTS": args.verdicts,
+        "FAKE_LLM_FAILURE_RATE": str(args.failure_rate),
+        "GRAPH_TOPOLOGY": args.topology,
+        "CACHE_BACKEND": "none",
+        "VERBOSE": "false",
+    })
+    import logging
+    logging.disable(logging.INFO)
+    
+    targets = ["agent", "api"] if args.target == "both" else [args.target]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    rows = asyncio.run(run_benchmark(targets, levels, args.requests, args.latency))
+    
+    report = {
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "config": vars(args),
+        "results": rows
+    }
+    
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+    
+    if args.compare:
+        _compare(rows, args.compare)
+
+if __name__ == "__main__":
+    main()
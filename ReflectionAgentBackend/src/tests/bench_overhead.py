@@ -0,0 +1,107 @@
+"""
+Micro-benchmark of per-call overhead outside the network call.
+
+The fake model answers instantly, so the time of a reflection call is the
+work done around the model: templating, chain construction and parsing. Each
+case is compared with the bare model call. When the Gemini client library is
+installed, constructing clients and binding the structured-output schema are
+timed as well (no request is sent).
+
+Run from the ReflectionAgentBackend directory:
+    python -m src.tests.bench_overhead --calls 2000
+"""
+import argparse
+import json
+import statistics
+import time
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.core.reflect import build_reflection_chain, build_judge_runnable, evaluate_response
+from src.utils.fake_llm import FakeChatModel
+from src.utils.utils import get_default_system_prompts, with_temperature
+
+def _time_calls(fn, calls: int):
+    """Median and p95 wall time of fn() in microseconds, after a short warm-up"""
+    for _ in range(min(50, calls)):
+        fn()
+    samples = []
+    for _ in range(calls):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return statistics.median(samples) * 1e6, samples[min(len(samples) - 1, int(len(samples) * 0.95))] * 1e6
+
+def _gemini_cases(prompt: str):
+    """Client construction and schema binding cases, if the Gemini client is installed"""
+    try:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+    except ImportError:
+        return {}
+    from src.utils.clients import ClientPool
+
+    def new_client():
+        return ChatGoogleGenerativeAI(model="gemini-2.0-flash", google_api_key="benchmark", max_retries=0)
+
+    pool = ClientPool("benchmark")
+    pooled = pool.attach(new_client(), "gemini-2.0-flash")
+    return {
+        "gemini client: constructed per call": new_client,
+        "gemini client: copy sharing pooled connections": lambda: with_temperature(pooled, 0.3),
+        "structured reflection chain: compiled per call": lambda: build_reflection_chain(pooled, prompt, structured=True),
+        "structured judge: schema bound per call": lambda: build_judge_runnable(pooled, structured=True),
+    }
+
+def run_benchmark(calls: int):
+    """Time every case; returns one row per case with its overhead over the bare model call"""
+    prompt = get_default_system_prompts()["reflection"]
+    llm = FakeChatModel(model="bench", is_main=False, latency=0.0, verdicts=["no"])
+    messages = [
+        SystemMessage(content="You are a helpful assistant."),
+        HumanMessage(content="Explain how {braces} in a query are handled."),
+        AIMessage(content="Draft answer with a dict literal {'a': 1} and some more text. " * 20)
+    ]
+    chain = build_reflection_chain(llm, prompt)
+    request = [SystemMessage(content=prompt), HumanMessage(content="USER QUERY:\n...\n\nAI RESPONSE:\n...")]
+
+    cases = {
+        "model call only": lambda: llm.invoke(request),
+        "reflection: chain compiled per call": lambda: evaluate_response(messages, llm, prompt),
+        "reflection: chain compiled once": lambda: evaluate_response(messages, llm, prompt, chain=chain),
+    }
+    cases.update(_gemini_cases(prompt))
+
+    rows = []
+    baseline = None
+    for name, fn in cases.items():
+        p50, p95 = _time_calls(fn, calls)
+        if baseline is None:
+            baseline = p50
+        rows.append({
+            "case": name,
+            "p50_us": p50,
+            "p95_us": p95,
+            # Construction-only cases make no model call, so their whole time is overhead
+            "overhead_us": p50 - baseline if name.startswith(("model", "reflection")) else p50
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--calls", type=int, default=2000, help="Timed calls per case")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+
+    rows = run_benchmark(args.calls)
+
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+
+    print(f"{'case':<50} {'p50':>10} {'p95':>10} {'overhead':>10}")
+    for row in rows:
+        print(f"{row['case']:<50} {row['p50_us']:>8.1f}us {row['p95_us']:>8.1f}us {row['overhead_us']:>8.1f}us")
+
+if __name__ == "__main__":
+    main()
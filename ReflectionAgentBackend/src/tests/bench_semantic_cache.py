@@ -0,0 +1,208 @@
+"""
+Benchmark of semantic cache lookup latency versus index size, and of match quality.
+
+Quality is measured on hand-written pairs of a stored question and a probe:
+near-verbatim repeats and real paraphrases should hit the stored answer,
+near-miss questions (same words, different question) must not. A hit on any
+other stored answer is a false hit, since it serves a wrong answer.
+
+Run from the ReflectionAgentBackend directory:
+    python -m src.tests.bench_semantic_cache --sizes 100,1000,10000 --lookups 500
+"""
+import argparse
+import json
+import random
+import statistics
+import time
+
+from src.cache.semantic import HashingEmbedder, SemanticCache
+
+_WORDS = (
+    "how what why explain difference between python java rust memory cache latency "
+    "async thread process network database index query vector embedding model token "
+    "reflection agent graph stream batch retry limit budget deadline server client"
+).split()
+
+# Reworded questions with the same meaning
+PARAPHRASES = [
+    ("What is the difference between a process and a thread?", "How does a thread differ from a process?"),
+    ("How do I reverse a list in Python?", "What's the way to reverse a Python list?"),
+    ("Explain how HTTPS keeps data secure.", "How does HTTPS protect the data being sent?"),
+    ("What causes a memory leak in Java?", "Why do Java programs leak memory?"),
+    ("How can I speed up a slow SQL query?", "What are ways to make a slow SQL query faster?"),
+    ("What is a hash table?", "Can you explain what a hash table is?"),
+    ("How does garbage collection work in Go?", "Explain Go's garbage collector."),
+    ("What are the benefits of unit testing?", "Why should I write unit tests?"),
+    ("How do I merge two dictionaries in Python?", "What's the best way to combine two Python dicts?"),
+    ("What is the CAP theorem?", "Explain the CAP theorem to me."),
+    ("How does a load balancer work?", "What does a load balancer do and how?"),
+    ("What is dependency injection?", "Can you describe dependency injection?"),
+    ("How do I undo the last git commit?", "How can I revert my most recent commit in git?"),
+    ("Why is my React component rendering twice?", "What makes a React component render two times?"),
+    ("What is the time complexity of quicksort?", "How fast is quicksort in big-O terms?"),
+    ("How do vaccines train the immune system?", "In what way do vaccines teach the immune system?"),
+    ("What is the capital of Australia?", "Which city is Australia's capital?"),
+    ("How do I center a div in CSS?", "What's the way to center a div with CSS?"),
+    ("Explain the difference between TCP and UDP.", "How is UDP different from TCP?"),
+    ("What are Python decorators used for?", "What is the purpose of decorators in Python?"),
+]
+# Different questions that share most of their words with a stored one
+NEAR_MISSES = [
+    ("What is the difference between a process and a thread?", "What is the difference between a process and a program?"),
+    ("How do I reverse a list in Python?", "How do I sort a list in Python?"),
+    ("Explain how HTTPS keeps data secure.", "Explain how SSH keeps data secure."),
+    ("What causes a memory leak in Java?", "What causes a memory leak in JavaScript?"),
+    ("How can I speed up a slow SQL query?", "How can I speed up a slow Python script?"),
+    ("What is a hash table?", "What is a hash function?"),
+    ("How does garbage collection work in Go?", "How does garbage collection work in Java?"),
+    ("What are the benefits of unit testing?", "What are the drawbacks of unit testing?"),
+    ("How do I merge two dictionaries in Python?", "How do I compare two dictionaries in Python?"),
+    ("What is the CAP theorem?", "What is the PACELC theorem?"),
+    ("How does a load balancer work?", "How does a reverse proxy work?"),
+    ("What is dependency injection?", "What is SQL injection?"),
+    ("How do I undo the last git commit?", "How do I amend the last git commit?"),
+    ("Why is my React component rendering twice?", "Why is my React component not rendering?"),
+    ("What is the time complexity of quicksort?", "What is the space complexity of quicksort?"),
+    ("How do vaccines train the immune system?", "How do antibiotics affect the immune system?"),
+    ("What is the capital of Australia?", "What is the capital of Austria?"),
+    ("How do I center a div in CSS?", "How do I hide a div in CSS?"),
+    ("Explain the difference between TCP and UDP.", "Explain the difference between HTTP and HTTPS."),
+    ("What are Python decorators used for?", "What are Python generators used for?"),
+]
+# The same question with a typo, different punctuation or a filler word
+REPEATS = [
+    ("What is the difference between a process and a thread?", "what is the diference between a process and a thread"),
+    ("How do I reverse a list in Python?", "How do I reverse a list in python??"),
+    ("Explain how HTTPS keeps data secure.", "Please explain how HTTPS keeps data secure."),
+    ("What causes a memory leak in Java?", "what causes a memory leak in java"),
+    ("How can I speed up a slow SQL query?", "How can I speed up a slow SQL querry?"),
+    ("What is a hash table?", "what's a hash table?"),
+    ("How does garbage collection work in Go?", "How does garbage collection work in Go, exactly?"),
+    ("What are the benefits of unit testing?", "What are the benefits of unit-testing?"),
+    ("How do I merge two dictionaries in Python?", "How do I merge two dictionarys in Python?"),
+    ("What is the CAP theorem?", "What is the CAP theorem exactly?"),
+    ("How does a load balancer work?", "How does a loadbalancer work?"),
+    ("What is dependency injection?", "What is dependency injection??"),
+    ("How do I undo the last git commit?", "how do i undo the last git commit"),
+    ("Why is my React component rendering twice?", "Why is my React component rendering twice ?"),
+    ("What is the time complexity of quicksort?", "What's the time complexity of quicksort?"),
+    ("How do vaccines train the immune system?", "How do vaccines train the immune system"),
+    ("What is the capital of Australia?", "What is the capital city of Australia?"),
+    ("How do I center a div in CSS?", "How do I center a div in css"),
+    ("Explain the difference between TCP and UDP.", "Explain the difference between TCP and UDP please."),
+    ("What are Python decorators used for?", "What are python decorators used for"),
+]
+
+def _random_query(rng: random.Random) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(rng.randint(5, 14)))
+
+def _percentile(samples, pct: float) -> float:
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+def run_benchmark(sizes, lookups: int, dim: int, threshold: float, seed: int = 0):
+    """Fill a cache to each size and time lookups; returns one row per size."""
+    rng = random.Random(seed)
+    embedder = HashingEmbedder(dim)
+    rows = []
+    
+    for size in sizes:
+        cache = SemanticCache(embedder=embedder, threshold=threshold, max_entries=size)
+        stored = [_random_query(rng) for _ in range(size)]
+        for query in stored:
+            cache.store(query, {"response": query, "iterations": 1, "messages": []})
+        
+        # Half of the probes repeat stored queries, half are new; only latency is measured here
+        probes = [rng.choice(stored) if i % 2 else _random_query(rng) for i in range(lookups)]
+        
+        embed_times, lookup_times = [], []
+        for probe in probes:
+            start = time.perf_counter()
+            embedder.embed(probe)
+            embed_times.append(time.perf_counter() - start)
+            
+            start = time.perf_counter()
+            cache.lookup(probe)
+            lookup_times.append(time.perf_counter() - start)
+        
+        rows.append({
+            "index_size": size,
+            "embed_p50_us": statistics.median(embed_times) * 1e6,
+            "lookup_p50_us": statistics.median(lookup_times) * 1e6,
+            "lookup_p95_us": _percentile(lookup_times, 95) * 1e6,
+            "lookup_p99_us": _percentile(lookup_times, 99) * 1e6
+        })
+    
+    return rows
+
+def run_quality(dim: int, threshold: float):
+    """
+    Probe a cache holding the stored side of every pair; returns one row per probe kind.
+    
+    Repeats and paraphrases count as correct hits when they return their own stored
+    question's answer. Near misses have no correct answer in the cache, so every hit
+    they get is a false hit.
+    """
+    embedder = HashingEmbedder(dim)
+    cache = SemanticCache(embedder=embedder, threshold=threshold)
+    for stored, _ in PARAPHRASES:
+        cache.store(stored, {"response": stored, "iterations": 1, "messages": []})
+    
+    rows = []
+    for kind, pairs, answerable in (("repeat", REPEATS, True), ("paraphrase", PARAPHRASES, True),
+                                    ("near_miss", NEAR_MISSES, False)):
+        correct = false_hits = 0
+        similarities = []
+        for stored, probe in pairs:
+            similarities.append(float(embedder.embed(stored) @ embedder.embed(probe)))
+            match = cache.lookup(probe)
+            if match is None:
+                continue
+            if answerable and match[0]["response"] == stored:
+                correct += 1
+            else:
+                false_hits += 1
+        rows.append({
+            "kind": kind,
+            "probes": len(pairs),
+            "hit_rate": correct / len(pairs),
+            "false_hit_rate": false_hits / len(pairs),
+            "similarity_min": min(similarities),
+            "similarity_median": statistics.median(similarities),
+            "similarity_max": max(similarities)
+        })
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", default="100,1000,5000,20000", help="Comma-separated index sizes")
+    parser.add_argument("--lookups", type=int, default=500, help="Lookups timed per size")
+    parser.add_argument("--dim", type=int, default=1024, help="Embedding dimension")
+    parser.add_argument("--threshold", type=float, default=0.92, help="Similarity threshold")
+    parser.add_argument("--json", action="store_true", help="Print results as JSON")
+    args = parser.parse_args()
+    
+    rows = run_benchmark([int(s) for s in args.sizes.split(",")], args.lookups, args.dim, args.threshold)
+    quality = run_quality(args.dim, args.threshold)
+    
+    if args.json:
+        print(json.dumps({"latency": rows, "quality": quality}, indent=2))
+        return
+    
+    print(f"{'size':>8} {'embed p50':>11} {'lookup p50':>12} {'p95':>10} {'p99':>10}")
+    for row in rows:
+        print(
+            f"{row['index_size']:>8} {row['embed_p50_us']:>9.1f}us {row['lookup_p50_us']:>10.1f}us "
+            f"{row['lookup_p95_us']:>8.1f}us {row['lookup_p99_us']:>8.1f}us"
+        )
+    
+    print(f"\nthreshold {args.threshold}")
+    print(f"{'probe':>11} {'hit rate':>9} {'false hits':>11} {'similarity min/median/max':>27}")
+    for row in quality:
+        print(
+            f"{row['kind']:>11} {row['hit_rate']:>9.2f} {row['false_hit_rate']:>11.2f} "
+            f"{row['similarity_min']:>13.2f} / {row['similarity_median']:.2f} / {row['similarity_max']:.2f}"
+        )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,18 @@
+"""
+Shared fixtures: agents wired to the offline fake model.
+"""
+import pytest
+
+from src.core.reflection_agent import ReflectionPatternAgent
+from src.utils.fake_llm import FakeChatModel
+
+@pytest.fixture
+def make_agent():
+    """Build an agent on instant fake models; keyword arguments go to the agent, main_llm/reflection_llm included."""
+    def build(verdicts=("yes", "no"), **kwargs):
+        kwargs.setdefault("main_llm", FakeChatModel(model="fake-main", latency=0.0))
+        kwargs.setdefault("reflection_llm", FakeChatModel(model="fake-reflection", is_main=False, latency=0.0,
+                                                          verdicts=list(verdicts)))
+        return ReflectionPatternAgent(google_api_key="", main_model="fake-main",
+                                      reflection_model="fake-reflection", retry_delay=0.0, **kwargs)
+    return build
@@ -0,0 +1,100 @@
+"""
+Behavior tests of the reflection loop on the fake model.
+"""
+import asyncio
+
+from langgraph.checkpoint.memory import MemorySaver
+
+from src.checkpoint import RunConflictError
+from src.core.convergence import ConvergencePolicy, STOP_NO_IMPROVEMENT_NEEDED, STOP_SCORE_PLATEAU
+from src.core.session import SessionStore
+from src.utils.fake_llm import FakeChatModel
+
+class RepeatingModel(FakeChatModel):
+    """Main model that gives the same answer every time."""
+
+    def _reply(self, call, messages):
+        if self.is_main:
+            return "A cache keeps recently used results close to where they are needed."
+        return super()._reply(call, messages)
+
+def test_session_follow_up_is_reflected(make_agent):
+    agent = make_agent(
+        verdicts=("no",),
+        main_llm=RepeatingModel(model="fake-main", latency=0.0),
+        sessions=SessionStore(),
+        convergence=ConvergencePolicy(similarity_threshold=0.95)
+    )
+    agent.run("What is a cache?", session_id="s")
+    # The follow-up's first draft matches the earlier answer, which is context, not a previous draft
+    result = agent.run("Say that again more concisely", session_id="s")
+    assert result["stop_reason"] == STOP_NO_IMPROVEMENT_NEEDED
+    assert result["verdict"] is not None
+
+class ScriptedReflectionModel(FakeChatModel):
+    """Reflection model that always asks for improvement, with scripted scores."""
+
+    scores: list = []
+
+    def _reflection(self, call, turn):
+        return (f"REFLECTION: Reflection {call}.\nWEAKNESSES:\n- Vague\nSUGGESTIONS:\n- Be specific\n"
+                f"SCORE: {self.scores[turn % len(self.scores)]}/10\nNEEDS IMPROVEMENT: yes")
+
+def test_score_plateau_returns_best_draft(make_agent):
+    agent = make_agent(
+        reflection_llm=ScriptedReflectionModel(model="fake-reflection", is_main=False, latency=0.0, scores=[8, 6]),
+        convergence=ConvergencePolicy(min_score_delta=0.5)
+    )
+    result = agent.run("Explain caches")
+    assert result["stop_reason"] == STOP_SCORE_PLATEAU
+    assert result["scores"] == [8.0, 6.0]
+    # The second draft scored lower, so the first one is the answer
+    assert result["response"].startswith("Draft 1:")
+
+class SlowSaver(MemorySaver):
+    """In-memory checkpointer whose reads yield to the event loop, like a database-backed one."""
+
+    async def aget_tuple(self, config):
+        await asyncio.sleep(0.01)
+        return await super().aget_tuple(config)
+
+def test_concurrent_runs_cannot_share_an_id(make_agent):
+    agent = make_agent(checkpointer=SlowSaver())
+
+    async def both():
+        return await asyncio.gather(agent.arun("What is a cache?", run_id="r1"),
+                                    agent.arun("What is a cache?", run_id="r1"), return_exceptions=True)
+
+    first, second = asyncio.run(both())
+    assert "error" not in first
+    assert isinstance(second, RunConflictError)
+    assert not agent._active_runs
+
+def test_reloaded_agent_keeps_unchanged_limiters_and_breakers(make_agent):
+    first = make_agent(rate_limits={"fake-main": 60}, circuit_failure_threshold=3)
+    kept = make_agent(rate_limits={"fake-main": 60}, circuit_failure_threshold=3, predecessor=first)
+    assert kept.rate_limiters["fake-main"] is first.rate_limiters["fake-main"]
+    assert kept.circuit_breakers["fake-main"] is first.circuit_breakers["fake-main"]
+    assert kept._active_runs is first._active_runs
+    changed = make_agent(rate_limits={"fake-main": 30}, circuit_failure_threshold=5, predecessor=first)
+    assert changed.rate_limiters["fake-main"].requests_per_minute == 30
+    assert changed.circuit_breakers["fake-main"].failure_threshold == 5
+
+def test_models_use_settings_at_build_time(monkeypatch):
+    from src.config import settings
+    from src.utils.utils import initialize_llm
+    monkeypatch.setattr(settings, "LLM_BACKEND", "fake")
+    monkeypatch.setattr(settings, "FAKE_LLM_LATENCY", 0.5)
+    assert initialize_llm("fake-main", "", True).latency == 0.5
+
+def test_both_batch_paths_report_empty_queries_per_item(make_agent):
+    agent = make_agent(verdicts=("no",))
+    queries = ["What is a cache?", "", "   ", "What is a queue?"]
+
+    async def collect():
+        return sorted([result async for result in agent.arun_batch(queries)], key=lambda result: result["index"])
+
+    for results in (agent.run_batch(queries), asyncio.run(collect())):
+        assert [result["index"] for result in results] == [0, 1, 2, 3]
+        assert [result.get("error") for result in results] == [None, "No query provided", "No query provided", None]
+        assert results[0]["response"].startswith("Draft") and results[3]["response"].startswith("Draft")
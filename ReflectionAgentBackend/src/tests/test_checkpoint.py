@@ -0,0 +1,110 @@
+"""
+Tests of the SQLite checkpointer and of resuming runs from it.
+"""
+import asyncio
+
+import pytest
+from langgraph.checkpoint.base import create_checkpoint, empty_checkpoint
+
+from src.checkpoint import RunConflictError
+from src.checkpoint.sqlite import SQLiteCheckpointSaver
+from src.utils.fake_llm import FakeChatModel
+
+def thread(run_id, checkpoint_id=None):
+    configurable = {"thread_id": run_id, "checkpoint_ns": ""}
+    if checkpoint_id is not None:
+        configurable["checkpoint_id"] = checkpoint_id
+    return {"configurable": configurable}
+
+def save_chain(saver, run_id, steps):
+    """Save one checkpoint per step, each the child of the previous one"""
+    config = thread(run_id)
+    checkpoint = empty_checkpoint()
+    for step in range(steps):
+        checkpoint = create_checkpoint(checkpoint, None, step)
+        checkpoint["channel_values"] = {"iteration_count": step}
+        config = saver.put(config, checkpoint, {"source": "loop", "step": step, "writes": None, "parents": {}}, {})
+    return config
+
+@pytest.fixture
+def saver(tmp_path):
+    return SQLiteCheckpointSaver(str(tmp_path / "checkpoints.db"))
+
+def test_put_then_get_tuple(saver):
+    config = save_chain(saver, "run-1", 2)
+    latest = saver.get_tuple(thread("run-1"))
+    assert latest.config == config
+    assert latest.checkpoint["channel_values"] == {"iteration_count": 1}
+    assert latest.metadata["step"] == 1
+    parent = saver.get_tuple(latest.parent_config)
+    assert parent.checkpoint["channel_values"] == {"iteration_count": 0}
+    assert parent.parent_config is None
+    assert saver.get_tuple(thread("missing")) is None
+
+def test_list_newest_first_with_filters(saver):
+    save_chain(saver, "run-1", 3)
+    save_chain(saver, "run-2", 1)
+    steps = [item.metadata["step"] for item in saver.list(thread("run-1"))]
+    assert steps == [2, 1, 0]
+    assert [item.metadata["step"] for item in saver.list(thread("run-1"), filter={"step": 1})] == [1]
+    newest = next(saver.list(thread("run-1"), limit=1))
+    assert [item.metadata["step"] for item in saver.list(thread("run-1"), before=newest.config)] == [1, 0]
+    assert len(list(saver.list(None))) == 4
+
+def test_put_writes_come_back_as_pending_writes(saver):
+    config = save_chain(saver, "run-1", 1)
+    saver.put_writes(config, [("messages", ["draft"]), ("iteration_count", 1)], "task-b")
+    saver.put_writes(config, [("scores", [6.0])], "task-a")
+    # A retried task keeps the writes of its first attempt
+    saver.put_writes(config, [("scores", [9.0])], "task-a")
+    pending = saver.get_tuple(thread("run-1")).pending_writes
+    assert pending == [("task-a", "scores", [6.0]),
+                       ("task-b", "messages", ["draft"]), ("task-b", "iteration_count", 1)]
+
+def test_cancelled_run_resumes_after_its_last_model_call(make_agent, saver):
+    main_llm = FakeChatModel(model="fake-main", latency=0.0)
+    # The reflection is slow enough to cancel the run while it waits for it
+    agent = make_agent(verdicts=("no",), main_llm=main_llm, checkpointer=saver,
+                       reflection_llm=FakeChatModel(model="fake-reflection", is_main=False, latency=0.3,
+                                                    verdicts=["no"]))
+
+    async def cancel_then_resume():
+        task = asyncio.create_task(agent.arun("What is a cache?", run_id="run-1"))
+        while True:
+            await asyncio.sleep(0.01)
+            progress = await agent.aget_run("run-1")
+            if progress is not None and progress["iterations"] == 1:
+                break
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        interrupted = await agent.aget_run("run-1")
+        return interrupted, await agent.aresume("run-1")
+
+    interrupted, resumed = asyncio.run(cancel_then_resume())
+    assert interrupted["status"] == "interrupted" and interrupted["next"] == ["reflect"]
+    assert resumed["run_id"] == "run-1"
+    assert resumed["iterations"] == 1
+    assert resumed["stop_reason"] == "no_improvement_needed"
+    # The draft came from the checkpoint, not from a second generation
+    assert main_llm._calls == 1
+
+def test_fresh_saver_reads_finished_run(make_agent, tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    finished = make_agent(checkpointer=SQLiteCheckpointSaver(path)).run("What is a cache?", run_id="run-1")
+    assert finished["iterations"] == 2
+
+    main_llm = FakeChatModel(model="fake-main", latency=0.0)
+    agent = make_agent(main_llm=main_llm, checkpointer=SQLiteCheckpointSaver(path))
+    stored = asyncio.run(agent.aget_run("run-1"))
+    assert stored["status"] == "completed"
+    assert stored["response"] == finished["response"]
+    # Asking for the finished run again answers from the checkpoint without a model call
+    assert agent.run("What is a cache?", run_id="run-1")["response"] == finished["response"]
+    assert main_llm._calls == 0
+
+def test_reused_run_id_for_another_query_conflicts(make_agent, saver):
+    agent = make_agent(checkpointer=saver)
+    agent.run("What is a cache?", run_id="run-1")
+    with pytest.raises(RunConflictError, match="different query"):
+        agent.run("What is a queue?", run_id="run-1")
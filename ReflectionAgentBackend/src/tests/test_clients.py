@@ -0,0 +1,31 @@
+"""
+Tests of the pooled model connections.
+"""
+import asyncio
+
+from src.utils.clients import ClientPool
+
+def test_async_clients_of_closed_loops_are_dropped():
+    pool = ClientPool(api_key="test-key", max_connections=2)
+
+    async def ring():
+        return pool.async_client("gemini-2.0-flash")
+
+    first = asyncio.run(ring())
+    assert len(first.clients) == 2 and pool.stats()["event_loops"] == 1
+    # Each asyncio.run uses a new loop; the previous one is closed by then
+    second = asyncio.run(ring())
+    assert second is not first
+    assert pool.stats()["event_loops"] == 1
+
+def test_aclose_drops_every_client():
+    pool = ClientPool(api_key="test-key")
+
+    async def open_and_close():
+        sync_ring, async_ring = pool.client("gemini-2.0-flash"), pool.async_client("gemini-2.0-flash")
+        await pool.aclose()
+        return sync_ring, async_ring
+
+    sync_ring, _ = asyncio.run(open_and_close())
+    assert pool.stats()["models"] == [] and pool.stats()["event_loops"] == 0
+    assert pool.client("gemini-2.0-flash") is not sync_ring
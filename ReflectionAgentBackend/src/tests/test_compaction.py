@@ -0,0 +1,62 @@
+"""
+Tests of transcript compaction before regeneration.
+"""
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.core.compaction import FEEDBACK_PREFIX, compact_messages, latest_draft
+
+FEEDBACK = f"{FEEDBACK_PREFIX} REFLECTION: ok\nSTRENGTHS:\n- Short\nWEAKNESSES:\n- Vague\nSUGGESTIONS:\n- Be specific"
+
+def _transcript():
+    return [
+        SystemMessage(content="system"),
+        HumanMessage(content="earlier question"),
+        AIMessage(content="earlier answer"),
+        HumanMessage(content="question"),
+        AIMessage(content="draft 1"),
+        HumanMessage(content=f"{FEEDBACK_PREFIX} first critique"),
+        AIMessage(content="draft 2"),
+        HumanMessage(content=FEEDBACK)
+    ]
+
+def test_full_keeps_everything():
+    messages = _transcript()
+    assert compact_messages(messages, "full") is messages
+
+def test_latest_keeps_query_latest_draft_and_feedback():
+    compacted = compact_messages(_transcript(), "latest")
+    assert [m.content for m in compacted] == [
+        "system", "earlier question", "earlier answer", "question", "draft 2", FEEDBACK
+    ]
+
+def test_condensed_reduces_feedback():
+    feedback = compact_messages(_transcript(), "condensed")[-1].content
+    assert feedback.startswith(FEEDBACK_PREFIX)
+    assert "WEAKNESSES:\n- Vague" in feedback and "SUGGESTIONS:\n- Be specific" in feedback
+    assert "STRENGTHS" not in feedback
+
+def test_unknown_strategy():
+    with pytest.raises(ValueError):
+        compact_messages(_transcript(), "newest")
+
+def test_latest_draft_ignores_earlier_turns():
+    messages = _transcript()[:4]
+    assert latest_draft(messages) is None
+    assert latest_draft(_transcript()).content == "draft 2"
+
+def test_agent_rejects_unknown_strategy(make_agent):
+    with pytest.raises(ValueError):
+        make_agent(compaction_strategy="newest")
+    with pytest.raises(ValueError):
+        make_agent().resolve_profile({"compaction_strategy": "newest"})
+
+def test_per_request_strategy(make_agent):
+    agent = make_agent()
+    profile = agent.resolve_profile({"compaction_strategy": "full"})
+    assert profile.compaction_strategy == "full"
+    assert profile.cache_namespace != agent.default_profile.cache_namespace
+    # The full transcript carries the first critique into the second prompt; condensed drops it
+    full = agent.run("Explain caches", options={"compaction_strategy": "full"})
+    condensed = agent.run("Explain caches")
+    assert full["prompt_tokens"][1] > condensed["prompt_tokens"][1]
@@ -0,0 +1,34 @@
+"""
+Tests of the convergence criteria that end the loop early.
+"""
+from src.core.convergence import (
+    ConvergencePolicy,
+    STOP_DRAFT_SIMILARITY,
+    STOP_SCORE_PLATEAU,
+    STOP_TARGET_SCORE,
+    draft_similarity
+)
+
+def test_target_score():
+    policy = ConvergencePolicy(target_score=9)
+    assert policy.after_reflection([9.0]) == STOP_TARGET_SCORE
+    assert policy.after_reflection([8.5]) is None
+
+def test_score_plateau():
+    policy = ConvergencePolicy(min_score_delta=0.5)
+    assert policy.after_reflection([5.0]) is None
+    assert policy.after_reflection([5.0, 7.0]) is None
+    assert policy.after_reflection([5.0, 5.2]) == STOP_SCORE_PLATEAU
+    assert policy.after_reflection([5.0, None]) is None
+
+def test_draft_similarity():
+    policy = ConvergencePolicy(similarity_threshold=0.9)
+    assert policy.after_generation(None, "anything") is None
+    assert policy.after_generation("The cache is warm.", "the cache is warm") == STOP_DRAFT_SIMILARITY
+    assert policy.after_generation("The cache is warm.", "Use a bigger index instead.") is None
+    assert draft_similarity("", "") == 1.0
+
+def test_disabled_criteria():
+    policy = ConvergencePolicy()
+    assert policy.after_reflection([10.0, 10.0]) is None
+    assert policy.after_generation("same", "same") is None
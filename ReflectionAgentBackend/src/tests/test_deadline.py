@@ -0,0 +1,64 @@
+"""
+Tests of run deadlines and partial answers.
+"""
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.api import app as appmod
+from src.core.convergence import STOP_DEADLINE
+from src.utils.fake_llm import FakeChatModel
+
+def slow_reflection(latency):
+    return FakeChatModel(model="fake-reflection", is_main=False, latency=latency, verdicts=["yes"])
+
+def test_deadline_during_reflection_returns_the_draft(make_agent):
+    agent = make_agent(request_timeout=0.2, reflection_llm=slow_reflection(2.0))
+    start = time.perf_counter()
+    result = asyncio.run(agent.arun("What is a cache?"))
+    # The reflection in flight was cancelled at the deadline rather than awaited
+    assert time.perf_counter() - start < 1.0
+    assert result["response"].startswith("Draft 1:")
+    assert result["stop_reason"] == STOP_DEADLINE and result["partial"] is True
+    assert "error" not in result
+
+def test_deadline_before_the_first_draft_is_an_error(make_agent):
+    agent = make_agent(request_timeout=0.1, main_llm=FakeChatModel(model="fake-main", latency=2.0))
+    result = asyncio.run(agent.arun("What is a cache?"))
+    assert result["error_type"] == "deadline"
+    assert result["iterations"] == 0
+
+def test_sync_run_stops_at_the_next_step_after_the_deadline(make_agent):
+    agent = make_agent(request_timeout=0.1, reflection_llm=slow_reflection(0.3))
+    start = time.perf_counter()
+    result = agent.run("What is a cache?")
+    # The blocking reflection could not be cancelled, so the run overran and stopped after it
+    assert time.perf_counter() - start >= 0.3
+    assert result["stop_reason"] == STOP_DEADLINE and result["iterations"] == 1
+
+@pytest.fixture
+def client(monkeypatch):
+    async def post(body, headers):
+        transport = httpx.ASGITransport(app=appmod.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as http:
+            return await http.post("/api/query", json=body, headers=headers)
+
+    def request(agent, body, headers=None):
+        monkeypatch.setattr(appmod, "agent", agent)
+        return asyncio.run(post(body, headers or {}))
+    return request
+
+def test_request_timeout_header_sets_the_deadline(make_agent, client):
+    agent = make_agent(request_timeout=None, reflection_llm=slow_reflection(2.0))
+    response = client(agent, {"query": "What is a cache?"}, {"X-Request-Timeout": "0.2"})
+    assert response.status_code == 200
+    assert response.json()["partial"] is True and response.json()["stop_reason"] == STOP_DEADLINE
+
+    slow = make_agent(request_timeout=None, main_llm=FakeChatModel(model="fake-main", latency=2.0))
+    response = client(slow, {"query": "What is a cache?"}, {"X-Request-Timeout": "0.1"})
+    assert response.status_code == 504
+    # The body's timeout_seconds takes precedence over the header
+    response = client(agent, {"query": "What is a queue?", "timeout_seconds": 0.2}, {"X-Request-Timeout": "30"})
+    assert response.json()["stop_reason"] == STOP_DEADLINE
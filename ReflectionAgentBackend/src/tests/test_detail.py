@@ -0,0 +1,32 @@
+"""
+Tests of response detail levels and run transcripts.
+"""
+import asyncio
+
+import orjson
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.api import app as appmod
+from src.core.compaction import FEEDBACK_PREFIX
+
+FEEDBACK = f"{FEEDBACK_PREFIX} REFLECTION: Too vague.\nWEAKNESSES:\n- No example\nSUGGESTIONS:\n- Add one\nSCORE: 5/10"
+MESSAGES = [SystemMessage(content="You are helpful."), HumanMessage(content="What is a cache?"),
+            AIMessage(content="Draft 1"), HumanMessage(content=FEEDBACK), AIMessage(content="Draft 2")]
+
+def test_detail_levels():
+    assert appmod.present_messages(MESSAGES, "final") == []
+    assert len(appmod.present_messages(MESSAGES, "full")) == 5
+    summary = appmod.present_messages(MESSAGES, "summary")
+    assert [msg['type'] for msg in summary] == ["human", "human", "ai"]
+    assert summary[0]['content'] == "What is a cache?"
+    assert summary[1]['content'] == f"{FEEDBACK_PREFIX} WEAKNESSES:\n- No example\n\nSUGGESTIONS:\n- Add one"
+    assert summary[2]['content'] == "Draft 2"
+
+def test_transcript_kept_at_full_detail():
+    result = {'response': "Draft 2", 'iterations': 2, 'messages': MESSAGES, 'run_id': "run-detail"}
+    body = orjson.loads(appmod.build_query_response(result, "final").body)
+    assert body['response'] == "Draft 2" and body['messages'] == []
+    # The response was trimmed, but the transcript can still be fetched in full afterwards
+    transcript = orjson.loads(asyncio.run(appmod.get_transcript("run-detail", "full")).body)
+    assert [msg['content'] for msg in transcript['messages']][-1] == "Draft 2"
+    assert len(transcript['messages']) == 5
@@ -0,0 +1,33 @@
+"""
+Tests of the offline fake model and an agent run on it.
+"""
+import pytest
+from langchain_core.messages import HumanMessage
+
+from src.utils.fake_llm import FakeChatModel, FakeLLMError
+
+def test_reflections_cycle_through_scripted_verdicts():
+    model = FakeChatModel(is_main=False, latency=0.0, verdicts=["yes", "no"])
+    replies = [model.invoke([HumanMessage(content="q")]).content for _ in range(3)]
+    assert [reply.splitlines()[-1] for reply in replies] == [
+        "NEEDS IMPROVEMENT: yes", "NEEDS IMPROVEMENT: no", "NEEDS IMPROVEMENT: yes"
+    ]
+
+def test_stream_adds_up_to_the_reply():
+    streamed = FakeChatModel(latency=0.0, seed=3)
+    whole = FakeChatModel(latency=0.0, seed=3)
+    chunks = [chunk.content for chunk in streamed.stream([HumanMessage(content="q")])]
+    assert len(chunks) > 1
+    assert "".join(chunks) == whole.invoke([HumanMessage(content="q")]).content
+
+def test_seeded_latency_and_injected_failures():
+    draws = [FakeChatModel(latency=1.0, latency_distribution="lognormal", seed=7)._next_call()[1] for _ in range(2)]
+    assert draws[0] == draws[1] and draws[0] != 1.0
+    with pytest.raises(FakeLLMError):
+        FakeChatModel(latency=0.0, failure_rate=1.0).invoke([HumanMessage(content="q")])
+
+def test_agent_runs_offline(make_agent):
+    # The first reflection asks for improvement and the second accepts the redraft
+    result = make_agent(verdicts=("yes", "no")).run("What is a cache?")
+    assert result["iterations"] == 2
+    assert result["response"].startswith("Draft 2:")
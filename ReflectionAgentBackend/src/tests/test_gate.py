@@ -0,0 +1,41 @@
+"""
+Tests of the pre-reflection gate.
+"""
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from src.core.gate import ReflectionGate, classify_query
+from src.core.reflection_agent import ReflectionPatternAgent
+
+ANSWER = "The capital of France is Paris, which is also its largest city."
+
+def test_classify_query():
+    assert classify_query("What is the capital of France?") == "simple"
+    assert classify_query("Explain how a hash table works") == "moderate"
+    assert classify_query("Explain and compare quicksort with mergesort, step by step") == "complex"
+
+def test_skips_only_confident_drafts():
+    gate = ReflectionGate(threshold=0.8)
+    assert gate.should_skip("What is the capital of France?", ANSWER)[0]
+    # The fallback text of a failed generation is never returned unreflected
+    assert not gate.should_skip("What is the capital of France?", "I'm sorry, I encountered an error.")[0]
+    assert not gate.should_skip("Explain and compare quicksort with mergesort, step by step", "Use quicksort.")[0]
+    stats = gate.stats()
+    assert stats["evaluated"] == 3 and stats["reflections_saved"] == 1
+
+def test_fit_learns_from_verdicts():
+    gate = ReflectionGate(threshold=0.5)
+    examples = [("What is 2 + 2?", "2 + 2 equals 4, a basic sum.", False),
+                ("Explain and compare TCP and UDP step by step", "TCP.", True)] * 10
+    gate.fit(examples)
+    assert gate.confidence(*examples[0][:2]) > 0.5 > gate.confidence(*examples[1][:2])
+
+def test_agent_skips_reflection_call():
+    reflections = iter([AIMessage(content="NEEDS IMPROVEMENT: yes")])
+    agent = ReflectionPatternAgent(google_api_key="test-key", reflection_gate=ReflectionGate(threshold=0.8),
+                                   main_llm=GenericFakeChatModel(messages=iter([AIMessage(content=ANSWER)])),
+                                   reflection_llm=GenericFakeChatModel(messages=reflections))
+    result = agent.run("What is the capital of France?")
+    assert result["response"] == ANSWER and result["reflection_skipped"] is True
+    # The scripted reflection was never consumed
+    assert next(reflections, None) is not None
@@ -0,0 +1,33 @@
+"""
+Tests of the metrics registry and its Prometheus exposition.
+"""
+from src.utils.metrics import MODEL_TOKENS, RUNS, Counter, Histogram, Registry, registry
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram("latency_seconds", "Latency", ("phase",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 0.7, 5.0):
+        histogram.observe(value, phase="generate")
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP latency_seconds Latency", "# TYPE latency_seconds histogram"]
+    assert 'latency_seconds_bucket{phase="generate",le="0.1"} 1' in lines
+    assert 'latency_seconds_bucket{phase="generate",le="1.0"} 3' in lines
+    assert 'latency_seconds_bucket{phase="generate",le="+Inf"} 4' in lines
+    assert 'latency_seconds_count{phase="generate"} 4' in lines
+
+def test_counter_escapes_label_values():
+    local = Registry()
+    counter = local.register(Counter("errors_total", "Errors", ("model",)))
+    counter.inc(model='gemini "flash"')
+    counter.inc(2, model='gemini "flash"')
+    assert 'errors_total{model="gemini \\"flash\\""} 3.0' in local.render().splitlines()
+
+def test_run_is_recorded(make_agent):
+    runs = RUNS.value(stop_reason="no_improvement_needed")
+    prompt_tokens = MODEL_TOKENS.value(model="fake-main", phase="generate", kind="prompt")
+    make_agent(verdicts=("no",)).run("What is a cache?")
+    assert RUNS.value(stop_reason="no_improvement_needed") == runs + 1
+    # The fake model reports usage metadata, so tokens are counted per model and phase
+    assert MODEL_TOKENS.value(model="fake-main", phase="generate", kind="prompt") > prompt_tokens
+    exposition = registry.render()
+    assert 'reflection_phase_seconds_count{phase="generate",model="fake-main"}' in exposition
+    assert 'reflection_phase_seconds_count{phase="reflect",model="fake-reflection"}' in exposition
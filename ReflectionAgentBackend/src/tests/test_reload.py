@@ -0,0 +1,53 @@
+"""
+Tests of per-request overrides and of reloading the settings.
+"""
+import asyncio
+import importlib
+
+import pytest
+
+from src.api import app as appmod
+from src.config import settings
+
+@pytest.fixture
+def served_agent(monkeypatch):
+    """The app's agent, built from the settings on the fake model backend."""
+    monkeypatch.setenv("LLM_BACKEND", "fake")
+    monkeypatch.setenv("VERBOSE", "false")
+    monkeypatch.setattr(appmod, "transcripts", appmod.transcripts)
+    importlib.reload(settings)
+    appmod.agent = appmod.build_agent()
+    yield appmod.agent
+    appmod.agent = None
+    monkeypatch.undo()
+    importlib.reload(settings)
+
+def test_failed_reload_keeps_the_applied_settings(served_agent, monkeypatch):
+    monkeypatch.setenv("COMPACTION_STRATEGY", "newest")
+    monkeypatch.setenv("MAX_ITERATIONS", "7")
+    with pytest.raises(ValueError, match="compaction strategy"):
+        asyncio.run(appmod.reload_agent())
+    assert appmod.agent is served_agent
+    assert settings.COMPACTION_STRATEGY == "condensed" and settings.MAX_ITERATIONS == 3
+    assert appmod.describe_config()["max_iterations"] == 3
+
+def test_reload_rebuilds_only_stores_whose_settings_changed(served_agent, monkeypatch):
+    transcripts = appmod.transcripts
+    monkeypatch.setenv("CACHE_MAX_ENTRIES", "16")
+    monkeypatch.setenv("TRANSCRIPT_MAX_ENTRIES", "16")
+    reloaded, rebuilt = asyncio.run(appmod.reload_agent())
+    assert rebuilt == ["cache", "transcripts"]
+    assert reloaded.cache is not served_agent.cache and reloaded.cache.max_entries == 16
+    assert appmod.transcripts is not transcripts
+    assert reloaded.sessions is served_agent.sessions
+    assert reloaded.client_pool is served_agent.client_pool
+
+def test_overrides_out_of_range_are_rejected(make_agent):
+    agent = make_agent(max_iterations=3, max_iterations_limit=5)
+    assert agent.resolve_profile({"max_iterations": None}).max_iterations == 3
+    assert agent.resolve_profile({"max_iterations": 5}).max_iterations == 5
+    for max_iterations in (0, 6):
+        with pytest.raises(ValueError, match="max_iterations"):
+            agent.resolve_profile({"max_iterations": max_iterations})
+    with pytest.raises(ValueError, match="timeout_seconds"):
+        agent.resolve_profile({"timeout_seconds": 0})
@@ -0,0 +1,43 @@
+"""
+Tests of retry classification and circuit breaking.
+"""
+import time
+
+import pytest
+
+from src.utils.resilience import HALF_OPEN, OPEN, CircuitBreaker, CircuitOpenError
+from src.utils.scheduler import AdmissionRejected
+from src.utils.utils import call_with_retry
+
+class Transient(RuntimeError):
+    retryable = True
+
+def _raise(error):
+    raise error
+
+def test_transient_failures_open_the_circuit():
+    breaker = CircuitBreaker("m", failure_threshold=2, reset_timeout=60)
+    with pytest.raises(Transient):
+        call_with_retry(_raise, Transient(), max_retries=1, retry_delay=0.0, breaker=breaker)
+    assert breaker.state == OPEN
+    with pytest.raises(CircuitOpenError):
+        call_with_retry(lambda: "ok", breaker=breaker)
+
+def test_admission_rejection_does_not_reset_failures():
+    breaker = CircuitBreaker("m", failure_threshold=2, reset_timeout=60)
+    breaker.record_failure()
+    with pytest.raises(AdmissionRejected):
+        call_with_retry(_raise, AdmissionRejected("m", 5.0), retry_delay=0.0, breaker=breaker)
+    assert breaker.stats()["consecutive_failures"] == 1
+
+def test_admission_rejection_does_not_close_half_open_circuit():
+    breaker = CircuitBreaker("m", failure_threshold=1, reset_timeout=0.01)
+    breaker.record_failure()
+    time.sleep(0.02)
+    # The probe is rejected before reaching the model, so the circuit stays half open ...
+    with pytest.raises(AdmissionRejected):
+        call_with_retry(_raise, AdmissionRejected("m", 5.0), retry_delay=0.0, breaker=breaker)
+    assert breaker.state == HALF_OPEN
+    # ... and the next call may probe straight away
+    assert call_with_retry(lambda: "ok", breaker=breaker) == "ok"
+    assert breaker.stats()["consecutive_failures"] == 0
@@ -0,0 +1,85 @@
+"""
+Tests of the result cache backends and cache keys.
+"""
+import time
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from src.cache.base import make_cache_key
+from src.cache.memory import MemoryResultCache
+from src.cache.sqlite import SQLiteResultCache
+from src.core.reflection_agent import ReflectionPatternAgent
+
+def _result(text):
+    return {"response": text, "iterations": 1,
+            "messages": [HumanMessage(content="question"), AIMessage(content=text)]}
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Wall and monotonic clock that only moves when the test advances it."""
+    now = [1000.0]
+    monkeypatch.setattr(time, "time", lambda: now[0])
+    monkeypatch.setattr(time, "monotonic", lambda: now[0])
+    return now
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_cache(request, tmp_path):
+    def build(max_entries=2, ttl_seconds=60):
+        if request.param == "memory":
+            return MemoryResultCache(max_entries, ttl_seconds)
+        return SQLiteResultCache(str(tmp_path / "cache.db"), max_entries, ttl_seconds)
+    return build
+
+def test_evicts_least_recently_used(make_cache, clock):
+    cache = make_cache()
+    cache.set("a", _result("a"))
+    clock[0] += 1
+    cache.set("b", _result("b"))
+    clock[0] += 1
+    # Reading "a" makes "b" the least recently used entry
+    assert cache.get("a") is not None
+    clock[0] += 1
+    cache.set("c", _result("c"))
+    assert cache.get("b") is None
+    assert cache.get("a") is not None and cache.get("c") is not None
+    assert len(cache) == 2 and cache.stats()["evictions"] == 1
+
+def test_expires_after_ttl(make_cache, clock):
+    cache = make_cache()
+    cache.set("a", _result("a"))
+    clock[0] += 59
+    assert cache.get("a") is not None
+    clock[0] += 2
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1 and stats["hits"] == 1 and stats["misses"] == 1
+
+def test_sqlite_round_trip_keeps_messages(tmp_path):
+    path = str(tmp_path / "cache.db")
+    SQLiteResultCache(path).set("a", _result("answer"))
+    # A new instance on the same file reads what the first one wrote
+    result = SQLiteResultCache(path).get("a")
+    assert result["response"] == "answer" and result["iterations"] == 1
+    assert [type(m) for m in result["messages"]] == [HumanMessage, AIMessage]
+    assert result["messages"][1].content == "answer"
+
+def test_key_normalizes_query_and_covers_configuration():
+    config = {"main_model": "m", "max_iterations": 3}
+    assert make_cache_key("What is  a cache?", config) == make_cache_key("  what is a CACHE? ", config)
+    assert make_cache_key("What is a cache?", config) != make_cache_key("What is a cache?", {**config, "max_iterations": 1})
+    assert ReflectionPatternAgent(google_api_key="test-key", max_iterations=1).cache_key("q") != \
+        ReflectionPatternAgent(google_api_key="test-key", max_iterations=2).cache_key("q")
+
+def test_repeated_query_is_served_from_cache():
+    # One reply per role: a second run that reached the models would fail
+    agent = ReflectionPatternAgent(
+        google_api_key="test-key", cache=MemoryResultCache(),
+        main_llm=GenericFakeChatModel(messages=iter([AIMessage(content="A cache keeps results.")])),
+        reflection_llm=GenericFakeChatModel(messages=iter([AIMessage(content="NEEDS IMPROVEMENT: no")]))
+    )
+    first = agent.run("What is a cache?")
+    second = agent.run("what is a cache?")
+    assert "cached" not in first
+    assert second["cached"] is True and second["response"] == first["response"] == "A cache keeps results."
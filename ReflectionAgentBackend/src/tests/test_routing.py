@@ -0,0 +1,53 @@
+"""
+Tests of the model routing tier.
+"""
+import pytest
+
+from src.core.routing import (
+    ROUTE_DIFFICULT_QUERY, ROUTE_FIRST_DRAFT, ROUTE_NEEDS_IMPROVEMENT, ModelRouter, parse_model_prices
+)
+from src.utils.fake_llm import FakeChatModel
+
+SIMPLE = "What is the capital of France?"
+COMPLEX = "Explain and compare quicksort with mergesort, step by step"
+
+def test_parse_model_prices():
+    assert parse_model_prices("lite=0.075:0.3, main=0.1") == {"lite": (0.075, 0.3), "main": (0.1, 0.1)}
+    assert parse_model_prices("") == {}
+
+def test_first_drafts_go_to_the_draft_model_unless_difficult():
+    router = ModelRouter("lite", "main")
+    assert router.route(SIMPLE, 1) == ("lite", ROUTE_FIRST_DRAFT)
+    assert router.route(COMPLEX, 1) == ("main", ROUTE_DIFFICULT_QUERY)
+    assert ModelRouter("lite", "main", escalate_classes=()).route(COMPLEX, 1) == ("lite", ROUTE_FIRST_DRAFT)
+
+def test_escalation_is_sticky():
+    router = ModelRouter("lite", "main")
+    assert router.route(SIMPLE, 2, needs_improvement=True, previous_model="lite") == ("main", ROUTE_NEEDS_IMPROVEMENT)
+    # Once on the main model a run stays there, even when the latest verdict was content
+    assert router.route(SIMPLE, 3, needs_improvement=False, previous_model="main") == ("main", ROUTE_NEEDS_IMPROVEMENT)
+    assert router.route(SIMPLE, 2, needs_improvement=False, previous_model="lite") == ("lite", ROUTE_FIRST_DRAFT)
+
+def test_savings_compare_with_the_main_model():
+    router = ModelRouter("lite", "main", prices={"lite": (1.0, 2.0), "main": (10.0, 20.0)})
+    usage = {"input_tokens": 1000, "output_tokens": 500}
+    # Until the main model has been observed there is no latency baseline
+    assert router.record(1, "lite", ROUTE_FIRST_DRAFT, 0.5, usage)["saved_seconds"] is None
+    main = router.record(2, "main", ROUTE_NEEDS_IMPROVEMENT, 2.0, usage)
+    assert main["saved_seconds"] == 0.0 and main["saved_cost"] == 0.0
+    draft = router.record(1, "lite", ROUTE_FIRST_DRAFT, 0.5, usage)
+    assert draft["saved_seconds"] == pytest.approx(1.5)
+    assert draft["saved_cost"] == pytest.approx((1000 * 9.0 + 500 * 18.0) / 1e6)
+    stats = router.stats()
+    assert stats["decisions"] == {ROUTE_FIRST_DRAFT: 2, ROUTE_NEEDS_IMPROVEMENT: 1}
+    assert stats["escalation_rate"] == pytest.approx(1 / 3, abs=1e-4)
+    assert stats["average_seconds"] == {"lite": 0.5, "main": 2.0}
+
+def test_run_escalates_after_a_reflection_asks_for_improvement(make_agent):
+    agent = make_agent(verdicts=("yes", "no"), router=ModelRouter("fake-draft", "fake-main"),
+                       draft_llm=FakeChatModel(model="fake-draft", latency=0.0))
+    routing = agent.run(SIMPLE)["routing"]
+    assert [(d["model"], d["reason"]) for d in routing["decisions"]] == [
+        ("fake-draft", ROUTE_FIRST_DRAFT), ("fake-main", ROUTE_NEEDS_IMPROVEMENT)
+    ]
+    assert routing["escalated"] is True
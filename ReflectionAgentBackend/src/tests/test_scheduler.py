@@ -0,0 +1,91 @@
+"""
+Tests of the per-model request and token scheduler.
+"""
+import contextvars
+import threading
+import time
+
+import pytest
+
+from src.utils.scheduler import (
+    AdmissionRejected,
+    ModelScheduler,
+    PRIORITY_FIRST_DRAFT,
+    PRIORITY_REFINEMENT,
+    ScheduledCall,
+    _Lane,
+    scheduled_call
+)
+
+def test_admits_within_budget():
+    scheduler = ModelScheduler("m", requests_per_minute=60, tokens_per_minute=1000)
+    with scheduled_call(PRIORITY_FIRST_DRAFT, None, 100) as call:
+        assert scheduler.acquire()
+    assert call.charged == 100
+    assert scheduler.stats()["tokens_available"] == 900
+
+def test_rejects_call_that_cannot_start_before_deadline():
+    scheduler = ModelScheduler("m", requests_per_minute=1)
+    assert scheduler.acquire()
+    with scheduled_call(PRIORITY_FIRST_DRAFT, time.time() + 1.0):
+        with pytest.raises(AdmissionRejected) as error:
+            scheduler.acquire()
+    assert error.value.retry_after > 1.0
+    stats = scheduler.stats()
+    assert stats["queued"] == 0 and stats["rejected"] == 1
+
+def test_settle_refunds_overestimate():
+    scheduler = ModelScheduler("m", tokens_per_minute=1000)
+    with scheduled_call(PRIORITY_FIRST_DRAFT, None, 400) as call:
+        scheduler.acquire()
+    call.settle({"input_tokens": 80, "output_tokens": 20})
+    assert scheduler.stats()["tokens_available"] == 900
+
+def test_non_blocking_acquire():
+    scheduler = ModelScheduler("m", requests_per_minute=1)
+    assert scheduler.acquire(blocking=False)
+    assert not scheduler.acquire(blocking=False)
+    assert scheduler.stats()["queued"] == 0
+
+def test_settle_refunds_every_retried_attempt():
+    scheduler = ModelScheduler("m", tokens_per_minute=1000)
+    with scheduled_call(PRIORITY_FIRST_DRAFT, None, 300) as call:
+        # Two failed attempts and a successful retry, each admitted separately
+        for _ in range(3):
+            scheduler.acquire()
+    assert call.charged == 900
+    call.settle({"total_tokens": 100})
+    assert scheduler.stats()["tokens_available"] == 900
+
+def test_refund_wakes_waiter_without_polling():
+    scheduler = ModelScheduler("m", tokens_per_minute=600, check_every_n_seconds=5.0)
+    with scheduled_call(PRIORITY_FIRST_DRAFT, None, 600) as first:
+        scheduler.acquire()
+    # At 10 tokens a second the second call would wait ten seconds for its budget
+    with scheduled_call(PRIORITY_FIRST_DRAFT, None, 100):
+        context = contextvars.copy_context()
+    waiter = threading.Thread(target=context.run, args=(scheduler.acquire,))
+    start = time.monotonic()
+    waiter.start()
+    time.sleep(0.05)
+    first.settle({"total_tokens": 100})
+    waiter.join(1.0)
+    assert not waiter.is_alive() and time.monotonic() - start < 1.0
+    assert scheduler.stats()["admitted"] == 2
+
+def test_wait_estimate_follows_calls_leaving_the_queue():
+    scheduler = ModelScheduler("m", requests_per_minute=60)
+    scheduler._requests.level = 0
+    with scheduler._lock:
+        waiters = [scheduler._lanes.setdefault(PRIORITY_REFINEMENT, _Lane()).push(ScheduledCall(), 0)
+                   for _ in range(3)]
+        first_draft = scheduler._lanes.setdefault(PRIORITY_FIRST_DRAFT, _Lane()).push(
+            ScheduledCall(PRIORITY_FIRST_DRAFT), 0)
+        # The first draft is ahead of every refinement, whatever order they arrived in
+        assert scheduler._estimate_wait(first_draft) == pytest.approx(1.0, abs=0.05)
+        assert scheduler._estimate_wait(waiters[2]) == pytest.approx(4.0, abs=0.05)
+        scheduler._remove(waiters[1])
+        assert scheduler._estimate_wait(waiters[2]) == pytest.approx(3.0, abs=0.05)
+        scheduler._remove(first_draft)
+        scheduler._remove(waiters[0])
+        assert scheduler._estimate_wait(waiters[2]) == pytest.approx(1.0, abs=0.05)
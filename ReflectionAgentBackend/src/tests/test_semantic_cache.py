@@ -0,0 +1,75 @@
+"""
+Tests of the semantic near-duplicate cache.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import pytest
+
+from src.cache.semantic import Embedder, SemanticCache
+
+def _result(text):
+    return {"response": text, "iterations": 1, "messages": []}
+
+def test_matches_near_verbatim_repeat():
+    cache = SemanticCache(threshold=0.9)
+    cache.store("How do I reverse a list in Python?", _result("reverse"))
+    result, similarity = cache.lookup("how do I reverse a list in python??")
+    assert result["response"] == "reverse" and similarity >= 0.9
+    assert cache.lookup("How do I sort a list in Python?") is None
+
+def test_embedder_must_implement_embed():
+    class Incomplete(Embedder):
+        dim = 8
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+def test_expired_candidate_does_not_hide_valid_one():
+    cache = SemanticCache(threshold=0.5, ttl_seconds=60)
+    cache.store("what is a hash table", _result("older"))
+    cache.store("what is a hash table exactly", _result("newer"))
+    cache.store("how do I reverse a list", _result("other"))
+    # The most similar entry has expired; the next one is still valid
+    cache._entries[0]["created_at"] -= 120
+    result, _ = cache.lookup("what is a hash table")
+    assert result["response"] == "newer"
+    assert len(cache) == 2 and cache.stats()["expirations"] == 1
+    assert [entry["query"] for entry in cache._entries] == ["how do I reverse a list", "what is a hash table exactly"]
+
+def test_evicts_least_recently_used():
+    cache = SemanticCache(threshold=0.95, max_entries=2)
+    cache.store("what is a hash table", _result("a"))
+    cache.store("how do I reverse a list", _result("b"))
+    assert cache.lookup("what is a hash table") is not None
+    cache.store("explain the cap theorem", _result("c"))
+    assert cache.lookup("how do I reverse a list") is None
+    assert cache.lookup("what is a hash table") is not None
+    assert cache.stats()["evictions"] == 1
+
+def test_recency_survives_save_and_load(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    cache = SemanticCache(threshold=0.95, max_entries=2)
+    cache.store("what is a hash table", _result("a"))
+    cache.store("how do I reverse a list", _result("b"))
+    cache.lookup("what is a hash table")
+    cache.save(path)
+    restored = SemanticCache(threshold=0.95, max_entries=2, path=path)
+    restored.store("explain the cap theorem", _result("c"))
+    assert restored.lookup("what is a hash table") is not None
+    assert restored.lookup("how do I reverse a list") is None
+
+def _save_worker_cache(args):
+    worker, path = args
+    cache = SemanticCache(max_entries=500)
+    for i in range(500):
+        cache.store(f"worker {worker} question {i}", _result("answer " * 50))
+    for _ in range(5):
+        cache.save(path)
+
+def test_concurrent_saves_leave_one_whole_file(tmp_path):
+    path = str(tmp_path / "semantic.npz")
+    # Like uvicorn workers shutting down together, each saving its own cache to the same path
+    with ProcessPoolExecutor(4) as pool:
+        list(pool.map(_save_worker_cache, [(worker, path) for worker in range(4)]))
+    assert len(SemanticCache(path=path)) == 500
+    assert [p.name for p in tmp_path.iterdir()] == ["semantic.npz"]
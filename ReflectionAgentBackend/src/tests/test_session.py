@@ -0,0 +1,63 @@
+"""
+Tests of conversation sessions.
+"""
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+
+from src.core.session import SUMMARY_PREFIX, SessionStore
+
+def test_history_replays_turns():
+    store = SessionStore()
+    assert store.history("s") == []
+    store.record("s", "What is a cache?", "A fast store.")
+    history = store.history("s")
+    assert [type(m) for m in history] == [HumanMessage, AIMessage]
+    assert history[1].content == "A fast store."
+
+def test_turns_leaving_the_window_are_summarized():
+    store = SessionStore(history_tokens=40, summary_tokens=100)
+    for i in range(4):
+        store.record("s", f"Question {i}. More words here.", f"Answer {i} " + "word " * 20)
+    session = store.get("s")
+    assert session["summarized_turns"] >= 1
+    assert "Q: Question 0." in session["summary"]
+    history = store.history("s")
+    assert isinstance(history[0], SystemMessage) and history[0].content.startswith(SUMMARY_PREFIX)
+
+def test_least_recently_used_session_is_evicted():
+    store = SessionStore(max_sessions=2)
+    store.record("a", "q", "a")
+    store.record("b", "q", "a")
+    store.history("a")
+    store.record("c", "q", "a")
+    assert store.get("b") is None and store.get("a") is not None
+    assert store.stats()["evictions"] == 1
+
+def test_idle_sessions_expire():
+    store = SessionStore(idle_seconds=0.01)
+    store.record("s", "q", "a")
+    store._sessions["s"].last_used -= 1
+    assert store.history("s") == []
+    assert store.delete("s") is False
+
+class SlowSummarizer:
+    """Summary model that appends the new questions to the current summary after a pause."""
+
+    def invoke(self, messages):
+        time.sleep(0.02)
+        current, new_turns = messages[-1].content.split("\n\nNEW TURNS:\n")
+        current = current[len("CURRENT SUMMARY:\n"):].replace("(empty)", "")
+        questions = [line[len("USER: "):] for line in new_turns.splitlines() if line.startswith("USER: ")]
+        return AIMessage(content="\n".join(line for line in [current, *questions] if line))
+
+def test_concurrent_turns_keep_every_folded_line():
+    store = SessionStore(history_tokens=1, summary_tokens=1000, summary_llm=SlowSummarizer())
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        list(executor.map(lambda i: store.record("s", f"q{i}", f"a{i}"), range(8)))
+    session = store.get("s")
+    assert session["summarized_turns"] == 7
+    # Each turn is either still in the window or has its line in the summary
+    remembered = session["summary"].splitlines() + [turn["query"] for turn in session["turns"]]
+    assert sorted(remembered) == [f"q{i}" for i in range(8)]
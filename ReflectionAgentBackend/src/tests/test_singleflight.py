@@ -0,0 +1,96 @@
+"""
+Tests of single-flight coalescing.
+"""
+import asyncio
+import threading
+import time
+
+import pytest
+
+from src.utils.singleflight import SingleFlight
+
+def test_do_shares_one_call():
+    flight = SingleFlight()
+    calls = []
+    results = []
+
+    def work():
+        calls.append(1)
+        time.sleep(0.1)
+        return "answer"
+
+    threads = [threading.Thread(target=lambda: results.append(flight.do("key", work))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert {result for result, _ in results} == {"answer"}
+    assert flight.stats()["in_flight"] == 0
+
+def test_ado_shares_result_and_errors():
+    flight = SingleFlight()
+    calls = []
+
+    async def work():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return len(calls)
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("boom")
+
+    async def main():
+        results = await asyncio.gather(*(flight.ado("key", work) for _ in range(3)))
+        assert results == [(1, False), (1, True), (1, True)]
+        errors = await asyncio.gather(*(flight.ado("bad", fail) for _ in range(2)), return_exceptions=True)
+        assert all(isinstance(error, RuntimeError) for error in errors)
+        # Released once finished, so a later call runs again
+        assert await flight.ado("key", work) == (2, False)
+
+    asyncio.run(main())
+
+def test_subscribe_replays_events():
+    flight = SingleFlight()
+
+    async def events():
+        for i in range(3):
+            yield i
+            await asyncio.sleep(0.01)
+
+    async def collect(iterator):
+        return [event async for event in iterator]
+
+    async def main():
+        first, leader_shared = flight.subscribe("key", events)
+        await asyncio.sleep(0.015)
+        second, follower_shared = flight.subscribe("key", events)
+        assert (leader_shared, follower_shared) == (False, True)
+        assert await asyncio.gather(collect(first), collect(second)) == [[0, 1, 2], [0, 1, 2]]
+
+    asyncio.run(main())
+
+def test_leader_error_reaches_sync_followers():
+    flight = SingleFlight()
+    errors = []
+
+    def work():
+        time.sleep(0.05)
+        raise ValueError("bad")
+
+    def call():
+        try:
+            flight.do("key", work)
+        except ValueError as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=call) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(errors) == 2
+    with pytest.raises(ValueError):
+        flight.do("key", work)
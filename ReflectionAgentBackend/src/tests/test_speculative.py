@@ -0,0 +1,53 @@
+"""
+Tests of the speculative topology: parallel drafts, one judging pass, one refinement.
+"""
+import asyncio
+
+import pytest
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from src.core.convergence import STOP_NO_IMPROVEMENT_NEEDED, STOP_REFINED
+
+def scripted(*replies):
+    return GenericFakeChatModel(messages=iter([AIMessage(content=reply) for reply in replies]))
+
+@pytest.fixture
+def speculative_agent(make_agent):
+    def build(judgement, refinement="Refined answer"):
+        agent = make_agent(topology="speculative", draft_temperatures=(0.2, 0.7, 1.0),
+                           main_llm=scripted(refinement), reflection_llm=scripted(judgement))
+        # One scripted client per draft, so every candidate is known regardless of scheduling order
+        agent.draft_llms[agent.main_model] = [scripted(f"Draft {index}") for index in range(3)]
+        return agent
+    return build
+
+def test_keeps_best_rated_draft(speculative_agent):
+    judgement = ("CANDIDATE 1:\nSCORE: 5/10\nNEEDS IMPROVEMENT: yes\n\n"
+                 "CANDIDATE 2:\nSCORE: 9/10\nNEEDS IMPROVEMENT: no\n\n"
+                 "CANDIDATE 3:\nSCORE: 7/10\nNEEDS IMPROVEMENT: yes")
+    result = speculative_agent(judgement).run("What is a hash table?")
+    assert result["response"] == "Draft 1"
+    assert result["scores"] == [5.0, 9.0, 7.0]
+    assert result["stop_reason"] == STOP_NO_IMPROVEMENT_NEEDED
+    assert result["iterations"] == 1
+
+def test_refines_selected_draft_once(speculative_agent):
+    judgement = ("CANDIDATE 1:\nSCORE: 6/10\nNEEDS IMPROVEMENT: yes\n\n"
+                 "CANDIDATE 2:\nSCORE: 4/10\nNEEDS IMPROVEMENT: yes\n\n"
+                 "CANDIDATE 3:\nSUGGESTIONS:\n- Add an example\nSCORE: 6/10\nNEEDS IMPROVEMENT: yes")
+    result = speculative_agent(judgement).run("What is a hash table?")
+    assert result["response"] == "Refined answer"
+    assert result["stop_reason"] == STOP_REFINED
+    assert result["iterations"] == 2
+    # Ties go to the earlier draft, and its feedback is what the refinement sees
+    assert any(getattr(message, "content", None) == "Draft 0" for message in result["messages"])
+    assert not any(getattr(message, "content", None) == "Draft 2" for message in result["messages"])
+
+def test_malformed_judge_output_keeps_first_draft(speculative_agent):
+    agent = speculative_agent("All three look reasonable to me.")
+    result = asyncio.run(agent.arun("What is a hash table?"))
+    assert result["response"] == "Draft 0"
+    assert result["scores"] == [None, None, None]
+    assert result["stop_reason"] == STOP_NO_IMPROVEMENT_NEEDED
+    assert "error" not in result
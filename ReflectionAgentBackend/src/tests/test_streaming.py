@@ -0,0 +1,31 @@
+"""
+Tests of the streamed run events.
+"""
+import asyncio
+
+from langchain_core.language_models.fake_chat_models import GenericFakeChatModel
+from langchain_core.messages import AIMessage
+
+from src.core.reflection_agent import ReflectionPatternAgent
+
+def _model(*replies):
+    return GenericFakeChatModel(messages=iter([AIMessage(content=reply) for reply in replies]))
+
+async def _collect(events):
+    return [event async for event in events]
+
+def test_stream_reports_phases_tokens_and_final():
+    agent = ReflectionPatternAgent(google_api_key="test-key",
+                                   main_llm=_model("A cache keeps recent results close at hand."),
+                                   reflection_llm=_model("REFLECTION: Clear.\nNEEDS IMPROVEMENT: no"))
+    events = asyncio.run(_collect(agent.astream("What is a cache?")))
+
+    assert {"event": "phase", "phase": "generate", "status": "started", "iteration": 1} in events
+    tokens = [event["content"] for event in events if event["event"] == "token" and event["phase"] == "generate"]
+    # The draft arrives in several chunks that add up to the whole answer
+    assert len(tokens) > 1 and "".join(tokens) == "A cache keeps recent results close at hand."
+    reflection = next(event for event in events if event["event"] == "reflection")
+    assert reflection["iteration"] == 1 and reflection["needs_improvement"] is False
+    assert events[-1]["event"] == "final"
+    assert events[-1]["response"] == "A cache keeps recent results close at hand."
+    assert events[-1]["iterations"] == 1
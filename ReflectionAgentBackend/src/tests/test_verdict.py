@@ -0,0 +1,48 @@
+"""
+Tests of the tolerant reflection parser.
+"""
+from src.core.verdict import parse_candidate_reflections, parse_reflection
+
+REFLECTION = """REFLECTION: Mostly right.
+STRENGTHS:
+- Clear structure
+WEAKNESSES:
+- Lacks concrete examples
+- Too long
+SUGGESTIONS:
+- Add an example
+SCORE: 6/10
+NEEDS IMPROVEMENT: yes"""
+
+def test_parses_sections():
+    verdict = parse_reflection(REFLECTION)
+    assert verdict.reflection == "Mostly right."
+    assert verdict.strengths == ["Clear structure"]
+    assert verdict.weaknesses == ["Lacks concrete examples", "Too long"]
+    assert verdict.suggestions == ["Add an example"]
+    assert verdict.score == 6.0
+    assert verdict.needs_improvement is True
+
+def test_tolerates_formatting_drift():
+    text = "1. **Reflection**: fine\n**Score**: 4/5\n6. Needs_Improvement: No."
+    verdict = parse_reflection(text)
+    assert verdict.score == 8.0
+    assert verdict.needs_improvement is False
+
+def test_score_decides_without_yes_or_no():
+    assert parse_reflection("SCORE: 5").needs_improvement is True
+    assert parse_reflection("SCORE: 9/10").needs_improvement is False
+
+def test_unparseable_reflection():
+    assert parse_reflection("The answer looks fine to me.") is None
+
+def test_candidate_blocks():
+    text = f"CANDIDATE 2:\n{REFLECTION}\n\n**Candidate 1:**\nSCORE: 9/10\nNEEDS IMPROVEMENT: no"
+    first, second, third = parse_candidate_reflections(text, 3)
+    assert first.score == 9.0 and first.needs_improvement is False
+    assert second.score == 6.0 and second.needs_improvement is True
+    assert third is None
+
+def test_unmarked_reflection_of_single_candidate():
+    [verdict] = parse_candidate_reflections(REFLECTION, 1)
+    assert verdict.score == 6.0
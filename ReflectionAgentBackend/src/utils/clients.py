@@ -0,0 +1,186 @@
+"""
+Pooled Gemini API connections shared by every client of a model.
+
+ChatGoogleGenerativeAI opens its own gRPC channel (or HTTP session) per
+instance, so each role, draft temperature and agent would otherwise hold a
+separate connection with library-default settings. A ClientPool builds the
+underlying service clients once per model, with the configured transport,
+number of connections and keep-alive, and installs them on every chat model
+of that model. Calls are spread round-robin over the model's connections.
+"""
+import asyncio
+import functools
+import itertools
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+# Seconds to wait for a keep-alive ping to be acknowledged before the connection is considered dead
+KEEPALIVE_TIMEOUT_SECONDS = 20
+
+class _ClientRing:
+    """Service client facade that hands each call to the next of several clients."""
+
+    def __init__(self, clients: List[Any]):
+        self.clients = clients
+        self._next = itertools.cycle(clients)
+
+    def __getattr__(self, name: str):
+        # LangChain looks up e.g. client.generate_content once per call, so every call rotates
+        return getattr(next(self._next), name)
+
+class _LazyAsyncClient:
+    """
+    Async service client built on first use inside the running event loop.
+
+    gRPC asyncio channels belong to the loop that created them, so they cannot
+    be opened when the agent is built; this stands in until the first call.
+    """
+
+    def __init__(self, pool: "ClientPool", model: str):
+        self._pool = pool
+        self._model = model
+
+    def __getattr__(self, name: str):
+        return getattr(self._pool.async_client(self._model), name)
+
+class ClientPool:
+    """
+    Gemini service clients per model, shared by all runs.
+
+    Args:
+        api_key: Google API key
+        transport: "grpc" or "rest"; async calls always use gRPC asyncio unless "rest" is chosen
+        max_connections: Connections (gRPC channels, or pooled HTTP connections for "rest") per model
+        keepalive_seconds: Interval of gRPC keep-alive pings on idle connections (0 or None disables)
+    """
+
+    def __init__(self, api_key: str, transport: str = "grpc", max_connections: int = 1,
+                 keepalive_seconds: Optional[float] = 30.0):
+        if transport not in ("grpc", "rest"):
+            raise ValueError(f"Unknown model transport: {transport}")
+        self.api_key = api_key
+        self.transport = transport
+        self.max_connections = max(1, max_connections)
+        self.keepalive_seconds = keepalive_seconds or None
+        self._lock = threading.Lock()
+        self._clients: Dict[str, _ClientRing] = {}
+        self._async_clients: Dict[Tuple[str, asyncio.AbstractEventLoop], _ClientRing] = {}
+        self._attached = 0
+
+    def channel_options(self) -> List[Tuple[str, int]]:
+        """gRPC channel arguments applied on top of the library's own"""
+        if self.keepalive_seconds is None:
+            return []
+        return [
+            ("grpc.keepalive_time_ms", int(self.keepalive_seconds * 1000)),
+            ("grpc.keepalive_timeout_ms", KEEPALIVE_TIMEOUT_SECONDS * 1000),
+            # Keep idle connections warm between runs, not only while calls are in flight
+            ("grpc.keepalive_permit_without_calls", 1),
+            ("grpc.http2.max_pings_without_data", 0),
+        ]
+
+    def _grpc_transport(self, transport_class):
+        """Transport factory whose channel carries the pool's options"""
+        # Channels with equal arguments would share one connection through gRPC's global subchannel pool;
+        # a local pool per channel gives each of the max_connections channels a connection of its own
+        options = self.channel_options() + [("grpc.use_local_subchannel_pool", 1)]
+
+        def create_channel(host, **kwargs):
+            kwargs["options"] = [*kwargs.get("options", []), *options]
+            return transport_class.create_channel(host, **kwargs)
+
+        return functools.partial(transport_class, channel=create_channel)
+
+    def _rest_transport(self):
+        from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+            GenerativeServiceRestTransport
+        )
+        from requests.adapters import HTTPAdapter
+        max_connections = self.max_connections
+
+        def create(**kwargs):
+            transport = GenerativeServiceRestTransport(**kwargs)
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_connections)
+            transport._session.mount("https://", adapter)
+            return transport
+
+        return create
+
+    def _build(self, count: int, asynchronous: bool) -> _ClientRing:
+        from langchain_google_genai import _genai_extension as genaix
+        from google.ai.generativelanguage_v1beta.services.generative_service import transports
+
+        if asynchronous:
+            build = genaix.build_generative_async_service
+            transport_class = transports.GenerativeServiceGrpcAsyncIOTransport
+        else:
+            build = genaix.build_generative_service
+            transport_class = transports.GenerativeServiceGrpcTransport
+        if self.transport == "rest":
+            return _ClientRing([build(credentials=None, api_key=self.api_key, transport=self._rest_transport())])
+        return _ClientRing([
+            build(credentials=None, api_key=self.api_key, transport=self._grpc_transport(transport_class))
+            for _ in range(count)
+        ])
+
+    def client(self, model: str) -> _ClientRing:
+        """Synchronous service client of a model, built on first use"""
+        with self._lock:
+            ring = self._clients.get(model)
+            if ring is None:
+                # HTTP sessions pool connections themselves, so REST needs a single client
+                ring = self._clients[model] = self._build(self.max_connections, asynchronous=False)
+            return ring
+
+    def async_client(self, model: str) -> _ClientRing:
+        """Async service client of a model for the running event loop, built on first use"""
+        key = (model, asyncio.get_running_loop())
+        with self._lock:
+            # Channels of a closed loop can never be used again, so its clients are dropped
+            for closed in [k for k in self._async_clients if k[1].is_closed()]:
+                del self._async_clients[closed]
+            ring = self._async_clients.get(key)
+            if ring is None:
+                ring = self._async_clients[key] = self._build(self.max_connections, asynchronous=True)
+            return ring
+
+    async def aclose(self):
+        """
+        Close every connection of the pool; clients attached to it must not be used afterwards.
+
+        Connections of other event loops are only dropped, as they can be closed only on their own loop.
+        """
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            rings = list(self._clients.values())
+            async_rings = [ring for (_, ring_loop), ring in self._async_clients.items() if ring_loop is loop]
+            self._clients.clear()
+            self._async_clients.clear()
+        await asyncio.gather(*(client.transport.close() for ring in async_rings for client in ring.clients))
+        for ring in rings:
+            for client in ring.clients:
+                client.transport.close()
+
+    def attach(self, llm, model: str):
+        """
+        Route a ChatGoogleGenerativeAI instance's calls through the pool's clients.
+
+        Copies made later with model_copy (see with_temperature) share them too.
+        """
+        llm.client = self.client(model)
+        if self.transport == "grpc":
+            llm.async_client_running = _LazyAsyncClient(self, model)
+        with self._lock:
+            self._attached += 1
+        return llm
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "transport": self.transport,
+                "max_connections": self.max_connections,
+                "keepalive_seconds": self.keepalive_seconds,
+                "models": sorted(self._clients),
+                "event_loops": len({loop for _, loop in self._async_clients}),
+                "attached_clients": self._attached
+            }
@@ -0,0 +1,168 @@
+"""
+Deterministic offline stand-in for the Gemini chat models.
+
+Used for load tests and benchmarks so throughput and latency can be measured
+without spending API quota. Select it with LLM_BACKEND=fake.
+"""
+import asyncio
+import random
+import threading
+import time
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from pydantic import Field, PrivateAttr
+
+class FakeLLMError(RuntimeError):
+    """Injected failure raised by FakeChatModel."""
+
+    # Injected failures stand in for transient provider errors
+    retryable = True
+
+class FakeChatModel(BaseChatModel):
+    """
+    Chat model with scripted output, simulated latency and injected failures.
+    
+    The main role answers with numbered drafts; the reflection role answers in
+    the sectioned reflection format, cycling through the scripted verdicts.
+    All randomness comes from a seeded generator, so runs are reproducible.
+    """
+    
+    model: str = "fake-model"
+    is_main: bool = True
+    # Simulated time to first token in seconds, drawn from the named distribution
+    latency: float = 0.2
+    latency_distribution: str = "constant"  # constant, uniform or lognormal
+    latency_jitter: float = 0.5
+    # Streaming rate; 0 emits the whole reply at once after the latency
+    tokens_per_second: float = 0.0
+    response_words: int = 80
+    # Reflection verdicts, cycled per call: "yes" means the draft needs improvement
+    verdicts: List[str] = Field(default_factory=lambda: ["yes", "no"])
+    failure_rate: float = 0.0
+    seed: int = 0
+    
+    _rng: random.Random = PrivateAttr()
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _calls: int = PrivateAttr(default=0)
+    
+    def model_post_init(self, __context: Any) -> None:
+        self._rng = random.Random(self.seed)
+    
+    @property
+    def _llm_type(self) -> str:
+        return "fake-chat-model"
+    
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"model": self.model, "is_main": self.is_main}
+    
+    def _next_call(self):
+        """Draw this call's number, latency and failure decision under the lock."""
+        with self._lock:
+            self._calls += 1
+            call = self._calls
+            if self.latency_distribution == "uniform":
+                delay = self._rng.uniform(self.latency * (1 - self.latency_jitter), self.latency * (1 + self.latency_jitter))
+            elif self.latency_distribution == "lognormal":
+                delay = self.latency * self._rng.lognormvariate(0.0, self.latency_jitter)
+            else:
+                delay = self.latency
+            fail = self._rng.random() < self.failure_rate
+        return call, max(0.0, delay), fail
+    
+    def _reply(self, call: int, messages: List[BaseMessage]) -> str:
+        if self.is_main:
+            # Distinct wording per call so draft-similarity convergence does not trigger
+            body = " ".join(f"c{call}w{i}" for i in range(self.response_words))
+            return f"Draft {call}: {body}"
+        
+        # A judging prompt lists several candidates; answer with one block per candidate
+        candidates = str(messages[-1].content).count("CANDIDATE RESPONSE ") if messages else 0
+        if candidates:
+            return "\n\n".join(
+                f"CANDIDATE {k + 1}:\n{self._reflection(call, call - 1 + k)}" for k in range(candidates)
+            )
+        return self._reflection(call, call - 1)
+    
+    def _reflection(self, call: int, turn: int) -> str:
+        verdict = self.verdicts[turn % len(self.verdicts)] if self.verdicts else "no"
+        score = 5 if verdict == "yes" else 8
+        return (
+            f"REFLECTION: Simulated reflection {call}.\n"
+            "STRENGTHS:\n- Clear structure\n"
+            "WEAKNESSES:\n- Lacks concrete examples\n"
+            "SUGGESTIONS:\n- Add an example\n"
+            f"SCORE: {score}/10\n"
+            f"NEEDS IMPROVEMENT: {verdict}"
+        )
+    
+    def _usage(self, messages: List[BaseMessage], text: str) -> Dict[str, int]:
+        input_tokens = sum(len(str(m.content)) // 4 + 4 for m in messages)
+        output_tokens = len(text) // 4
+        return {"input_tokens": input_tokens, "output_tokens": output_tokens, "total_tokens": input_tokens + output_tokens}
+    
+    def _chunks(self, text: str) -> List[str]:
+        words = text.split(" ")
+        return [word + (" " if i < len(words) - 1 else "") for i, word in enumerate(words)]
+    
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                  run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        call, delay, fail = self._next_call()
+        time.sleep(delay)
+        if fail:
+            raise FakeLLMError(f"Injected failure on call {call}")
+        text = self._reply(call, messages)
+        if self.tokens_per_second > 0:
+            time.sleep(len(self._chunks(text)) / self.tokens_per_second)
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                         run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> ChatResult:
+        call, delay, fail = self._next_call()
+        await asyncio.sleep(delay)
+        if fail:
+            raise FakeLLMError(f"Injected failure on call {call}")
+        text = self._reply(call, messages)
+        if self.tokens_per_second > 0:
+            await asyncio.sleep(len(self._chunks(text)) / self.tokens_per_second)
+        message = AIMessage(content=text, usage_metadata=self._usage(messages, text))
+        return ChatResult(generations=[ChatGeneration(message=message)])
+    
+    def _stream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                run_manager: Optional[CallbackManagerForLLMRun] = None, **kwargs: Any) -> Iterator[ChatGenerationChunk]:
+        call, delay, fail = self._next_call()
+        time.sleep(delay)
+        if fail:
+            raise FakeLLMError(f"Injected failure on call {call}")
+        text = self._reply(call, messages)
+        pieces = self._chunks(text)
+        for i, piece in enumerate(pieces):
+            if self.tokens_per_second > 0:
+                time.sleep(1.0 / self.tokens_per_second)
+            usage = self._usage(messages, text) if i == len(pieces) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            if run_manager:
+                run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
+    
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None,
+                       run_manager: Optional[AsyncCallbackManagerForLLMRun] = None, **kwargs: Any) -> AsyncIterator[ChatGenerationChunk]:
+        call, delay, fail = self._next_call()
+        await asyncio.sleep(delay)
+        if fail:
+            raise FakeLLMError(f"Injected failure on call {call}")
+        text = self._reply(call, messages)
+        pieces = self._chunks(text)
+        for i, piece in enumerate(pieces):
+            if self.tokens_per_second > 0:
+                await asyncio.sleep(1.0 / self.tokens_per_second)
+            usage = self._usage(messages, text) if i == len(pieces) - 1 else None
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=piece, usage_metadata=usage))
+            if run_manager:
+                await run_manager.on_llm_new_token(piece, chunk=chunk)
+            yield chunk
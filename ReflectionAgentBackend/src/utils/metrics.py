@@ -0,0 +1,170 @@
+"""
+Lightweight in-process metrics with Prometheus text exposition.
+
+Counters and histograms keep their values in plain dicts keyed by label
+values, so recording a sample is a dict lookup, a bisect and an addition
+under a lock. The /metrics endpoint renders the registry on demand.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Sequence, Tuple
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+class Counter:
+    """Monotonically increasing value per label combination."""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+    
+    def inc(self, amount: float = 1.0, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+    
+    def value(self, **labels: str) -> float:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        return self._values.get(key, 0.0)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+class Histogram:
+    """Distribution of observed values in cumulative buckets per label combination."""
+    
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # Per label combination: [count per bucket (+Inf last), sum, count]
+        self._values: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+    
+    def observe(self, value: float, **labels: str) -> None:
+        key = tuple(str(labels.get(name, "")) for name in self.labelnames)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            entry[0][index] += 1
+            entry[1] += value
+            entry[2] += 1
+    
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        """Observe the wall time of the enclosed block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+    
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                    cumulative += bucket_count
+                    le = 'le="+Inf"' if bound == float("inf") else f'le="{bound!r}"'
+                    lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+                lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {total}")
+                lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {count}")
+        return lines
+
+class Registry:
+    """Collection of metrics rendered together."""
+    
+    def __init__(self):
+        self._metrics: List = []
+    
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+    
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+registry = Registry()
+
+PHASE_SECONDS = registry.register(Histogram(
+    "reflection_phase_seconds", "Wall time of each agent phase", ("phase", "model")))
+MODEL_TOKENS = registry.register(Counter(
+    "reflection_model_tokens_total", "Tokens sent to and received from each model", ("model", "phase", "kind")))
+MODEL_ERRORS = registry.register(Counter(
+    "reflection_model_errors_total", "Model calls that failed", ("model", "phase")))
+MODEL_RETRIES = registry.register(Counter(
+    "reflection_model_retries_total", "Model calls retried after a transient failure", ("model", "phase")))
+CIRCUIT_REJECTIONS = registry.register(Counter(
+    "reflection_circuit_rejections_total", "Model calls refused because the model's circuit was open", ("model",)))
+SCHEDULER_WAIT_SECONDS = registry.register(Histogram(
+    "reflection_scheduler_wait_seconds", "Time model calls queued for request and token budget", ("model",)))
+SCHEDULER_REJECTIONS = registry.register(Counter(
+    "reflection_scheduler_rejections_total", "Model calls refused because they could not start before their deadline",
+    ("model",)))
+DEADLINE_CANCELLATIONS = registry.register(Counter(
+    "reflection_deadline_cancellations_total", "Model calls cancelled because their run's deadline passed", ("phase",)))
+ROUTING_SECONDS = registry.register(Histogram(
+    "reflection_routing_seconds", "Time spent deciding the next graph step", ("node",),
+    buckets=(0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005)))
+ROUTING_DECISIONS = registry.register(Counter(
+    "reflection_routing_decisions_total", "Graph routing decisions", ("node", "decision")))
+RUN_ITERATIONS = registry.register(Histogram(
+    "reflection_run_iterations", "Generation steps per completed run", buckets=(1, 2, 3, 4, 5, 6, 8, 10)))
+RUNS = registry.register(Counter(
+    "reflection_runs_total", "Completed runs by stop reason", ("stop_reason",)))
+MODEL_ROUTING_DECISIONS = registry.register(Counter(
+    "reflection_model_routing_decisions_total", "Generate steps by the model routed to and why", ("model", "reason")))
+MODEL_ROUTING_SECONDS = registry.register(Counter(
+    "reflection_model_routing_seconds_total",
+    "Generation seconds of routed steps (actual) and their estimate on the main model (baseline)", ("kind",)))
+MODEL_ROUTING_COST = registry.register(Counter(
+    "reflection_model_routing_cost_total",
+    "Model cost of routed steps (actual) and the same tokens priced for the main model (baseline)", ("kind",)))
+CACHE_LOOKUPS = registry.register(Counter(
+    "reflection_cache_lookups_total", "Result cache lookups", ("cache", "result")))
+COALESCED_REQUESTS = registry.register(Counter(
+    "reflection_coalesced_requests_total",
+    "Requests that started a run (leader) or joined an identical one in flight (follower)", ("kind", "role")))
+COALESCED_FOLLOWERS = registry.register(Histogram(
+    "reflection_coalesced_followers", "Requests that joined each run started by another request", ("kind",),
+    buckets=(0, 1, 2, 4, 8, 16, 32, 64)))
+HTTP_REQUEST_SECONDS = registry.register(Histogram(
+    "http_request_duration_seconds", "Time to produce an HTTP response", ("method", "path", "status")))
+
+def model_name(llm) -> str:
+    """Best-effort model name of a chat model client, for metric labels."""
+    name = getattr(llm, "model", None) or getattr(llm, "model_name", None) or type(llm).__name__
+    return str(name).split("/")[-1]
+
+def record_usage(model: str, phase: str, usage) -> None:
+    """Count prompt and completion tokens from a message's usage_metadata, if present."""
+    if not usage:
+        return
+    MODEL_TOKENS.inc(usage.get("input_tokens", 0), model=model, phase=phase, kind="prompt")
+    MODEL_TOKENS.inc(usage.get("output_tokens", 0), model=model, phase=phase, kind="completion")
@@ -0,0 +1,235 @@
+"""
+Retry classification, backoff and circuit breaking for model calls.
+
+The retry loops themselves live in src.utils.utils (call_with_retry and
+acall_with_retry); this module decides whether an error is worth retrying,
+how long to wait before the next attempt and when to stop calling a model
+that keeps failing.
+"""
+import random
+import re
+import threading
+import time
+from typing import Dict, Iterable, Iterator, Optional
+from src.utils.metrics import CIRCUIT_REJECTIONS
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+# HTTP statuses that signal a transient condition on the provider side
+RETRYABLE_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+# Exception class names used by google-api-core, httpx and grpc for transient failures
+RETRYABLE_ERROR_NAMES = {
+    "ResourceExhausted",
+    "TooManyRequests",
+    "ServiceUnavailable",
+    "DeadlineExceeded",
+    "InternalServerError",
+    "GatewayTimeout",
+    "Aborted",
+    "ConnectError",
+    "ReadTimeout",
+    "RemoteProtocolError"
+}
+_RETRY_HINT_PATTERNS = (
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),
+    re.compile(r"retry (?:in|after) ([\d.]+)\s*s", re.IGNORECASE)
+)
+
+class CircuitOpenError(RuntimeError):
+    """Raised without calling the model while its circuit breaker is open."""
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Circuit for {name} is open; retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+def _error_chain(error: BaseException) -> Iterator[BaseException]:
+    """Yield an error and the errors it was raised from, so wrapped client errors are classified too."""
+    seen = set()
+    while error is not None and id(error) not in seen:
+        seen.add(id(error))
+        yield error
+        error = error.__cause__ or error.__context__
+
+def _status_code(error: BaseException) -> Optional[int]:
+    for attr in ("status_code", "code"):
+        value = getattr(error, attr, None)
+        if isinstance(value, int):
+            return value
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    return value if isinstance(value, int) else None
+
+def is_retryable(error: BaseException) -> bool:
+    """
+    Whether an error is transient: timeouts, connection failures, rate limiting and 5xx responses.
+
+    Errors can opt in or out explicitly with a boolean ``retryable`` attribute.
+    """
+    for err in _error_chain(error):
+        if isinstance(err, CircuitOpenError):
+            return False
+        flag = getattr(err, "retryable", None)
+        if isinstance(flag, bool):
+            return flag
+        if isinstance(err, (TimeoutError, ConnectionError)):
+            return True
+        status = _status_code(err)
+        if status is not None:
+            return status in RETRYABLE_STATUS_CODES
+        if type(err).__name__ in RETRYABLE_ERROR_NAMES:
+            return True
+    return False
+
+def reached_model(error: BaseException) -> bool:
+    """
+    Whether a failed call got as far as the model.
+
+    Errors raised locally before the request is sent, such as a scheduler
+    rejection, say nothing about the model's health; they opt out with a
+    ``reached_model = False`` attribute.
+    """
+    return getattr(error, "reached_model", True) is not False
+
+def retry_after_hint(error: BaseException) -> Optional[float]:
+    """
+    Seconds the provider asked us to wait before retrying, if the error carries a hint.
+
+    Looks at a ``retry_after`` attribute, a Retry-After response header and the
+    RetryInfo detail Gemini includes in 429 responses.
+    """
+    for err in _error_chain(error):
+        value = getattr(err, "retry_after", None)
+        if isinstance(value, (int, float)):
+            return float(value)
+        headers = getattr(getattr(err, "response", None), "headers", None)
+        if headers is not None:
+            try:
+                return float(headers.get("retry-after"))
+            except (TypeError, ValueError):
+                pass
+        for detail in getattr(err, "details", None) or ():
+            delay = getattr(detail, "retry_delay", None)
+            if delay is not None and hasattr(delay, "seconds"):
+                return delay.seconds + getattr(delay, "nanos", 0) / 1e9
+        text = str(err)
+        for pattern in _RETRY_HINT_PATTERNS:
+            match = pattern.search(text)
+            if match:
+                return float(match.group(1))
+    return None
+
+def backoff_delay(attempt: int, base_delay: float, max_delay: float,
+                  error: Optional[BaseException] = None) -> float:
+    """
+    Seconds to wait before retry number ``attempt + 1``.
+
+    A provider retry-after hint wins when present; otherwise the delay is drawn
+    uniformly from [0, base_delay * 2**attempt] ("full jitter") so that clients
+    failing together do not retry together. Both are capped at max_delay.
+    """
+    hint = retry_after_hint(error) if error is not None else None
+    if hint is not None:
+        return min(max(hint, 0.0), max_delay)
+    return random.uniform(0.0, min(max_delay, base_delay * (2 ** attempt)))
+
+class CircuitBreaker:
+    """
+    Per-model circuit breaker shared by every run calling that model.
+
+    After ``failure_threshold`` consecutive transient failures the circuit opens
+    and calls fail immediately with CircuitOpenError. Once ``reset_timeout``
+    seconds have passed a single probe call is let through; its success closes
+    the circuit and its failure opens it again.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_started: Optional[float] = None
+        self._rejections = 0
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> None:
+        """Admit a call, or raise CircuitOpenError if the model should not be called right now"""
+        now = time.monotonic()
+        with self._lock:
+            if self._state == CLOSED:
+                return
+            remaining = self._opened_at + self.reset_timeout - now
+            if self._state == OPEN and remaining <= 0:
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                # One probe at a time; a probe that never reported back is replaced after reset_timeout
+                if self._probe_started is None or now - self._probe_started > self.reset_timeout:
+                    self._probe_started = now
+                    return
+                remaining = self.reset_timeout - (now - self._probe_started)
+            self._rejections += 1
+        CIRCUIT_REJECTIONS.inc(model=self.name)
+        raise CircuitOpenError(self.name, max(remaining, 0.0))
+
+    def record_success(self) -> None:
+        """The model answered, so it is healthy enough to keep calling"""
+        with self._lock:
+            self._state = CLOSED
+            self._failures = 0
+            self._probe_started = None
+
+    def release_probe(self) -> None:
+        """A call that never reached the model gives up its probe slot without a verdict"""
+        with self._lock:
+            self._probe_started = None
+
+    def record_failure(self) -> None:
+        """Count a transient failure and open the circuit when the threshold is reached"""
+        with self._lock:
+            self._failures += 1
+            if self._state == HALF_OPEN or self._failures >= self.failure_threshold:
+                self._state = OPEN
+                self._opened_at = time.monotonic()
+                self._probe_started = None
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "state": self._state,
+                "consecutive_failures": self._failures,
+                "rejections": self._rejections
+            }
+
+def create_circuit_breakers(models: Iterable[str], failure_threshold: int, reset_timeout: float,
+                            existing: Optional[Dict[str, CircuitBreaker]] = None) -> Dict[str, CircuitBreaker]:
+    """
+    Create one circuit breaker per model, shared by both roles when they use the same model
+
+    Args:
+        models: Model names the agent calls
+        failure_threshold: Consecutive transient failures that open a circuit, 0 to disable breaking
+        reset_timeout: Seconds an open circuit waits before letting a probe call through
+        existing: Optional breakers of a previous agent; one with the same settings is kept,
+            so an open circuit stays open
+
+    Returns:
+        Dict mapping model name to its circuit breaker
+    """
+    if failure_threshold <= 0:
+        return {}
+    breakers = {}
+    for name in dict.fromkeys(models):
+        breaker = (existing or {}).get(name)
+        if breaker is None or (breaker.failure_threshold, breaker.reset_timeout) != (failure_threshold, reset_timeout):
+            breaker = CircuitBreaker(name, failure_threshold, reset_timeout)
+        breakers[name] = breaker
+    return breakers
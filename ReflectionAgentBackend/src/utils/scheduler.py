@@ -0,0 +1,309 @@
+"""
+Per-model request and token budgets shared by every run.
+
+A ModelScheduler is installed as the ``rate_limiter`` of each chat model
+created by initialize_llm, so LangChain asks it for permission before every
+call. Calls queue by priority (first drafts ahead of refinements) and are
+rejected up front with AdmissionRejected when the queue cannot admit them
+before their run's deadline. The agent describes each call (priority,
+deadline and estimated tokens) with the scheduled_call context manager; calls
+made outside one are admitted with default priority and no deadline.
+"""
+import asyncio
+import itertools
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Callable, Deque, Dict, Iterator, List, Optional, Tuple
+from langchain_core.rate_limiters import BaseRateLimiter
+from src.utils.metrics import SCHEDULER_REJECTIONS, SCHEDULER_WAIT_SECONDS
+
+PRIORITY_FIRST_DRAFT = 0
+PRIORITY_REFINEMENT = 1
+
+class AdmissionRejected(RuntimeError):
+    """Raised instead of queueing a call that could not start before its deadline."""
+
+    # Waiting longer will not help within this run's deadline
+    retryable = False
+    # Raised before the request is sent, so it says nothing about the model's health
+    reached_model = False
+
+    def __init__(self, name: str, retry_after: float):
+        super().__init__(f"Rate limit queue for {name} cannot admit the call before its deadline; "
+                         f"retry in {retry_after:.1f}s")
+        self.name = name
+        self.retry_after = retry_after
+
+class ScheduledCall:
+    """Admission details of one model call, plus what it was charged so usage can be settled."""
+
+    def __init__(self, priority: int = PRIORITY_REFINEMENT, deadline: Optional[float] = None, tokens: int = 0):
+        self.priority = priority
+        # Wall-clock (time.time) deadline, so it survives being stored in graph state
+        self.deadline = deadline
+        self.tokens = tokens
+        self.scheduler: Optional["ModelScheduler"] = None
+        # Total charged by every admission in the block; retried attempts are each admitted anew
+        self.charged = 0
+
+    def settle(self, usage: Optional[Dict[str, int]]) -> None:
+        """Correct the token charges of all attempts once the real usage of the one that succeeded is known"""
+        if self.scheduler is not None and usage:
+            self.scheduler.settle(self.charged, usage.get("total_tokens") or
+                                  usage.get("input_tokens", 0) + usage.get("output_tokens", 0))
+            self.charged = 0
+
+_current_call: ContextVar[Optional[ScheduledCall]] = ContextVar("scheduled_call", default=None)
+
+@contextmanager
+def scheduled_call(priority: int, deadline: Optional[float] = None, tokens: int = 0) -> Iterator[ScheduledCall]:
+    """Describe the model calls made inside the block to the model's scheduler"""
+    call = ScheduledCall(priority, deadline, tokens)
+    token = _current_call.set(call)
+    try:
+        yield call
+    finally:
+        _current_call.reset(token)
+
+class TokenBucket:
+    """Budget refilled continuously at ``per_minute / 60`` per second, holding at most one minute's worth."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self._updated) * self.rate)
+        self._updated = now
+
+class _Waiter:
+    """A queued call, its capped token charge and its place in its priority's lane."""
+
+    __slots__ = ("call", "tokens", "position", "wake")
+
+    def __init__(self, call: ScheduledCall, tokens: float, position: List[float]):
+        self.call = call
+        self.tokens = tokens
+        # Running [calls, tokens] of the lane up to and including this waiter
+        self.position = position
+        # Set by the waiting caller; wakes it to re-check admission
+        self.wake: Callable[[], None] = lambda: None
+
+class _Lane:
+    """
+    Waiting calls of one priority, oldest first, with running totals.
+
+    ``joined`` counts every call that entered the lane and ``left`` every call
+    that left it from the front, so the calls ahead of a waiter are its
+    ``position`` minus ``left``, without scanning the queue.
+    """
+
+    def __init__(self):
+        self.waiters: Deque[_Waiter] = deque()
+        self.joined = [0, 0.0]
+        self.left = [0, 0.0]
+
+    def push(self, call: ScheduledCall, tokens: float) -> _Waiter:
+        self.joined = [self.joined[0] + 1, self.joined[1] + tokens]
+        waiter = _Waiter(call, tokens, list(self.joined))
+        self.waiters.append(waiter)
+        return waiter
+
+    def remove(self, waiter: _Waiter) -> None:
+        if self.waiters[0] is waiter:
+            self.waiters.popleft()
+            self.left = [self.left[0] + 1, self.left[1] + waiter.tokens]
+            return
+        # A cancelled or rejected call leaving from the middle moves the calls behind it up
+        index = self.waiters.index(waiter)
+        del self.waiters[index]
+        for behind in itertools.islice(self.waiters, index, None):
+            behind.position = [behind.position[0] - 1, behind.position[1] - waiter.tokens]
+        self.joined = [self.joined[0] - 1, self.joined[1] - waiter.tokens]
+
+    def waiting(self) -> Tuple[int, float]:
+        return self.joined[0] - self.left[0], self.joined[1] - self.left[1]
+
+    def ahead(self, waiter: _Waiter) -> Tuple[int, float]:
+        return waiter.position[0] - self.left[0], waiter.position[1] - self.left[1]
+
+class ModelScheduler(BaseRateLimiter):
+    """
+    Token-bucket scheduler for one model with request-per-minute and token-per-minute budgets.
+
+    Waiting calls form a priority queue; only the head may take budget, so a
+    burst of refinement calls cannot delay a first draft that arrives later.
+    Waiters sleep until the budget they need has refilled or until the queue
+    or the budget changes, rather than polling.
+    """
+
+    def __init__(self, name: str, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, check_every_n_seconds: float = 1.0):
+        self.name = name
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute else None
+        # Longest a waiter sleeps between checks; only a safety net, since changes wake waiters
+        self.check_every_n_seconds = check_every_n_seconds
+        self._lock = threading.Lock()
+        self._lanes: Dict[int, _Lane] = {}
+        self._admitted = 0
+        self._rejected = 0
+
+    def _buckets(self):
+        return [bucket for bucket in (self._requests, self._tokens) if bucket is not None]
+
+    def _head(self) -> Optional[_Waiter]:
+        for priority in sorted(self._lanes):
+            if self._lanes[priority].waiters:
+                return self._lanes[priority].waiters[0]
+        return None
+
+    def _estimate_wait(self, waiter: _Waiter) -> float:
+        """Seconds until every call queued ahead of ``waiter``, and ``waiter`` itself, can be admitted"""
+        priority = waiter.call.priority
+        count, tokens = self._lanes[priority].ahead(waiter)
+        for other, lane in self._lanes.items():
+            if other < priority:
+                waiting = lane.waiting()
+                count, tokens = count + waiting[0], tokens + waiting[1]
+        wait = 0.0
+        if self._requests is not None:
+            wait = max(wait, (count - self._requests.level) / self._requests.rate)
+        if self._tokens is not None:
+            wait = max(wait, (tokens - self._tokens.level) / self._tokens.rate)
+        return max(wait, 0.0)
+
+    def _wake_all(self, after: Optional[int] = None) -> None:
+        """Wake every waiter queued behind priority ``after`` (by default all), so each re-checks its deadline"""
+        for priority, lane in self._lanes.items():
+            if after is None or priority > after:
+                for waiter in lane.waiters:
+                    waiter.wake()
+
+    def _wake_head(self) -> None:
+        head = self._head()
+        if head is not None:
+            head.wake()
+
+    def _enqueue(self, call: ScheduledCall) -> _Waiter:
+        tokens = min(call.tokens, self._tokens.capacity) if self._tokens is not None else 0
+        with self._lock:
+            waiter = self._lanes.setdefault(call.priority, _Lane()).push(call, tokens)
+            # Jumping ahead of lower-priority waiters lengthens their wait
+            self._wake_all(after=call.priority)
+        return waiter
+
+    def _remove(self, waiter: _Waiter) -> None:
+        """Take ``waiter`` out of the queue and wake whoever is now at its head; the lock must be held"""
+        self._lanes[waiter.call.priority].remove(waiter)
+        self._wake_head()
+
+    def _poll(self, waiter: _Waiter) -> Optional[float]:
+        """Admit ``waiter`` if it is at the head and budget allows; otherwise return how long to sleep"""
+        call = waiter.call
+        with self._lock:
+            now = time.monotonic()
+            for bucket in self._buckets():
+                bucket.refill(now)
+            if self._head() is waiter:
+                if ((self._requests is None or self._requests.level >= 1)
+                        and (self._tokens is None or self._tokens.level >= waiter.tokens)):
+                    self._remove(waiter)
+                    if self._requests is not None:
+                        self._requests.level -= 1
+                    if self._tokens is not None:
+                        self._tokens.level -= waiter.tokens
+                    call.scheduler = self
+                    call.charged += waiter.tokens
+                    self._admitted += 1
+                    return None
+            wait = self._estimate_wait(waiter)
+            if call.deadline is not None and time.time() + wait > call.deadline:
+                self._remove(waiter)
+                self._rejected += 1
+                SCHEDULER_REJECTIONS.inc(model=self.name)
+                raise AdmissionRejected(self.name, wait)
+        return min(max(wait, 0.001), self.check_every_n_seconds)
+
+    def acquire(self, *, blocking: bool = True) -> bool:
+        call = _current_call.get() or ScheduledCall()
+        waiter = self._enqueue(call)
+        woken = threading.Event()
+        waiter.wake = woken.set
+        start = time.monotonic()
+        try:
+            while True:
+                woken.clear()
+                delay = self._poll(waiter)
+                if delay is None:
+                    SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - start, model=self.name)
+                    return True
+                if not blocking:
+                    self._drop(waiter)
+                    return False
+                woken.wait(delay)
+        except BaseException:
+            self._drop(waiter)
+            raise
+
+    async def aacquire(self, *, blocking: bool = True) -> bool:
+        call = _current_call.get() or ScheduledCall()
+        waiter = self._enqueue(call)
+        woken = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        # Waiters may be woken from other threads, so the event is set on its own loop
+        waiter.wake = lambda: loop.call_soon_threadsafe(woken.set)
+        start = time.monotonic()
+        try:
+            while True:
+                woken.clear()
+                delay = self._poll(waiter)
+                if delay is None:
+                    SCHEDULER_WAIT_SECONDS.observe(time.monotonic() - start, model=self.name)
+                    return True
+                if not blocking:
+                    self._drop(waiter)
+                    return False
+                try:
+                    await asyncio.wait_for(woken.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+        except BaseException:
+            # Cancelled or rejected callers must not stay at the head of the queue
+            self._drop(waiter)
+            raise
+
+    def _drop(self, waiter: _Waiter) -> None:
+        with self._lock:
+            if waiter in self._lanes[waiter.call.priority].waiters:
+                self._remove(waiter)
+
+    def settle(self, charged: float, actual: float) -> None:
+        """Charge (or refund) the difference between the admission estimate and real token usage"""
+        if self._tokens is None:
+            return
+        with self._lock:
+            self._tokens.refill(time.monotonic())
+            self._tokens.level = min(self._tokens.capacity, self._tokens.level - (actual - charged))
+            if actual > charged:
+                # An extra charge lengthens every wait
+                self._wake_all()
+            else:
+                self._wake_head()
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "queued": sum(len(lane.waiters) for lane in self._lanes.values()),
+                "admitted": self._admitted,
+                "rejected": self._rejected,
+                "requests_available": round(self._requests.level, 2) if self._requests else None,
+                "tokens_available": round(self._tokens.level) if self._tokens else None
+            }
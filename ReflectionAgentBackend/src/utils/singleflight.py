@@ -0,0 +1,189 @@
+"""
+Single-flight coalescing of identical in-flight runs.
+
+When several callers ask for the same key while a run for it is still in
+progress, only the first (the leader) executes; the others (followers) attach
+to that run and receive its result, or a replay of its events followed by the
+live stream. The work runs detached from any one caller, so a leader that
+disconnects does not cancel the run its followers are waiting on. Once a run
+finishes its key is released; later callers start a new run (or, usually,
+find the result in the cache the run just filled).
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from src.utils.metrics import COALESCED_REQUESTS, COALESCED_FOLLOWERS
+
+class _Flight:
+    """One in-flight run and the number of callers that joined it."""
+
+    def __init__(self, kind: str):
+        self.kind = kind
+        self.followers = 0
+        # Completion of a sync run, or the asyncio task of an async one
+        self.future: Optional[Future] = None
+        self.task: Optional[asyncio.Task] = None
+
+class _Broadcast(_Flight):
+    """In-flight stream whose events are kept so late subscribers can replay them."""
+
+    def __init__(self):
+        super().__init__("stream")
+        self.events: List[Any] = []
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._changed = asyncio.Event()
+
+    def publish(self, event: Any) -> None:
+        self.events.append(event)
+        self._wake()
+
+    def close(self, error: Optional[BaseException] = None) -> None:
+        self.done = True
+        self.error = error
+        self._wake()
+
+    def _wake(self) -> None:
+        changed, self._changed = self._changed, asyncio.Event()
+        changed.set()
+
+    async def subscribe(self) -> AsyncIterator[Any]:
+        position = 0
+        while True:
+            changed = self._changed
+            while position < len(self.events):
+                yield self.events[position]
+                position += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls that share a key onto one execution.
+
+    Sync calls (do), async calls (ado) and streams (subscribe) are tracked
+    separately, since a sync result cannot be awaited and a stream's events
+    are not a result; async flights are also scoped to their event loop.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._flights: Dict[Tuple[Any, ...], _Flight] = {}
+        self._leaders = 0
+        self._followers = 0
+
+    def _join(self, key: Tuple[Any, ...], create: Callable[[], _Flight]) -> Tuple[_Flight, bool]:
+        """Return the flight for key and whether the caller leads it, starting one if there is none"""
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = create()
+                self._leaders += 1
+                COALESCED_REQUESTS.inc(kind=flight.kind, role="leader")
+                return flight, True
+            flight.followers += 1
+            self._followers += 1
+            COALESCED_REQUESTS.inc(kind=flight.kind, role="follower")
+            return flight, False
+
+    def _release(self, key: Tuple[Any, ...], flight: _Flight) -> None:
+        with self._lock:
+            if self._flights.get(key) is flight:
+                del self._flights[key]
+        COALESCED_FOLLOWERS.observe(flight.followers, kind=flight.kind)
+
+    def do(self, key: str, fn: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Call fn, or wait for the call already running for key.
+
+        Returns:
+            fn's result and whether it was shared from another caller's run
+        """
+        def create():
+            flight = _Flight("result")
+            flight.future = Future()
+            return flight
+
+        flight, leader = self._join(("sync", key), create)
+        if not leader:
+            return flight.future.result(), True
+        try:
+            result = fn()
+        except BaseException as e:
+            flight.future.set_exception(e)
+            raise
+        else:
+            flight.future.set_result(result)
+        finally:
+            self._release(("sync", key), flight)
+        return result, False
+
+    async def ado(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """
+        Await factory(), or the run already in flight for key on this event loop.
+
+        The run is a task of its own; a caller that is cancelled stops waiting
+        without cancelling the run for the others.
+
+        Returns:
+            The result and whether it was shared from another caller's run
+        """
+        flight_key = ("async", id(asyncio.get_running_loop()), key)
+
+        def create():
+            flight = _Flight("result")
+            flight.task = asyncio.ensure_future(factory())
+            flight.task.add_done_callback(lambda _: self._release(flight_key, flight))
+            return flight
+
+        flight, leader = self._join(flight_key, create)
+        return await asyncio.shield(flight.task), not leader
+
+    def subscribe(self, key: str, factory: Callable[[], AsyncIterator[Any]]) -> Tuple[AsyncIterator[Any], bool]:
+        """
+        Stream the events of factory(), or of the stream already in flight for key.
+
+        Followers first receive every event emitted so far, then the rest as
+        they happen, so each subscriber sees the complete stream.
+
+        Returns:
+            An iterator over the events and whether it follows another caller's stream
+        """
+        flight_key = ("stream", id(asyncio.get_running_loop()), key)
+
+        async def pump(flight: _Broadcast):
+            error = None
+            try:
+                async for event in factory():
+                    flight.publish(event)
+            except BaseException as e:
+                error = e
+                if isinstance(e, asyncio.CancelledError):
+                    raise
+            finally:
+                flight.close(error)
+                self._release(flight_key, flight)
+
+        def create():
+            flight = _Broadcast()
+            flight.task = asyncio.ensure_future(pump(flight))
+            return flight
+
+        flight, leader = self._join(flight_key, create)
+        return flight.subscribe(), not leader
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self._leaders + self._followers
+            return {
+                "in_flight": len(self._flights),
+                "waiters": sum(flight.followers for flight in self._flights.values()),
+                "runs": self._leaders,
+                "coalesced": self._followers,
+                # Share of requests served by a run another request started
+                "coalescing_ratio": round(self._followers / total, 4) if total else 0.0
+            }
@@ -1,44 +1,120 @@
 """
 Utility functions for the Reflection Agent Backend.
 """
-from typing import Callable
+from typing import Awaitable, Callable, Dict, Optional
+import asyncio
 import time
 import logging
-import os
-from langchain_google_genai import ChatGoogleGenerativeAI
+# Read as settings.X at call time, so clients built after a settings reload see the new values
+from src.config import settings
+from src.utils.resilience import CircuitBreaker, backoff_delay, is_retryable, reached_model
+from src.utils.scheduler import ModelScheduler
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-def call_with_retry(func: Callable, *args, max_retries=3, retry_delay=2.0, verbose=False, **kwargs):
+def call_with_retry(func: Callable, *args, max_retries=3, retry_delay=2.0, verbose=False,
+                    max_delay=30.0, breaker: Optional[CircuitBreaker] = None,
+                    on_retry: Optional[Callable[[int, Exception, float], None]] = None, **kwargs):
     """
-    Call a function with retry logic in case of exceptions
+    Call a function, retrying transient failures with exponential backoff and jitter
     
     Args:
         func: The function to call
         *args: Arguments to pass to the function
         max_retries: Maximum number of retries
-        retry_delay: Delay between retries in seconds
+        retry_delay: Base delay in seconds, doubled on every attempt
         verbose: Whether to print debug messages
+        max_delay: Upper bound on a single wait, including provider retry-after hints
+        breaker: Optional circuit breaker guarding the called model
+        on_retry: Optional callback receiving the attempt number, error and chosen delay
         **kwargs: Keyword arguments to pass to the function
         
     Returns:
         The result of the function call
     """
     for attempt in range(max_retries + 1):
+        if breaker is not None:
+            breaker.before_call()
         try:
             result = func(*args, **kwargs)
+        except Exception as e:
+            delay = _handle_failure(e, attempt, max_retries, retry_delay, max_delay, verbose, breaker, on_retry)
+            time.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record_success()
             return result
+
+async def acall_with_retry(func: Callable[..., Awaitable], *args, max_retries=3, retry_delay=2.0, verbose=False,
+                           max_delay=30.0, timeout: Optional[float] = None,
+                           breaker: Optional[CircuitBreaker] = None,
+                           on_retry: Optional[Callable[[int, Exception, float], None]] = None, **kwargs):
+    """
+    Async counterpart of call_with_retry that sleeps without blocking the event loop
+    
+    Args:
+        func: Coroutine function to call
+        timeout: Optional per-attempt timeout in seconds; a timed out attempt is retried
+        (other arguments as in call_with_retry)
+        
+    Returns:
+        The awaited result of the function call
+    """
+    for attempt in range(max_retries + 1):
+        if breaker is not None:
+            breaker.before_call()
+        try:
+            result = await asyncio.wait_for(func(*args, **kwargs), timeout) if timeout else await func(*args, **kwargs)
         except Exception as e:
-            if attempt < max_retries:
-                if verbose:
-                    logger.warning(f"Attempt {attempt + 1} failed: {str(e)}. Retrying in {retry_delay} seconds...")
-                time.sleep(retry_delay)
-            else:
-                if verbose:
-                    logger.error(f"All {max_retries + 1} attempts failed. Last error: {str(e)}")
-                raise
+            delay = _handle_failure(e, attempt, max_retries, retry_delay, max_delay, verbose, breaker, on_retry)
+            await asyncio.sleep(delay)
+        else:
+            if breaker is not None:
+                breaker.record_success()
+            return result
+
+def _handle_failure(error: Exception, attempt: int, max_retries: int, retry_delay: float, max_delay: float,
+                    verbose: bool, breaker: Optional[CircuitBreaker],
+                    on_retry: Optional[Callable[[int, Exception, float], None]]) -> float:
+    """Record a failed attempt and return how long to wait, re-raising when it should not be retried"""
+    retryable = is_retryable(error)
+    if breaker is not None:
+        if not reached_model(error):
+            # Rejected locally before the model was contacted: neither a failure nor a success
+            breaker.release_probe()
+        elif retryable:
+            # Only transient failures say anything about the model's health
+            breaker.record_failure()
+        else:
+            breaker.record_success()
+    if not retryable or attempt >= max_retries:
+        if verbose:
+            logger.error(f"Giving up after {attempt + 1} attempt(s). Last error: {str(error)}")
+        raise error
+    delay = backoff_delay(attempt, retry_delay, max_delay, error)
+    if verbose:
+        logger.warning(f"Attempt {attempt + 1} failed: {str(error)}. Retrying in {delay:.2f} seconds...")
+    if on_retry is not None:
+        on_retry(attempt, error, delay)
+    return delay
+
+def estimate_tokens(messages) -> int:
+    """
+    Roughly estimate the prompt tokens of a message list without calling the model API
+    
+    Args:
+        messages: Messages that would be sent to the model
+    
+    Returns:
+        Approximate token count (about four characters per token plus per-message overhead)
+    """
+    total = 0
+    for message in messages:
+        content = message.content if isinstance(message.content, str) else str(message.content)
+        total += len(content) // 4 + 4
+    return total
 
 def get_default_system_prompts():
     """
@@ -60,7 +136,8 @@ For each response, provide:
 2. STRENGTHS: List specific aspects of the response that were effective.
 3. WEAKNESSES: Identify areas where the response could be improved.
 4. SUGGESTIONS: Provide specific recommendations to enhance the response.
-5. NEEDS IMPROVEMENT: Conclude with "yes" if the response requires significant improvement, or "no" if the response is satisfactory.
+5. SCORE: Rate the overall quality of the response from 1 to 10.
+6. NEEDS IMPROVEMENT: Conclude with "yes" if the response requires significant improvement, or "no" if the response is satisfactory.
 
 Your feedback should be constructive, specific, and focused on helping improve the AI's response."""
 
@@ -69,7 +146,69 @@ Your feedback should be constructive, specific, and focused on helping improve t
         'reflection': reflection_prompt
     }
 
-def initialize_llm(model_name, api_key, is_main=True, verbose=False):
+def parse_rate_limits(value: str) -> Dict[str, float]:
+    """
+    Parse a "model=limit,..." string into a dict
+    
+    Args:
+        value: Comma-separated model=limit pairs, e.g. "gemini-2.0-flash=15"
+    
+    Returns:
+        Dict mapping model name to its per-minute limit
+    """
+    limits = {}
+    for item in value.split(","):
+        if "=" not in item:
+            continue
+        model_name, rpm = item.split("=", 1)
+        limits[model_name.strip()] = float(rpm)
+    return limits
+
+def create_rate_limiters(rate_limits: Optional[Dict[str, float]],
+                         token_limits: Optional[Dict[str, float]] = None,
+                         existing: Optional[Dict[str, ModelScheduler]] = None) -> Dict[str, ModelScheduler]:
+    """
+    Create one scheduler per model so every role and run using a model shares its quota
+    
+    Args:
+        rate_limits: Dict mapping model name to allowed requests per minute
+        token_limits: Dict mapping model name to allowed tokens per minute
+        existing: Optional schedulers of a previous agent; one whose limits are unchanged is
+            kept, so its spent budget and queued calls carry over
+    
+    Returns:
+        Dict mapping model name to its scheduler
+    """
+    rate_limits = {name: rpm for name, rpm in (rate_limits or {}).items() if rpm > 0}
+    token_limits = {name: tpm for name, tpm in (token_limits or {}).items() if tpm > 0}
+    schedulers = {}
+    for model_name in dict.fromkeys([*rate_limits, *token_limits]):
+        limits = (rate_limits.get(model_name), token_limits.get(model_name))
+        scheduler = (existing or {}).get(model_name)
+        if scheduler is None or (scheduler.requests_per_minute, scheduler.tokens_per_minute) != limits:
+            scheduler = ModelScheduler(model_name, *limits)
+        schedulers[model_name] = scheduler
+    return schedulers
+
+def with_temperature(llm, temperature: float):
+    """
+    Copy a chat model client with a different sampling temperature
+    
+    The copy shares the original's connection and rate limiter; clients without
+    a temperature setting are returned unchanged.
+    
+    Args:
+        llm: Chat model client to copy
+        temperature: Sampling temperature for the copy
+    
+    Returns:
+        The adjusted client
+    """
+    if "temperature" not in type(llm).model_fields:
+        return llm
+    return llm.model_copy(update={"temperature": temperature})
+
+def initialize_llm(model_name, api_key, is_main=True, verbose=False, rate_limiter=None, client_pool=None):
     """
     Initialize a ChatGoogleGenerativeAI model with error handling
     
@@ -78,14 +217,32 @@ def initialize_llm(model_name, api_key, is_main=True, verbose=False):
         api_key: Google API key
         is_main: Whether this is the main model or reflection model
         verbose: Whether to print debug messages
+        rate_limiter: Optional rate limiter shared by every client of this model
+        client_pool: Optional ClientPool whose connections the model's calls use
     
     Returns:
         Initialized ChatGoogleGenerativeAI model
     """
+    if settings.LLM_BACKEND == "fake":
+        from src.utils.fake_llm import FakeChatModel
+        if verbose:
+            logger.info(f"Initializing fake {'main' if is_main else 'reflection'} model: {model_name}")
+        return FakeChatModel(
+            model=model_name,
+            is_main=is_main,
+            latency=settings.FAKE_LLM_LATENCY,
+            latency_distribution=settings.FAKE_LLM_LATENCY_DISTRIBUTION,
+            tokens_per_second=settings.FAKE_LLM_TOKENS_PER_SECOND,
+            verdicts=settings.FAKE_LLM_VERDICTS,
+            failure_rate=settings.FAKE_LLM_FAILURE_RATE,
+            seed=0 if is_main else 1,
+            rate_limiter=rate_limiter
+        )
+    
+    # Imported here: the Gemini client pulls in grpc and protobuf, which the fake backend never needs
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    
     try:
-        # Check for LangSmith tracing
-        use_langsmith = os.environ.get("USE_LANGSMITH", "false").lower() == "true"
-        
         # Configure model with optimized parameters
         temperature = 0.7 if is_main else 0.2
         model_type = "main" if is_main else "reflection"
@@ -101,9 +258,16 @@ def initialize_llm(model_name, api_key, is_main=True, verbose=False):
             convert_system_message_to_human=True,
             max_output_tokens=4096 if is_main else 2048,
             top_p=0.95 if is_main else 0.8,
-            top_k=40 if is_main else 20
+            top_k=40 if is_main else 20,
+            rate_limiter=rate_limiter,
+            # Retries and backoff are handled by call_with_retry, so the client only gets a short leash
+            timeout=settings.MODEL_TIMEOUT_SECONDS,
+            max_retries=settings.MODEL_CLIENT_MAX_RETRIES
         )
         
+        if client_pool is not None:
+            client_pool.attach(model, model_name)
+        
         if verbose:
             logger.info("Model initialized successfully")
         
@@ -1,6 +1,6 @@
 // src/services/api.ts
 import axios, { AxiosError } from 'axios';
-import { AgentResponse } from '../types';
+import { AgentResponse, StreamEvent } from '../types';
 
 // Get the API URL from environment variables or use default
 const API_URL = process.env.REACT_APP_API_URL || 'https://127.0.0.1:5000/api';
@@ -34,6 +34,45 @@ export const queryAgent = async (query: string): Promise<AgentResponse> => {
   }
 };
 
+// Stream tokens and phase events over Server-Sent Events. Unlike queryAgent this
+// is not bound by the axios timeout, since data keeps arriving during the run.
+export const streamQuery = async (
+  query: string,
+  onEvent: (event: StreamEvent) => void,
+  signal?: AbortSignal
+): Promise<void> => {
+  const response = await fetch(`${API_URL}/query/stream`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ query }),
+    signal,
+  });
+
+  if (!response.ok || !response.body) {
+    throw new Error(`Server error: ${response.status} ${response.statusText}`);
+  }
+
+  const reader = response.body.getReader();
+  const decoder = new TextDecoder();
+  let buffer = '';
+
+  while (true) {
+    const { done, value } = await reader.read();
+    if (done) break;
+    buffer += decoder.decode(value, { stream: true });
+
+    // Events are separated by a blank line; keep any trailing partial event
+    const events = buffer.split('\n\n');
+    buffer = events.pop() || '';
+    for (const rawEvent of events) {
+      const dataLine = rawEvent.split('\n').find((line) => line.startsWith('data: '));
+      if (dataLine) {
+        onEvent(JSON.parse(dataLine.slice(6)) as StreamEvent);
+      }
+    }
+  }
+};
+
 export const checkServerHealth = async (): Promise<{ status: string; config?: any }> => {
   try {
     const response = await apiClient.get('/health');
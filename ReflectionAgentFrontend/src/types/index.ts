@@ -11,6 +11,14 @@ export interface Message {
     error?: string;
   }
   
+  export type StreamEvent =
+    | { event: 'phase'; phase: 'generate' | 'reflect'; status: 'started' | 'completed'; iteration: number }
+    | { event: 'token'; phase: 'generate' | 'reflect'; iteration: number; content: string }
+    | { event: 'reflection'; iteration: number; needs_improvement: boolean }
+    | { event: 'iteration'; iteration: number; status: 'done' }
+    | ({ event: 'final' } & AgentResponse)
+    | { event: 'error'; detail: string; iterations: number };
+  
   export interface ThemeProps {
     isDarkMode: boolean;
   }